@@ -0,0 +1,285 @@
+"""
+Admission control in front of every LLM call.
+
+Calls wait in one priority queue per backend until its request bucket (RPM)
+and token bucket (TPM) allow them; interactive requests go before batch work.
+A throttling answer from the provider (429, 503) pauses admission for every
+caller for an exponentially growing, jittered delay (at least its
+Retry-After) and halves the admitted rate, which then recovers step by step
+as calls succeed, so sustained throughput settles right at the quota instead
+of every caller retrying at once. When more interactive callers are waiting
+than the queue holds, new ones are rejected with AdmissionRejected, which
+the API answers with 429 and Retry-After.
+"""
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from .metrics import LLM_ADMISSION_SECONDS, LLM_ADMISSION_REJECTED, LLM_THROTTLED
+
+INTERACTIVE = 0
+BATCH = 1
+
+THROTTLE_STATUSES = (429, 503)
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("testgen_llm_priority", default=INTERACTIVE)
+_call_limit: contextvars.ContextVar[Optional[threading.BoundedSemaphore]] = contextvars.ContextVar(
+    "testgen_llm_call_limit", default=None
+)
+
+
+@contextmanager
+def llm_priority(priority: int) -> Iterator[None]:
+    """LLM calls made inside this block (and tasks/threads it spawns) are admitted with priority."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+@contextmanager
+def llm_call_limit(limit: int) -> Iterator[None]:
+    """
+    At most limit LLM calls made inside this block (and tasks/threads it
+    spawns) are in flight at once, whether whole-file or per-function.
+    """
+    token = _call_limit.set(threading.BoundedSemaphore(max(1, limit)))
+    try:
+        yield
+    finally:
+        _call_limit.reset(token)
+
+
+@contextmanager
+def call_slot() -> Iterator[None]:
+    """Holds a slot of the enclosing llm_call_limit, if any, for one LLM call."""
+    limit = _call_limit.get()
+    if limit is None:
+        yield
+        return
+    with limit:
+        yield
+
+
+class AdmissionRejected(Exception):
+    """The LLM queue is full, or the provider kept throttling; try again after retry_after seconds."""
+
+    def __init__(self, retry_after: float, reason: str = "LLM request queue is full."):
+        super().__init__(reason)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    """
+    per_minute units refilled continuously, holding at most capacity
+    (default: one minute's worth). A rate of 0 means unlimited. take may
+    leave the balance negative (a response longer than estimated), which
+    later callers then wait out.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.per_minute = max(0.0, per_minute)
+        self.capacity = capacity or self.per_minute
+        self.tokens = self.capacity
+        self.factor = 1.0
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.per_minute <= 0
+
+    def _refill(self, now: float) -> None:
+        rate = self.per_minute * self.factor / 60.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount (at most the capacity) is available."""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / (self.per_minute * self.factor / 60.0))
+
+    def take(self, amount: float, now: float) -> None:
+        if not self.unlimited:
+            self._refill(now)
+            self.tokens -= amount
+
+
+def throttle_status(error: BaseException) -> Optional[int]:
+    """The HTTP status of a throttling error (429/503) from any backend, or None."""
+    response = getattr(error, "response", None)
+    for status in (getattr(error, "status_code", None), getattr(response, "status_code", None), getattr(error, "code", None)):
+        if isinstance(status, int) and status in THROTTLE_STATUSES:
+            return status
+    return None
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """The Retry-After seconds the provider sent with an error, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is None:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdmissionController:
+    """
+    Admits LLM calls against request and token buckets in priority order
+    (then arrival order), and paces retries after throttling. Configured
+    per backend through TESTGEN_<BACKEND>_RPM and _TPM (0: unlimited),
+    TESTGEN_LLM_QUEUE (interactive callers that may wait),
+    TESTGEN_LLM_THROTTLE_RETRIES and TESTGEN_LLM_BACKOFF_BASE/_MAX (seconds).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_queue: int = 64,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0
+    ):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._cond = threading.Condition()
+        self._waiting: List[Tuple[int, int]] = []
+        self._order = itertools.count()
+        self._paused_until = 0.0
+
+    @classmethod
+    def from_env(cls, name: str) -> "AdmissionController":
+        prefix = f"TESTGEN_{name.upper()}"
+        return cls(
+            name,
+            requests_per_minute=float(os.getenv(f"{prefix}_RPM", "0")),
+            tokens_per_minute=float(os.getenv(f"{prefix}_TPM", "0")),
+            max_queue=int(os.getenv("TESTGEN_LLM_QUEUE", "64")),
+            max_retries=int(os.getenv("TESTGEN_LLM_THROTTLE_RETRIES", "5")),
+            backoff_base=float(os.getenv("TESTGEN_LLM_BACKOFF_BASE", "1")),
+            backoff_max=float(os.getenv("TESTGEN_LLM_BACKOFF_MAX", "60"))
+        )
+
+    def queued(self, priority: Optional[int] = None) -> int:
+        with self._cond:
+            return sum(1 for waiting, _ in self._waiting if priority is None or waiting == priority)
+
+    def retry_after(self) -> float:
+        """Rough seconds until the current queue has been admitted."""
+        with self._cond:
+            now = time.monotonic()
+            pause = max(0.0, self._paused_until - now)
+            if self.requests.unlimited:
+                return pause + 1
+            rate = self.requests.per_minute * self.requests.factor / 60.0
+            return pause + (len(self._waiting) + 1) / rate
+
+    def check(self) -> None:
+        """Raises AdmissionRejected if an interactive call would not be queued now."""
+        if self.max_queue > 0 and self.queued(INTERACTIVE) >= self.max_queue:
+            LLM_ADMISSION_REJECTED.inc(backend=self.name)
+            raise AdmissionRejected(self.retry_after())
+
+    def admit(self, tokens: int, priority: Optional[int] = None) -> None:
+        """
+        Blocks until this call is first in line and the buckets hold one
+        request and tokens tokens, then takes them. Interactive calls are
+        rejected instead of queued when the queue is full.
+        """
+        priority = current_priority() if priority is None else priority
+        if priority == INTERACTIVE:
+            self.check()
+        started = time.monotonic()
+        entry = (priority, next(self._order))
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    wait = None
+                    if self._waiting[0] == entry:
+                        now = time.monotonic()
+                        wait = max(
+                            self._paused_until - now,
+                            self.requests.wait_time(1, now),
+                            self.tokens.wait_time(tokens, now)
+                        )
+                        if wait <= 0:
+                            self.requests.take(1, now)
+                            self.tokens.take(tokens, now)
+                            break
+                    self._cond.wait(wait)
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+        LLM_ADMISSION_SECONDS.observe(
+            time.monotonic() - started, backend=self.name,
+            priority="interactive" if priority == INTERACTIVE else "batch"
+        )
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Charges the difference between a call's estimated and actual tokens; a success lets the rate recover."""
+        with self._cond:
+            now = time.monotonic()
+            self.tokens.take(actual - estimated, now)
+            for bucket in (self.requests, self.tokens):
+                bucket._refill(now)
+                bucket.factor = min(1.0, bucket.factor + 0.05)
+
+    def backoff(self, error: BaseException, attempt: int) -> bool:
+        """
+        After a failed attempt: if error is throttling and retries remain,
+        pauses admission for everyone (exponential backoff with full jitter,
+        at least the provider's Retry-After), halves the admitted rate and
+        returns True so the caller tries again. Raises AdmissionRejected once
+        retries are used up, and returns False for any other error.
+        """
+        status = throttle_status(error)
+        if status is None:
+            return False
+        LLM_THROTTLED.inc(backend=self.name, status=str(status))
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        delay = max(delay, retry_after(error) or 0.0)
+        if attempt + 1 >= self.max_retries:
+            raise AdmissionRejected(delay, f"LLM provider is throttling requests ({status}).") from error
+        with self._cond:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + delay)
+            for bucket in (self.requests, self.tokens):
+                bucket._refill(now)
+                bucket.factor = max(0.1, bucket.factor / 2)
+            self._cond.notify_all()
+        return True
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "queued": len(self._waiting),
+                "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 3),
+                "rate_factor": round(self.requests.factor, 3),
+                "requests_per_minute": self.requests.per_minute,
+                "tokens_per_minute": self.tokens.per_minute,
+            }
@@ -0,0 +1,284 @@
+"""
+Content-addressed store for what a job produces: the final test file, and
+the test file, coverage report and log of every run along the way.
+
+Each file is stored once per distinct content, as a blob named by its
+sha256 (gzip-compressed when that makes it smaller), so the many jobs that
+generate the same suite share one copy. A job is a JSON manifest mapping
+file names to blobs. Manifests older than max_age are dropped, then the
+oldest ones until the blobs fit in max_bytes, and blobs no manifest refers
+to any more are deleted. Nothing is written next to the source tree.
+
+    <root>/blobs/ab/<sha256>[.gz]
+    <root>/jobs/<job_id>.json
+"""
+import contextvars
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .metrics import ARTIFACT_EVICTIONS, ARTIFACT_WRITES
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# Blobs younger than this are never swept, so a file whose manifest entry
+# another process is about to write is not lost.
+_GRACE_SECONDS = 60
+
+_JOB_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_job: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("testgen_artifact_job", default=None)
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+@contextmanager
+def artifact_job(job_id: Optional[str] = None) -> Iterator[str]:
+    """
+    Files stored inside this block (and tasks/threads it spawns) belong to
+    job_id. Without one, the job already current is kept, or a new id made.
+    """
+    job_id = job_id or _job.get() or new_job_id()
+    token = _job.set(job_id)
+    try:
+        yield job_id
+    finally:
+        _job.reset(token)
+
+
+def current_artifact_job() -> Optional[str]:
+    return _job.get()
+
+
+class ArtifactStore:
+    """
+    Configured through TESTGEN_ARTIFACT_DIR, TESTGEN_ARTIFACT_COMPRESS (0 to
+    store blobs as they are), TESTGEN_ARTIFACT_MAX_BYTES (total blob size)
+    and TESTGEN_ARTIFACT_MAX_AGE (seconds; 0 keeps jobs until size evicts
+    them). Collection runs after every gc_every stored files and at startup.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        compress: bool = True,
+        max_bytes: int = 1024 * 1024 * 1024,
+        max_age: float = 7 * 24 * 3600,
+        gc_every: int = 32
+    ):
+        self.root = Path(root)
+        self.blobs_dir = self.root / "blobs"
+        self.jobs_dir = self.root / "jobs"
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.gc_every = max(1, gc_every)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    @classmethod
+    def from_env(cls) -> "ArtifactStore":
+        return cls(
+            Path(os.getenv("TESTGEN_ARTIFACT_DIR", str(PROJECT_ROOT / ".cache" / "artifacts"))),
+            compress=os.getenv("TESTGEN_ARTIFACT_COMPRESS", "1") != "0",
+            max_bytes=int(os.getenv("TESTGEN_ARTIFACT_MAX_BYTES", str(1024 * 1024 * 1024))),
+            max_age=float(os.getenv("TESTGEN_ARTIFACT_MAX_AGE", str(7 * 24 * 3600)))
+        )
+
+    # --- blobs ---
+
+    def _blob_path(self, digest: str, encoding: str) -> Path:
+        suffix = ".gz" if encoding == "gzip" else ""
+        return self.blobs_dir / digest[:2] / f"{digest}{suffix}"
+
+    def _write_blob(self, data: bytes) -> Dict[str, Any]:
+        """Stores data unless a blob with its content exists; returns its manifest entry."""
+        digest = hashlib.sha256(data).hexdigest()
+        for encoding in ("gzip", "identity"):
+            path = self._blob_path(digest, encoding)
+            try:
+                # Refresh the mtime so a sweep in progress leaves it alone.
+                os.utime(path)
+                ARTIFACT_WRITES.inc(deduplicated="true")
+                return {"sha256": digest, "size": len(data), "stored_bytes": path.stat().st_size, "encoding": encoding}
+            except OSError:
+                continue
+        stored, encoding = data, "identity"
+        if self.compress:
+            packed = gzip.compress(data, compresslevel=6, mtime=0)
+            if len(packed) < len(data):
+                stored, encoding = packed, "gzip"
+        path = self._blob_path(digest, encoding)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(stored)
+        os.replace(tmp_path, path)
+        ARTIFACT_WRITES.inc(deduplicated="false")
+        return {"sha256": digest, "size": len(data), "stored_bytes": len(stored), "encoding": encoding}
+
+    def _read_blob(self, entry: Dict[str, Any]) -> Optional[bytes]:
+        try:
+            data = self._blob_path(entry["sha256"], entry["encoding"]).read_bytes()
+        except OSError:
+            return None
+        return gzip.decompress(data) if entry["encoding"] == "gzip" else data
+
+    # --- manifests ---
+
+    def _manifest_path(self, job_id: str) -> Path:
+        if not _JOB_ID.match(job_id):
+            raise ValueError(f"Invalid job id: {job_id!r}")
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _load(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, path: Path, manifest: Dict[str, Any]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps(manifest, sort_keys=True), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def put(self, job_id: str, name: str, data: bytes) -> Dict[str, Any]:
+        """Stores data as job_id's file name (replacing an earlier one); returns its entry."""
+        path = self._manifest_path(job_id)
+        with self._lock:
+            entry = self._write_blob(data)
+            now = time.time()
+            manifest = self._load(path) or {"job_id": job_id, "created_at": now, "files": {}}
+            manifest["files"][name] = entry
+            manifest["updated_at"] = now
+            self._save(path, manifest)
+            self._writes += 1
+            due = self._writes % self.gc_every == 0
+        if due:
+            self.gc()
+        return entry
+
+    def put_file(self, job_id: str, name: str, file_path: Path) -> Optional[Dict[str, Any]]:
+        """put for a file on disk; None if it does not exist (e.g. a run that wrote no report)."""
+        try:
+            data = Path(file_path).read_bytes()
+        except OSError:
+            return None
+        return self.put(job_id, name, data)
+
+    def manifest(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The files stored for job_id, or None if it has none (or they were evicted)."""
+        try:
+            return self._load(self._manifest_path(job_id))
+        except ValueError:
+            return None
+
+    def get(self, job_id: str, name: str) -> Optional[bytes]:
+        """The content of job_id's file name, or None."""
+        manifest = self.manifest(job_id)
+        entry = (manifest or {}).get("files", {}).get(name)
+        return self._read_blob(entry) if entry is not None else None
+
+    def delete(self, job_id: str) -> bool:
+        """Drops job_id's manifest; its blobs go at the next collection unless shared."""
+        try:
+            path = self._manifest_path(job_id)
+        except ValueError:
+            return False
+        with self._lock:
+            existed = path.exists()
+            path.unlink(missing_ok=True)
+        return existed
+
+    # --- retention ---
+
+    def _blobs(self) -> Dict[Tuple[str, str], Tuple[float, int, Path]]:
+        blobs = {}
+        for path in self.blobs_dir.glob("*/*"):
+            if path.name.endswith(".tmp"):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            encoding = "gzip" if path.suffix == ".gz" else "identity"
+            blobs[(path.name.split(".")[0], encoding)] = (stat.st_mtime, stat.st_size, path)
+        return blobs
+
+    def gc(self) -> Dict[str, int]:
+        """
+        Drops expired manifests, then the least recently updated ones while
+        the blobs they alone refer to push the total over max_bytes, then
+        deletes unreferenced blobs. Returns what was removed.
+        """
+        with self._lock:
+            now = time.time()
+            manifests: List[Tuple[float, Path, Dict[str, Any]]] = []
+            expired = 0
+            for path in self.jobs_dir.glob("*.json"):
+                manifest = self._load(path)
+                if manifest is None:
+                    continue
+                updated = manifest.get("updated_at", 0)
+                if self.max_age and now - updated > self.max_age:
+                    path.unlink(missing_ok=True)
+                    expired += 1
+                    continue
+                manifests.append((updated, path, manifest))
+            manifests.sort(key=lambda item: item[0])
+
+            blobs = self._blobs()
+            refs: Dict[Tuple[str, str], int] = {}
+            for _, _, manifest in manifests:
+                for entry in manifest.get("files", {}).values():
+                    key = (entry["sha256"], entry["encoding"])
+                    refs[key] = refs.get(key, 0) + 1
+            total = sum(size for key, (_, size, _) in blobs.items() if key in refs)
+
+            evicted = 0
+            for _, path, manifest in manifests:
+                if not self.max_bytes or total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                evicted += 1
+                for entry in manifest.get("files", {}).values():
+                    key = (entry["sha256"], entry["encoding"])
+                    refs[key] -= 1
+                    if refs[key] == 0 and key in blobs:
+                        total -= blobs[key][1]
+
+            swept = freed = 0
+            for key, (mtime, size, path) in blobs.items():
+                if refs.get(key, 0) == 0 and now - mtime > _GRACE_SECONDS:
+                    path.unlink(missing_ok=True)
+                    swept += 1
+                    freed += size
+        if expired:
+            ARTIFACT_EVICTIONS.inc(expired, reason="age")
+        if evicted:
+            ARTIFACT_EVICTIONS.inc(evicted, reason="size")
+        return {"jobs_expired": expired, "jobs_evicted": evicted, "blobs_removed": swept, "bytes_freed": freed}
+
+    def stats(self) -> Dict[str, Any]:
+        blobs = self._blobs()
+        return {
+            "jobs": sum(1 for _ in self.jobs_dir.glob("*.json")),
+            "blobs": len(blobs),
+            "stored_bytes": sum(size for _, size, _ in blobs.values()),
+            "max_bytes": self.max_bytes,
+            "max_age": self.max_age,
+            "compress": self.compress,
+        }
+
+
+artifact_store = ArtifactStore.from_env()
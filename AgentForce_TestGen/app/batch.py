@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .admission import llm_call_limit
+from .parser import CodeParser
+from .uploads import max_archive_members, max_extracted_bytes
+from .workspace import SKIP_DIRS
+
+LANGUAGES = {".py": "python", ".js": "javascript"}
+
+
+def discover_sources(root: Path) -> List[Path]:
+    """Finds .py/.js modules under root, skipping tests, vendored and hidden dirs."""
+    sources = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and not d.startswith("."))
+        for filename in sorted(filenames):
+            path = Path(dirpath) / filename
+            if path.suffix not in LANGUAGES:
+                continue
+            if filename.startswith("test_") or filename.endswith((".test.js", ".spec.js", "_test.py")):
+                continue
+            if filename in ("__init__.py", "setup.py", "conftest.py"):
+                continue
+            sources.append(path)
+    return sources
+
+
+def _safe_members(names: List[str], dest: Path) -> None:
+    dest = dest.resolve()
+    for name in names:
+        target = (dest / name).resolve()
+        if target != dest and dest not in target.parents:
+            raise ValueError(f"Archive entry escapes the extraction directory: {name}")
+
+
+def _check_size(count: int, total: int) -> None:
+    """Refuses archives with more members or more uncompressed bytes than the batch limits allow."""
+    if max_archive_members() > 0 and count > max_archive_members():
+        raise ValueError(f"Archive has {count} entries; the limit is {max_archive_members()}.")
+    if max_extracted_bytes() > 0 and total > max_extracted_bytes():
+        raise ValueError(f"Archive expands to {total} bytes; the limit is {max_extracted_bytes()}.")
+
+
+def extract_archive(archive_path: Path, dest: Path) -> Path:
+    """
+    Extracts a .zip or .tar(.gz/.bz2/.xz) archive into dest and returns dest.
+    Entries are checked before anything is written: none may escape dest,
+    and their number and uncompressed size must be within
+    TESTGEN_MAX_ARCHIVE_MEMBERS and TESTGEN_MAX_EXTRACTED_BYTES.
+    """
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            infos = archive.infolist()
+            _check_size(len(infos), sum(info.file_size for info in infos))
+            _safe_members([info.filename for info in infos], dest)
+            archive.extractall(dest)
+    elif tarfile.is_tarfile(archive_path):
+        with tarfile.open(archive_path) as archive:
+            members = []
+            total = 0
+            # Counted while reading the index, so a huge one is refused early.
+            for member in archive:
+                if member.isfile() or member.isdir():
+                    members.append(member)
+                    total += member.size
+                    _check_size(len(members), total)
+            _safe_members([m.name for m in members], dest)
+            archive.extractall(dest, members=members)
+    else:
+        raise ValueError("Unsupported archive format. Please upload a .zip or .tar(.gz) file.")
+    return dest
+
+
+def package_root(path: Path, root: Path) -> Optional[Path]:
+    """
+    The directory the top-level package holding path sits in (what has to
+    be on sys.path for `import pkg.module`), or None if path is not in a
+    package. Never above root.
+    """
+    directory = path.parent
+    if not (directory / "__init__.py").exists():
+        return None
+    while directory != root and (directory.parent / "__init__.py").exists():
+        directory = directory.parent
+    return directory.parent if directory != root else root
+
+
+def _parse_python_source(path: str):
+    """Process-pool task: reads and parses one Python file."""
+    content = Path(path).read_text(encoding="utf-8")
+    return content, CodeParser().parse_file(content)
+
+
+class BatchRunner:
+    """
+    Runs the parse -> LLM -> generate -> run pipeline over many files.
+
+    Python parsing is spread over a process pool, LLM calls (whole-file and
+    per-function alike) share one concurrency limit and test runs are capped
+    at one per core. Each file runs in a workspace holding the rest of its
+    directory, so its relative and sibling imports resolve (see Workspace).
+    """
+
+    def __init__(
+        self,
+        llm_concurrency: int = 8,
+        run_concurrency: Optional[int] = None,
+        parse_workers: Optional[int] = None,
+        keep_dir: Optional[Path] = None
+    ):
+        self.llm_concurrency = max(1, llm_concurrency)
+        self.run_concurrency = max(1, run_concurrency or os.cpu_count() or 1)
+        self.parse_workers = max(1, parse_workers or os.cpu_count() or 1)
+        self.keep_dir = keep_dir
+
+    async def run(self, root: Path) -> Dict[str, Any]:
+        # Imported here so process-pool workers, which re-import this module,
+        # do not build the LLM client and tool instances.
+        from . import pipeline
+        from .js_parser import parse_js_file_async
+
+        started = time.perf_counter()
+        root = Path(root)
+        sources = discover_sources(root)
+        run_semaphore = asyncio.Semaphore(self.run_concurrency)
+        loop = asyncio.get_running_loop()
+
+        async def process(path: Path, executor: ProcessPoolExecutor) -> Dict[str, Any]:
+            relative = path.relative_to(root).as_posix()
+            language = LANGUAGES[path.suffix]
+            module_name = path.stem
+            report: Dict[str, Any] = {"file": relative, "language": language}
+            try:
+                if language == "python":
+                    content, functions = await loop.run_in_executor(executor, _parse_python_source, str(path))
+                else:
+                    content = await asyncio.to_thread(path.read_text, encoding="utf-8")
+                    functions = await parse_js_file_async(content)
+                report["functions"] = len(functions)
+                if not functions:
+                    report["status"] = "Skipped"
+                    report["summary"] = "No functions found."
+                    return report
+
+                if language == "python":
+                    test_json, generation = await pipeline.generate_python_plan(content, functions)
+                else:
+                    test_json, generation = await pipeline.generate_js_plan(content, functions, module_name)
+                report["generation"] = generation
+
+                keep_dir = self.keep_dir / Path(relative).parent if self.keep_dir is not None else None
+                async with run_semaphore:
+                    if language == "python":
+                        top = package_root(path, root)
+                        test_file_path, result = await pipeline.execute_python_plan(
+                            module_name, content, test_json, keep_dir,
+                            package_dir=path.parent, python_path=[top] if top is not None else []
+                        )
+                    else:
+                        test_file_path, result = await pipeline.execute_js_plan(
+                            module_name, content, test_json, keep_dir, package_dir=path.parent
+                        )
+                report["test_file_path"] = test_file_path
+                report.update({k: v for k, v in result.items() if k != "full_log"})
+            except Exception as e:
+                report["status"] = "Error"
+                report["error"] = str(e)
+            return report
+
+        ctx = multiprocessing.get_context("spawn")
+        # Tasks copy the context, so every LLM call of the batch counts against the limit.
+        with llm_call_limit(self.llm_concurrency), ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=ctx) as executor:
+            files = await asyncio.gather(*(process(path, executor) for path in sources))
+
+        return {
+            "root": str(root),
+            "files": files,
+            "totals": aggregate_reports(files),
+            "duration_seconds": round(time.perf_counter() - started, 3)
+        }
+
+
+def aggregate_reports(files: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Repo-wide totals; coverage is weighted by the number of lines per file."""
+    covered = sum(f.get("lines", {}).get("covered", 0) for f in files)
+    total = sum(f.get("lines", {}).get("total", 0) for f in files)
+    statuses: Dict[str, int] = {}
+    for f in files:
+        statuses[f.get("status", "Unknown")] = statuses.get(f.get("status", "Unknown"), 0) + 1
+    return {
+        "files": len(files),
+        "by_status": statuses,
+        "lines_covered": covered,
+        "lines_total": total,
+        "coverage_percentage": round(covered / total * 100, 2) if total else 0.0
+    }
+
+
+async def run_batch(source: Path, **options) -> Dict[str, Any]:
+    """Runs a batch over a directory, or over an archive extracted to a temp dir."""
+    source = Path(source)
+    if source.is_dir():
+        return await BatchRunner(**options).run(source)
+    scratch = Path(tempfile.mkdtemp(prefix="testgen-batch-"))
+    try:
+        await asyncio.to_thread(extract_archive, source, scratch)
+        report = await BatchRunner(**options).run(scratch)
+        report["root"] = source.name
+        return report
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+# CLI: python -m app.batch path/to/repo-or-archive.zip --output report.json
+def main(argv: Optional[List[str]] = None) -> None:
+    arg_parser = argparse.ArgumentParser(description="Generate and run tests for a whole repository.")
+    arg_parser.add_argument("source", help="Directory, .zip or .tar(.gz) archive")
+    arg_parser.add_argument("--output", "-o", help="Write the JSON report here instead of stdout")
+    arg_parser.add_argument("--keep-tests", help="Copy generated test files into this directory")
+    arg_parser.add_argument(
+        "--llm-concurrency", type=int, default=int(os.getenv("TESTGEN_BATCH_LLM_CONCURRENCY", "8")),
+        help="LLM calls in flight at once across all files, per-function calls included"
+    )
+    arg_parser.add_argument("--run-concurrency", type=int, default=None, help="Parallel test runs (default: CPU count)")
+    args = arg_parser.parse_args(argv)
+
+    from .js_parser import parser_pool
+    from .pytest_pool import pytest_pool
+
+    try:
+        parser_pool.start()
+    except OSError as e:
+        print(f"Could not start the JavaScript parser pool: {e}")
+    if int(os.getenv("TESTGEN_PYTEST_POOL", "2")) > 0:
+        # One warm pytest worker per concurrent test run.
+        pytest_pool.size = args.run_concurrency or os.cpu_count() or 1
+        pytest_pool.start()
+    try:
+        report = asyncio.run(run_batch(
+            Path(args.source),
+            llm_concurrency=args.llm_concurrency,
+            run_concurrency=args.run_concurrency,
+            keep_dir=Path(args.keep_tests) if args.keep_tests else None
+        ))
+    finally:
+        parser_pool.stop()
+        pytest_pool.stop()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+        totals = report["totals"]
+        print(f"{totals['files']} files, {totals['coverage_percentage']}% line coverage -> {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .parser import CodeParser, FunctionInfo, ModuleInfo
+
+# (first line, last line), 1-based and inclusive.
+LineRange = Tuple[int, int]
+
+_parser = CodeParser()
+
+
+def chars_to_tokens(chars: int) -> int:
+    """Rough token count of chars characters (~4 per token); backends do not all report usage."""
+    return (chars + 3) // 4
+
+
+def estimate_tokens(text: str) -> int:
+    return chars_to_tokens(len(text))
+
+
+def context_token_budget() -> int:
+    """Estimated tokens of source per prompt (TESTGEN_CONTEXT_TOKENS); 0 sends whole files."""
+    return int(os.getenv("TESTGEN_CONTEXT_TOKENS", "2000"))
+
+
+class SourceContext:
+    """
+    Builds the source part of a prompt for some functions of a module out of
+    line ranges instead of the whole file. Every selected function's own
+    lines are always included. Then, while the estimated token count stays
+    within the budget, the module-level imports and assignments they read
+    and the module functions they call (transitively, nearest first), each
+    with what it reads in turn. Gaps between the included ranges are marked
+    with an elision comment. Subclasses map functions to ranges for one
+    language.
+    """
+
+    comment = "#"
+
+    def __init__(self, code: str):
+        self.code = code
+        self.lines = code.splitlines()
+
+    def own_ranges(self, name: str) -> List[LineRange]:
+        raise NotImplementedError
+
+    def definition_ranges(self, name: str) -> List[LineRange]:
+        raise NotImplementedError
+
+    def callees(self, name: str) -> List[str]:
+        raise NotImplementedError
+
+    def _candidates(self, names: Sequence[str]) -> Iterable[List[LineRange]]:
+        """Optional ranges in the order they are worth including."""
+        for name in names:
+            yield self.definition_ranges(name)
+        seen = set(names)
+        frontier = list(names)
+        while frontier:
+            next_frontier = []
+            for name in frontier:
+                for callee in self.callees(name):
+                    if callee not in seen:
+                        seen.add(callee)
+                        next_frontier.append(callee)
+                        yield self.own_ranges(callee) + self.definition_ranges(callee)
+            frontier = next_frontier
+
+    def _size(self, covered: Set[int], ranges: List[LineRange]) -> int:
+        """Characters that ranges add to the lines already covered."""
+        return sum(
+            len(self.lines[line - 1]) + 1
+            for start, end in ranges
+            for line in range(max(1, start), min(end, len(self.lines)) + 1)
+            if line not in covered
+        )
+
+    def build(self, names: Sequence[str], budget: Optional[int] = None, whole_file: bool = True) -> str:
+        """
+        The context for names. With whole_file, a file that fits the budget
+        (or a budget of 0) is sent as it is; without, the functions' own
+        lines are the floor and a budget of 0 adds nothing to them.
+        """
+        budget = context_token_budget() if budget is None else budget
+        if whole_file and (budget <= 0 or estimate_tokens(self.code) <= budget):
+            return self.code
+        covered: Set[int] = set()
+        chars = 0
+        for name in names:
+            ranges = self.own_ranges(name)
+            chars += self._size(covered, ranges)
+            covered.update(self._lines(ranges))
+        for ranges in self._candidates(list(names)) if budget > 0 else ():
+            added = self._size(covered, ranges)
+            if added and chars_to_tokens(chars + added) <= budget:
+                chars += added
+                covered.update(self._lines(ranges))
+        return self._render(covered)
+
+    def pack(self, names: Sequence[str], budget: Optional[int] = None) -> List[List[str]]:
+        """
+        Splits names, in order, into groups whose own lines fit the budget
+        together, one prompt per group. A function larger than the budget
+        gets a group of its own. The whole file is one group if it fits.
+        """
+        budget = context_token_budget() if budget is None else budget
+        if budget <= 0 or estimate_tokens(self.code) <= budget:
+            return [list(names)] if names else []
+        groups: List[List[str]] = []
+        covered: Set[int] = set()
+        chars = 0
+        for name in names:
+            ranges = self.own_ranges(name) + self.definition_ranges(name)
+            added = self._size(covered, ranges)
+            if groups and chars_to_tokens(chars + added) <= budget:
+                groups[-1].append(name)
+                chars += added
+            else:
+                groups.append([name])
+                covered = set()
+                chars = self._size(covered, ranges)
+            covered.update(self._lines(ranges))
+        return groups
+
+    def _lines(self, ranges: List[LineRange]) -> Iterable[int]:
+        for start, end in ranges:
+            yield from range(max(1, start), min(end, len(self.lines)) + 1)
+
+    def _render(self, covered: Set[int]) -> str:
+        out = []
+        previous = 0
+        for line in sorted(covered):
+            if line != previous + 1:
+                out.append(f"{self.comment} ...")
+            out.append(self.lines[line - 1])
+            previous = line
+        if previous < len(self.lines):
+            out.append(f"{self.comment} ...")
+        return "\n".join(out)
+
+
+class PythonContext(SourceContext):
+    """SourceContext from the parser's line ranges, definitions and call graph."""
+
+    def __init__(self, code: str, module: Optional[ModuleInfo] = None):
+        super().__init__(code)
+        module = module or _parser.parse_module(code)
+        self.functions: Dict[str, FunctionInfo] = {f.name: f for f in module.functions}
+        self.graph = module.call_graph()
+        self.classes = {c.name: c for c in module.classes}
+        self.first_method: Dict[str, int] = {}
+        for function in module.functions:
+            if function.class_name and function.class_name not in self.first_method:
+                self.first_method[function.class_name] = function.lineno
+        self.bindings: Dict[str, List[LineRange]] = {}
+        for definition in module.definitions:
+            for bound in definition.names:
+                self.bindings.setdefault(bound, []).append((definition.lineno, definition.end_lineno))
+
+    def _class_header(self, class_name: str) -> List[LineRange]:
+        """The class statement, docstring and attributes: everything before its first method."""
+        cls = self.classes.get(class_name)
+        if cls is None:
+            return []
+        first_method = self.first_method.get(class_name)
+        return [(cls.lineno, first_method - 1 if first_method else cls.end_lineno)]
+
+    def own_ranges(self, name: str) -> List[LineRange]:
+        function = self.functions.get(name)
+        if function is None:
+            return []
+        ranges = [(function.lineno, function.end_lineno)]
+        if function.class_name:
+            ranges = self._class_header(function.class_name) + ranges
+        return ranges
+
+    def definition_ranges(self, name: str) -> List[LineRange]:
+        function = self.functions.get(name)
+        if function is None:
+            return []
+        ranges: List[LineRange] = []
+        for used in function.names:
+            ranges.extend(self.bindings.get(used, []))
+            if used in self.classes:
+                ranges.extend(self._class_header(used))
+        return ranges
+
+    def callees(self, name: str) -> List[str]:
+        return self.graph.get(name, [])
+
+
+class JSContext(SourceContext):
+    """
+    SourceContext from js/parser.js output: each function's line range, the
+    top-level declarations it reads ("context") and the names it uses
+    ("refs"), matched against the module's functions for the call graph.
+    """
+
+    comment = "//"
+
+    def __init__(self, code: str, functions: List[Dict]):
+        super().__init__(code)
+        self.functions: Dict[str, Dict] = {f["name"]: f for f in functions}
+
+    def own_ranges(self, name: str) -> List[LineRange]:
+        function = self.functions.get(name)
+        if function is None or "line" not in function:
+            return []
+        return [(function["line"], function.get("endLine", function["line"]))]
+
+    def definition_ranges(self, name: str) -> List[LineRange]:
+        function = self.functions.get(name, {})
+        return [(decl["line"], decl["endLine"]) for decl in function.get("context", [])]
+
+    def callees(self, name: str) -> List[str]:
+        function = self.functions.get(name, {})
+        class_name = function.get("className")
+        targets = []
+        for ref in function.get("refs", []):
+            for candidate in (ref, f"{class_name}.{ref}" if class_name else None):
+                if candidate and candidate != name and candidate in self.functions and candidate not in targets:
+                    targets.append(candidate)
+        return targets
+
+
+def tokens_saved(code: str, context: str) -> int:
+    """Estimated prompt tokens a context saves over sending code whole."""
+    return max(0, estimate_tokens(code) - estimate_tokens(context))
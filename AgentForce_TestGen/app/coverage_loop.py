@@ -0,0 +1,211 @@
+import copy
+import json
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .llm import GenerationStats
+from .metrics import span
+
+# A function to cover, its uncovered lines and the inputs already tested.
+Gap = Tuple[Any, List[int], List[str]]
+
+# (array key, group name key, file extension) of each language's test plan.
+_PLAN_KEYS = {
+    "python": ("test_groups", "function_name", ".py"),
+    "javascript": ("tests", "describe", ".js"),
+}
+
+# Inputs listed in a gap prompt so the LLM does not repeat them.
+MAX_TESTED_INPUTS = 20
+
+_JS_REQUIRE = re.compile(r"const\s*\{([^}]*)\}\s*=\s*require\(")
+
+
+@dataclass
+class CoverageGoal:
+    """
+    When to stop asking for more tests: at target percent line coverage,
+    once the request has used token_budget estimated tokens (0: no budget)
+    or after max_rounds extra rounds. A target of 0 turns the loop off.
+    """
+    target: float = 0.0
+    token_budget: int = 0
+    max_rounds: int = 3
+
+    @classmethod
+    def from_env(cls, target: Optional[float] = None, token_budget: Optional[int] = None) -> "CoverageGoal":
+        return cls(
+            target=float(os.getenv("TESTGEN_COVERAGE_TARGET", "0")) if target is None else target,
+            token_budget=int(os.getenv("TESTGEN_TOKEN_BUDGET", "0")) if token_budget is None else token_budget,
+            max_rounds=int(os.getenv("TESTGEN_COVERAGE_ROUNDS", "3"))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.target > 0 and self.max_rounds > 0
+
+
+def function_range(language: str, function: Any) -> Tuple[str, int, int]:
+    """(name, first line, last line) of a parsed Python or JavaScript function."""
+    if language == "python":
+        return function.name, function.lineno, function.end_lineno
+    return function["name"], function.get("line", 0), function.get("endLine", function.get("line", 0))
+
+
+def module_missing_lines(result: Dict[str, Any], filename: str) -> List[int]:
+    """The uncovered lines a run reported for filename (matched by base name)."""
+    for name, lines in result.get("missing_lines", {}).items():
+        if Path(name).name == filename:
+            return lines
+    return []
+
+
+def map_lines_to_functions(lines: List[int], ranges: List[Tuple[str, int, int]]) -> Dict[str, List[int]]:
+    """Assigns each line to the innermost function whose line range contains it."""
+    mapped: Dict[str, List[int]] = {}
+    for line in lines:
+        containing = [(end - start, name) for name, start, end in ranges if start <= line <= end]
+        if containing:
+            mapped.setdefault(min(containing)[1], []).append(line)
+    return mapped
+
+
+def _tested_inputs(plan: Dict[str, Any], language: str, name: str) -> List[str]:
+    array_key, name_key, _ = _PLAN_KEYS[language]
+    inputs = [
+        str(case.get("input"))
+        for group in plan.get(array_key, []) if group.get(name_key) == name
+        for case in group.get("cases", [])
+    ]
+    return inputs[:MAX_TESTED_INPUTS]
+
+
+def merge_groups(plan: Dict[str, Any], language: str, new_groups: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], int]:
+    """
+    Returns a copy of plan with the cases of new_groups added to the groups of
+    the same function (new groups are appended), and how many cases were new.
+    """
+    array_key, name_key, _ = _PLAN_KEYS[language]
+    merged = copy.deepcopy(plan)
+    groups = {group.get(name_key): group for group in merged.setdefault(array_key, [])}
+    added = 0
+    for new_group in new_groups:
+        name = new_group.get(name_key)
+        group = groups.get(name)
+        if group is None:
+            group = groups[name] = {name_key: name, "cases": []}
+            merged[array_key].append(group)
+            if language == "javascript":
+                merged["imports"] = _add_js_import(merged.get("imports", ""), name.split(".")[0])
+        seen = {json.dumps(case.get("input"), sort_keys=True) for case in group["cases"]}
+        for case in new_group.get("cases", []):
+            marker = json.dumps(case.get("input"), sort_keys=True)
+            if marker not in seen:
+                seen.add(marker)
+                group["cases"].append(case)
+                added += 1
+    return merged, added
+
+
+def _add_js_import(imports: str, name: str) -> str:
+    match = _JS_REQUIRE.search(imports)
+    if match is None:
+        return imports
+    names = [n.strip() for n in match.group(1).split(",") if n.strip()]
+    if name in names:
+        return imports
+    return imports[:match.start(1)] + " " + ", ".join(names + [name]) + " " + imports[match.end(1):]
+
+
+async def run_coverage_rounds(
+    goal: CoverageGoal,
+    language: str,
+    module_name: str,
+    functions: List[Any],
+    plan: Dict[str, Any],
+    test_file_path: Optional[str],
+    result: Dict[str, Any],
+    generate_gaps: Callable[[List[Gap]], Awaitable[List[Dict[str, Any]]]],
+    execute: Callable[[Dict[str, Any]], Awaitable[Tuple[Optional[str], Dict[str, Any]]]],
+    stats: GenerationStats,
+    on_round: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Tuple[Dict[str, Any], Optional[str], Dict[str, Any], Dict[str, Any]]:
+    """
+    Raises coverage of a plan that has already run once. Each round maps the
+    lines the last run missed to the functions containing them, asks the LLM
+    (through generate_gaps) for cases reaching those lines only, and runs the
+    merged plan with execute. Stops at the goal, when the token budget is
+    spent, or when a round adds no cases or no coverage.
+
+    Returns the best (plan, kept test file, run result) and a report. Kept
+    test files of superseded runs are deleted.
+    """
+    ranges = [function_range(language, f) for f in functions]
+    by_name = {name: function for (name, _, _), function in zip(ranges, functions)}
+    filename = module_name + _PLAN_KEYS[language][2]
+    rounds: List[Dict[str, Any]] = []
+    stopped = None
+
+    while stopped is None:
+        coverage = result.get("coverage_percentage")
+        if coverage is None:
+            stopped = "no_coverage"
+        elif coverage >= goal.target:
+            stopped = "target_reached"
+        elif len(rounds) >= goal.max_rounds:
+            stopped = "max_rounds"
+        elif goal.token_budget and stats.tokens >= goal.token_budget:
+            stopped = "token_budget"
+        if stopped is not None:
+            break
+
+        gaps_by_name = map_lines_to_functions(module_missing_lines(result, filename), ranges)
+        if not gaps_by_name:
+            stopped = "no_gaps"
+            break
+
+        tokens_before = stats.tokens
+        with span("coverage.round"):
+            gaps = [
+                (by_name[name], lines, _tested_inputs(plan, language, name))
+                for name, lines in gaps_by_name.items()
+            ]
+            candidate, added = merge_groups(plan, language, await generate_gaps(gaps))
+            round_report: Dict[str, Any] = {
+                "round": len(rounds) + 1,
+                "functions": list(gaps_by_name),
+                "uncovered_lines": sum(len(lines) for lines in gaps_by_name.values()),
+                "new_cases": added,
+            }
+            if added:
+                new_path, new_result = await execute(candidate)
+                round_report["coverage_percentage"] = new_result.get("coverage_percentage")
+        round_report["tokens"] = stats.tokens - tokens_before
+        rounds.append(round_report)
+        if on_round is not None:
+            on_round(round_report)
+
+        if not added:
+            stopped = "no_new_cases"
+        elif (new_result.get("coverage_percentage") or 0) <= coverage:
+            # No progress: keep the previous plan and drop this run's file.
+            if new_path is not None and new_path != test_file_path:
+                Path(new_path).unlink(missing_ok=True)
+            stopped = "no_progress"
+        else:
+            if test_file_path is not None and test_file_path != new_path:
+                Path(test_file_path).unlink(missing_ok=True)
+            plan, test_file_path, result = candidate, new_path, new_result
+
+    report = {
+        "target": goal.target,
+        "token_budget": goal.token_budget,
+        "rounds": rounds,
+        "stopped": stopped,
+        "coverage_percentage": result.get("coverage_percentage"),
+        "tokens": stats.tokens,
+    }
+    return plan, test_file_path, result, report
@@ -0,0 +1,237 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .admission import BATCH, current_priority
+from .cache import TieredCache, cache_from_env, make_key
+from .context import JSContext, PythonContext
+from .llm import GenerationStats, LLMWrapper
+from .metrics import CACHE_REQUESTS, in_context
+from .parser import FunctionInfo, function_source, hash_source
+
+
+class IncrementalGenerator:
+    """
+    Generates tests one function at a time instead of one prompt per file.
+
+    Every function is keyed by the hash of its normalized AST and the context
+    its prompt is built from (the callees, imports and constants it uses), so
+    a changed helper also invalidates the groups of its callers. Test groups
+    for functions that were seen before are reused from the group store; only
+    new or changed functions are sent to the LLM, at most max_concurrency at
+    once.
+    Calls made with batch priority get threads of their own (at most
+    batch_concurrency, default max_concurrency), so batch calls waiting for
+    admission never hold the threads interactive calls need to reach it.
+    """
+
+    def __init__(
+        self,
+        llm: LLMWrapper,
+        store: Optional[TieredCache] = None,
+        max_concurrency: int = 4,
+        batch_concurrency: Optional[int] = None
+    ):
+        self.llm = llm
+        if store is None:
+            store = cache_from_env("TESTGEN_GROUP_CACHE", Path(__file__).parent.parent / ".cache" / "groups")
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="testgen-fn")
+        self._batch_executor = ThreadPoolExecutor(
+            max_workers=max(1, batch_concurrency or max_concurrency), thread_name_prefix="testgen-fn-batch"
+        )
+
+    def _pool(self) -> ThreadPoolExecutor:
+        return self._batch_executor if current_priority() == BATCH else self._executor
+
+    def _group_key(self, language: str, name: str, ast_hash: str, context_hash: str) -> str:
+        return make_key("group", language, name, ast_hash, context_hash, self.llm.model_name, self.llm.generation_config)
+
+    def _collect_groups(
+        self,
+        language: str,
+        items: List[Tuple[str, str, str]],
+        generate_one: Callable[[int], Dict[str, Any]],
+        on_group: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        items holds (name, ast_hash, context_hash) per function in file
+        order, where context_hash identifies the source its prompt is built
+        from. Returns the merged groups in the same order plus reuse
+        statistics. on_group, if given, is called with each group as soon as
+        it is available: reused groups first, then generated ones in
+        completion order.
+        """
+        groups: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        keys = [self._group_key(language, *item) for item in items]
+
+        pending = []
+        for index, key in enumerate(keys):
+            cached = self.store.get(key) if items[index][1] else None
+            CACHE_REQUESTS.inc(cache="groups", result="hit" if cached is not None else "miss")
+            if cached is not None:
+                groups[index] = json.loads(cached)
+                if on_group is not None:
+                    on_group(groups[index])
+            else:
+                pending.append(index)
+
+        failed = []
+        pool = self._pool()
+        futures = {pool.submit(in_context(generate_one, index)): index for index in pending}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                group = future.result()
+            except (RuntimeError, ValueError) as e:
+                print(f"Test generation failed for {items[index][0]}: {e}")
+                failed.append(items[index][0])
+                continue
+            groups[index] = group
+            if items[index][1]:
+                self.store.set(keys[index], json.dumps(group))
+            if on_group is not None:
+                on_group(group)
+
+        if items and len(failed) == len(items):
+            raise RuntimeError("Failed to generate valid tests for any function.")
+
+        stats = {
+            "mode": "incremental",
+            "functions": len(items),
+            "reused": len(items) - len(pending),
+            "generated": len(pending) - len(failed),
+            "failed": failed,
+        }
+        return [g for g in groups if g is not None], stats
+
+    # --- PYTHON ---
+    def generate_python(
+        self,
+        code: str,
+        functions: List[FunctionInfo],
+        on_group: Optional[Callable[[Dict[str, Any]], None]] = None,
+        stats: Optional[GenerationStats] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        # Each prompt gets the function plus the helpers, imports and
+        # constants it uses, within the context budget.
+        context = PythonContext(code)
+        sources = [context.build([f.name], whole_file=False) for f in functions]
+
+        def generate_one(index: int) -> Dict[str, Any]:
+            function = functions[index]
+            raw = json.loads(self.llm.generate_function_tests(sources[index], function, stats))
+            raw_groups = raw.get("test_groups", [])
+            matching = [g for g in raw_groups if g.get("function_name") == function.name] or raw_groups
+            return {
+                "function_name": function.name,
+                "cases": [case for g in matching for case in g.get("cases", [])]
+            }
+
+        items = [(f.name, f.ast_hash, hash_source(source)) for f, source in zip(functions, sources)]
+        groups, stats = self._collect_groups("python", items, generate_one, on_group)
+        return {"test_groups": groups}, stats
+
+    # --- JAVASCRIPT ---
+    def generate_js(
+        self,
+        code: str,
+        functions: List[Dict],
+        module_name: str,
+        on_group: Optional[Callable[[Dict[str, Any]], None]] = None,
+        stats: Optional[GenerationStats] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        context = JSContext(code, functions)
+        functions = testable_js_functions(functions)
+        sources = [
+            context.build([f["name"]], whole_file=False) if "line" in f else code
+            for f in functions
+        ]
+
+        def generate_one(index: int) -> Dict[str, Any]:
+            function = functions[index]
+            raw = json.loads(self.llm.generate_js_function_tests(sources[index], function, stats))
+            cases = [case for suite in raw.get("tests", []) for case in suite.get("cases", [])]
+            matching = [c for c in cases if c.get("function_to_test") == function["name"]] or cases
+            return {"describe": function["name"], "cases": matching}
+
+        # JavaScript functions are hashed by source text, so their context is too.
+        items = [(f["name"], f.get("hash", ""), make_key(source)) for f, source in zip(functions, sources)]
+        groups, stats = self._collect_groups("javascript", items, generate_one, on_group)
+        # Static methods are called as Class.method, so the class is what gets imported.
+        names = ", ".join(dict.fromkeys(g["describe"].split(".")[0] for g in groups))
+        return {
+            "imports": f"const {{ {names} }} = require('../examples/{module_name}');",
+            "tests": groups
+        }, stats
+
+
+    # --- COVERAGE GAPS ---
+    def generate_python_gaps(
+        self,
+        code: str,
+        gaps: List[Tuple[FunctionInfo, List[int], List[str]]],
+        stats: Optional[GenerationStats] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        gaps holds (function, uncovered lines, inputs already tested). Returns
+        one group of new cases per function that got any. Not stored: the
+        cases depend on which lines the earlier tests missed.
+        """
+        def generate_one(gap: Tuple[FunctionInfo, List[int], List[str]]) -> Dict[str, Any]:
+            function, lines, tested = gap
+            raw = json.loads(self.llm.generate_gap_tests(function_source(code, function), function, lines, tested, stats))
+            raw_groups = raw.get("test_groups", [])
+            matching = [g for g in raw_groups if g.get("function_name") == function.name] or raw_groups
+            return {"function_name": function.name, "cases": [case for g in matching for case in g.get("cases", [])]}
+
+        return self._generate_each(gaps, generate_one)
+
+    def generate_js_gaps(
+        self,
+        code: str,
+        gaps: List[Tuple[Dict, List[int], List[str]]],
+        stats: Optional[GenerationStats] = None
+    ) -> List[Dict[str, Any]]:
+        """JavaScript counterpart of generate_python_gaps."""
+        def generate_one(gap: Tuple[Dict, List[int], List[str]]) -> Dict[str, Any]:
+            function, lines, tested = gap
+            source = code[function["start"]:function["end"]] if "start" in function else code
+            raw = json.loads(self.llm.generate_js_gap_tests(source, function, lines, tested, stats))
+            cases = [case for suite in raw.get("tests", []) for case in suite.get("cases", [])]
+            matching = [c for c in cases if c.get("function_to_test") == function["name"]] or cases
+            return {"describe": function["name"], "cases": matching}
+
+        return self._generate_each(gaps, generate_one)
+
+    def _generate_each(self, items: List[Any], generate_one: Callable[[Any], Dict[str, Any]]) -> List[Dict[str, Any]]:
+        pool = self._pool()
+        futures = [pool.submit(in_context(generate_one, item)) for item in items]
+        groups = []
+        for future in futures:
+            try:
+                group = future.result()
+            except (RuntimeError, ValueError) as e:
+                print(f"Coverage gap generation failed: {e}")
+                continue
+            if group["cases"]:
+                groups.append(group)
+        return groups
+
+
+def testable_js_functions(functions: List[Dict]) -> List[Dict]:
+    """
+    Keeps the functions a generated test can call through require(): instance
+    methods are dropped, and when the module declares exports only exported
+    functions (and static methods of exported classes) are kept.
+    """
+    callable_functions = [f for f in functions if f.get("kind") != "method" or f.get("static")]
+    if any(f.get("exported") for f in callable_functions):
+        callable_functions = [f for f in callable_functions if f.get("exported")]
+    return callable_functions
+
+
+def incremental_enabled() -> bool:
+    return os.getenv("TESTGEN_INCREMENTAL", "1") != "0"
@@ -0,0 +1,127 @@
+import asyncio
+import contextvars
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+JobHandler = Callable[[str, str, str], Awaitable[Dict[str, Any]]]
+
+_current_job: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("testgen_job", default=None)
+
+
+def current_job_id() -> Optional[str]:
+    """Id of the job whose handler is running, for handlers that need it."""
+    return _current_job.get()
+
+
+@dataclass
+class Job:
+    id: str
+    language: str
+    filename: str
+    content: Optional[str]
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "language": self.language,
+            "filename": self.filename,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    In-process job queue. Submitted jobs are picked up by a fixed number of
+    asyncio workers, so the number of pipelines in flight is bounded by
+    num_workers and never by the number of connected clients.
+    """
+
+    def __init__(self, handler: JobHandler, num_workers: int = 4, max_finished_jobs: int = 1000):
+        self.handler = handler
+        self.num_workers = max(1, num_workers)
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"testgen-worker-{i}")
+            for i in range(self.num_workers)
+        ]
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def submit(self, language: str, filename: str, content: str) -> Job:
+        if self._queue is None:
+            raise RuntimeError("JobManager has not been started.")
+        job = Job(id=uuid.uuid4().hex, language=language, filename=filename, content=content)
+        self.jobs[job.id] = job
+        self._queue.put_nowait(job)
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def queue_size(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.status = RUNNING
+            job.started_at = time.time()
+            token = _current_job.set(job.id)
+            try:
+                job.result = await self.handler(job.language, job.filename, job.content)
+                job.status = COMPLETED
+            except asyncio.CancelledError:
+                job.status = FAILED
+                job.error = "Job was cancelled."
+                raise
+            except Exception as e:
+                job.status = FAILED
+                job.error = str(e)
+            finally:
+                _current_job.reset(token)
+                job.finished_at = time.time()
+                # The uploaded source is not needed once the job is done.
+                job.content = None
+                self._queue.task_done()
+
+    def _prune(self) -> None:
+        """Drops the oldest finished jobs once more than max_finished_jobs are kept."""
+        finished = [j for j in self.jobs.values() if j.status in (COMPLETED, FAILED)]
+        overflow = len(finished) - self.max_finished_jobs
+        if overflow <= 0:
+            return
+        finished.sort(key=lambda j: j.finished_at or 0)
+        for job in finished[:overflow]:
+            del self.jobs[job.id]
@@ -1,8 +1,188 @@
+import asyncio
+import collections
+import itertools
+import os
+import struct
 import subprocess
 import json
+import threading
+from concurrent.futures import Future
 from pathlib import Path
-import tempfile
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+from .metrics import span
+
+PARSER_SCRIPT_PATH = Path(__file__).parent.parent / "js" / "parser.js"
+
+
+def _decode_functions(stdout: str) -> List[Dict[str, Any]]:
+    try:
+        # Parse the JSON output from the script
+        parsed_data = json.loads(stdout)
+        return parsed_data.get("functions", [])
+    except json.JSONDecodeError:
+        # Handle cases where the output is not valid JSON
+        raise ValueError("Could not decode JSON from JavaScript parser.")
+
+
+class _ParserWorker:
+    """
+    One long-lived `node parser.js --daemon` process. Requests and responses
+    are length-prefixed JSON frames tagged with an id, so several callers can
+    have requests in flight on the same process at once.
+    """
+
+    def __init__(self, command: Optional[List[str]] = None):
+        self.process = subprocess.Popen(
+            command or ["node", str(PARSER_SCRIPT_PATH), "--daemon"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        self._pending: Dict[int, Future] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stderr_tail = collections.deque(maxlen=20)
+        threading.Thread(target=self._read_responses, daemon=True).start()
+        threading.Thread(target=self._read_stderr, daemon=True).start()
+
+    @property
+    def alive(self) -> bool:
+        return not self._closed and self.process.poll() is None
+
+    @property
+    def load(self) -> int:
+        return len(self._pending)
+
+    def submit(self, source: str) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if not self.alive:
+                raise RuntimeError("JavaScript parser worker is not running.")
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            # A caller that gives up cancels the future; forget it so its
+            # answer, if it still comes, is dropped.
+            future.add_done_callback(lambda f: self._forget(request_id) if f.cancelled() else None)
+            body = json.dumps({"id": request_id, "source": source}).encode("utf-8")
+            try:
+                self.process.stdin.write(struct.pack(">I", len(body)) + body)
+                self.process.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                self._pending.pop(request_id, None)
+                raise RuntimeError(f"JavaScript parser worker is not running: {e}")
+        return future
+
+    def _forget(self, request_id: int) -> None:
+        with self._lock:
+            self._pending.pop(request_id, None)
+
+    def _read_exact(self, size: int) -> Optional[bytes]:
+        data = self.process.stdout.read(size)
+        return data if data is not None and len(data) == size else None
+
+    def _read_responses(self) -> None:
+        while True:
+            header = self._read_exact(4)
+            if header is None:
+                break
+            body = self._read_exact(struct.unpack(">I", header)[0])
+            if body is None:
+                break
+            response = json.loads(body)
+            with self._lock:
+                future = self._pending.pop(response.get("id"), None)
+            # Claiming the future fails if the caller cancelled it meanwhile.
+            if future is None or not future.set_running_or_notify_cancel():
+                continue
+            if "error" in response:
+                future.set_exception(RuntimeError(f"JavaScript parser failed: {response['error']}"))
+            else:
+                future.set_result(response.get("functions", []))
+
+        # The process exited: fail everything that was still waiting on it.
+        self.process.wait()
+        stderr = "".join(self._stderr_tail)
+        with self._lock:
+            self._closed = True
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError(f"JavaScript parser worker exited unexpectedly: {stderr}"))
+
+    def _read_stderr(self) -> None:
+        for line in iter(self.process.stderr.readline, b""):
+            self._stderr_tail.append(line.decode("utf-8", errors="ignore"))
+
+    def stop(self) -> None:
+        if self.alive:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class JSParserPool:
+    """
+    Pool of persistent Node parser workers. Each request goes to the least
+    busy worker; workers that have crashed are replaced on the next request.
+    """
+
+    def __init__(self, size: int = 2, timeout: float = 30.0, command: Optional[List[str]] = None):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.command = command
+        self._workers: List[_ParserWorker] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if not self._workers:
+                self._workers = [_ParserWorker(self.command) for _ in range(self.size)]
+
+    def stop(self) -> None:
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop()
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers)
+
+    def _pick_worker(self) -> _ParserWorker:
+        with self._lock:
+            for index, worker in enumerate(self._workers):
+                if not worker.alive:
+                    print("JavaScript parser worker died; restarting it.")
+                    self._workers[index] = _ParserWorker(self.command)
+            return min(self._workers, key=lambda w: w.load)
+
+    def submit(self, source: str) -> Future:
+        return self._pick_worker().submit(source)
+
+    def parse(self, source: str) -> List[Dict[str, Any]]:
+        future = self.submit(source)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    async def parse_async(self, source: str) -> List[Dict[str, Any]]:
+        return await asyncio.wait_for(asyncio.wrap_future(self.submit(source)), self.timeout)
+
+
+# Started by the app on startup; parse_js_file falls back to a one-shot
+# node process when the pool is not running (scripts, tests).
+parser_pool = JSParserPool(size=int(os.getenv("TESTGEN_JS_PARSER_POOL", "2")))
+
+
+def _parser_command() -> List[str]:
+    # The source is piped over stdin, so no temporary file is needed.
+    return ["node", str(PARSER_SCRIPT_PATH), "-"]
 
 
 def parse_js_file(file_content: str) -> List[Dict[str, Any]]:
@@ -15,38 +195,44 @@ def parse_js_file(file_content: str) -> List[Dict[str, Any]]:
     Returns:
         A list of dictionaries, where each dictionary contains info about a function.
     """
-    # Create a temporary file to hold the JavaScript content
-    # This is safer than relying on the original file path
-    with tempfile.NamedTemporaryFile(mode='w+', suffix='.js', delete=False, encoding='utf-8') as temp_file:
-        temp_file.write(file_content)
-        temp_file_path = temp_file.name
+    if parser_pool.started:
+        with span("parse.javascript.pool"):
+            return parser_pool.parse(file_content)
 
-    try:
-        # Define the path to the Node.js parser script
-        parser_script_path = Path(__file__).parent.parent / "js" / "parser.js"
-
-        # Construct the command to run the Node.js script
-        command = ["node", str(parser_script_path), temp_file_path]
-
-        # Execute the command
-        result = subprocess.run(
-            command,
-            capture_output=True,
+    with span("parse.javascript.spawn"):
+        process = subprocess.Popen(
+            _parser_command(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             text=True,
-            check=True # Raise an exception if the script fails
+            encoding='utf-8'
         )
+    with span("parse.javascript.execute"):
+        stdout, stderr = process.communicate(file_content)
+    if process.returncode != 0:
+        # Handle cases where the Node.js script returns an error
+        raise RuntimeError(f"JavaScript parser failed: {stderr}")
+    return _decode_functions(stdout)
 
-        # Parse the JSON output from the script
-        parsed_data = json.loads(result.stdout)
-        return parsed_data.get("functions", [])
 
-    except subprocess.CalledProcessError as e:
-        # Handle cases where the Node.js script returns an error
-        raise RuntimeError(f"JavaScript parser failed: {e.stderr}")
-    except json.JSONDecodeError:
-        # Handle cases where the output is not valid JSON
-        raise ValueError("Could not decode JSON from JavaScript parser.")
-    finally:
-        # Clean up the temporary file
-        if 'temp_file_path' in locals() and Path(temp_file_path).exists():
-            Path(temp_file_path).unlink()
\ No newline at end of file
+async def parse_js_file_async(file_content: str) -> List[Dict[str, Any]]:
+    """
+    Async variant of parse_js_file that does not block the event loop.
+    """
+    if parser_pool.started:
+        with span("parse.javascript.pool"):
+            return await parser_pool.parse_async(file_content)
+
+    with span("parse.javascript.spawn"):
+        process = await asyncio.create_subprocess_exec(
+            *_parser_command(),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+    with span("parse.javascript.execute"):
+        stdout, stderr = await process.communicate(file_content.encode("utf-8"))
+    if process.returncode != 0:
+        raise RuntimeError(f"JavaScript parser failed: {stderr.decode('utf-8', errors='ignore')}")
+    return _decode_functions(stdout.decode('utf-8'))
@@ -1,80 +1,506 @@
+import asyncio
+import os
+import re
 import subprocess
 import json
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 
-def run_js_tests_and_get_coverage(test_file_path: str, module_name: str) -> Dict[str, Any]:
-    """
-    Runs Jest with coverage and returns a parsed report.
-    """
+from .limits import (
+    EVENTS_FILE, RunLimits, Watchdog, kill_group, kill_reason, partial_result, read_capped, read_events
+)
+from .metrics import span
+from .js_parser import parse_js_file
+from .run_cache import run_cache, run_cache_bypassed
+from .runner import TestEventCallback, read_capped_async, read_test_events
+from .selection import SelectionPlan, js_snapshot, selection_enabled
+from .sharding import count_js_tests, duration_store, js_shard_sources, shard_count
+from .workspace import SUPPORT_MANIFEST, Workspace, read_support_manifest
+
+PROJECT_ROOT = Path(__file__).parent.parent
+STREAM_REPORTER = Path(__file__).parent.parent / "js" / "stream_reporter.js"
+COVERAGE_CONTEXTS = Path(__file__).parent.parent / "js" / "coverage_contexts.js"
+
+def _jest_paths(workspace: Optional[Workspace] = None) -> Dict[str, Path]:
+    project_root = Path(__file__).parent.parent
+    jest_cli_path = project_root / "node_modules" / "jest" / "bin" / "jest.js"
+
+    if not jest_cli_path.exists():
+        raise FileNotFoundError("jest.js not found. Please run 'npm install jest'.")
+
+    # With a workspace, Jest uses it as rootDir and writes every output file
+    # there, so concurrent runs do not overwrite each other's results.
+    root = workspace.root if workspace is not None else project_root
+    return {
+        "root": root,
+        "jest_cli": jest_cli_path,
+        "results": root / 'jest_results.json',
+        "coverage_dir": root / "coverage",
+        "coverage_summary": root / "coverage" / "coverage-summary.json",
+        "coverage_final": root / "coverage" / "coverage-final.json",
+        "coverage_contexts": root / "coverage_contexts.jsonl",
+        "events": root / EVENTS_FILE,
+    }
+
+def _build_command(
+    test_files: List[str],
+    module_name: str,
+    paths: Dict[str, Path],
+    limits: RunLimits,
+    contexts: bool = False,
+    selection: Optional[SelectionPlan] = None
+) -> List[str]:
+    # --- FIX: Use a relative path for the coverage collection ---
+    # This is more robust for Jest across different platforms.
+    source_file_relative = f"examples/{module_name}.js"
+
+    command = [
+        "node",
+        str(paths["jest_cli"]),
+        *test_files,
+        f"--rootDir={paths['root']}",
+        "--coverage",
+        # Use the relative path here
+        f"--collectCoverageFrom={source_file_relative}",
+        f"--coverageDirectory={paths['coverage_dir']}",
+        "--coverageReporters=json-summary",
+        # Per-statement hit counts, for the lines no test reached.
+        "--coverageReporters=json",
+        "--json",
+        f"--outputFile={paths['results']}",
+        # Records every test in the events file (and streams it when asked).
+        "--reporters=default",
+        f"--reporters={STREAM_REPORTER}"
+    ]
+    if limits.test_timeout > 0:
+        # Only bounds async tests; a synchronous loop blocks Jest's timer and
+        # is stopped by the run's wall-clock limit instead.
+        command.append(f"--testTimeout={int(limits.test_timeout * 1000)}")
+    if contexts:
+        command.append(f"--setupFilesAfterEnv={COVERAGE_CONTEXTS}")
+    if len(test_files) > 1:
+        # One worker per shard; Jest merges their results and coverage.
+        command.append(f"--maxWorkers={len(test_files)}")
+    if selection is not None and selection.selected is not None:
+        # Full test names start with their describe block's name.
+        names = "|".join(re.escape(name) for name in selection.selected) or "(?!)"
+        command.append(f"--testNamePattern=^(?:{names}) ")
+    return command
+
+def _plan_selection(
+    test_file_path: str,
+    module_name: str,
+    paths: Dict[str, Path],
+    use_cache: bool
+) -> Optional[SelectionPlan]:
+    """JavaScript counterpart of runner._plan_selection: describe blocks are the selectable tests."""
+    if not selection_enabled():
+        return None
     try:
-        project_root = Path(__file__).parent.parent
-        jest_cli_path = project_root / "node_modules" / "jest" / "bin" / "jest.js"
-
-        if not jest_cli_path.exists():
-            raise FileNotFoundError("jest.js not found. Please run 'npm install jest'.")
-
-        # --- FIX: Use a relative path for the coverage collection ---
-        # This is more robust for Jest across different platforms.
-        source_file_relative = f"examples/{module_name}.js"
-        
-        results_path = project_root / 'jest_results.json'
-        coverage_summary_path = project_root / "coverage" / "coverage-summary.json"
-
-        command = [
-            "node",
-            str(jest_cli_path),
-            test_file_path,
-            "--coverage",
-            # Use the relative path here
-            f"--collectCoverageFrom={source_file_relative}",
-            "--coverageReporters=json-summary",
-            "--json",
-            f"--outputFile={results_path}"
-        ]
-
-        subprocess.run(
-            command,
-            cwd=project_root,
-            capture_output=True,
-            text=True,
-            check=True,
-            encoding='utf-8'
+        source = (paths["root"] / "examples" / f"{module_name}.js").read_text(encoding="utf-8")
+        snapshot = js_snapshot(
+            source, parse_js_file(source), Path(test_file_path).read_text(encoding="utf-8"),
+            read_support_manifest(paths["root"])
         )
+    except (OSError, RuntimeError, ValueError):
+        return None
+    return SelectionPlan("javascript", module_name, snapshot, carry=use_cache and not run_cache_bypassed())
 
-        with open(results_path, 'r', encoding='utf-8') as f:
-            results = json.load(f)
+def _finish_selection(
+    selection: Optional[SelectionPlan],
+    result: Dict[str, Any],
+    module_name: str,
+    paths: Dict[str, Path],
+    contexts: bool
+) -> Dict[str, Any]:
+    """Maps the per-test statement ids to lines through coverage-final.json and finishes the selection."""
+    if selection is None:
+        return result
+    file_name = f"{module_name}.js"
+    statements: Dict[str, int] = {}
+    try:
+        with open(paths["coverage_final"], 'r', encoding='utf-8') as f:
+            for file_path, data in json.load(f).items():
+                if Path(file_path).name == file_name:
+                    statements = {sid: loc["start"]["line"] for sid, loc in data.get("statementMap", {}).items()}
+    except (OSError, ValueError):
+        pass
+    elements = {}
+    for case, items in (result.get("test_coverage") or {}).items():
+        hit = [item.rpartition(":")[2] for item in items if item.rpartition(":")[0] == file_name]
+        elements[case] = [(statements[e[1:]],) for e in hit if e.startswith("s") and e[1:] in statements]
+    return selection.finish(
+        result, elements, read_events(paths["events"])[0],
+        lambda test: test, lambda element: f"{file_name}:L{element[0]}", contexts
+    )
 
-        coverage_pct = 0.0
-        if coverage_summary_path.exists():
-            with open(coverage_summary_path, 'r', encoding='utf-8') as f:
-                coverage_data = json.load(f)
-                coverage_pct = coverage_data.get("total", {}).get("lines", {}).get("pct", 0.0)
+def _shard_files(test_file_path: str, shards: Optional[int]) -> List[str]:
+    """
+    The test files to run: the generated file itself, or, for a large
+    suite, shard files of its describe blocks written next to it (see
+    sharding.js_shard_sources), which Jest runs on parallel workers.
+    """
+    path = Path(test_file_path)
+    source = path.read_text(encoding="utf-8")
+    shards = shard_count(count_js_tests(source)) if shards is None else shards
+    sources = js_shard_sources(source, duration_store.get("javascript", source), shards)
+    if len(sources) <= 1:
+        return [test_file_path]
+    stem = path.name[:-len(".test.js")] if path.name.endswith(".test.js") else path.stem
+    files = []
+    for index, shard_source in enumerate(sources):
+        shard_path = path.with_name(f"{stem}.shard{index}.test.js")
+        shard_path.write_text(shard_source, encoding="utf-8")
+        files.append(str(shard_path))
+    return files
 
-        if results_path.exists():
-            results_path.unlink()
+def _record_durations(test_file_path: str, paths: Dict[str, Path]) -> None:
+    source = Path(test_file_path).read_text(encoding="utf-8")
+    duration_store.update("javascript", source, read_events(paths["events"])[0])
 
-        summary = f"{results.get('numPassedTests', 0)} tests passed out of {results.get('numTotalTests', 0)}."
+def _remove_shard_files(test_file_path: str, test_files: List[str]) -> None:
+    for file in test_files:
+        if file != test_file_path:
+            Path(file).unlink(missing_ok=True)
 
-        return {
-            "status": "Success" if results.get('numFailedTests', 0) == 0 else "Tests Failed",
-            "summary": summary,
-            "coverage_percentage": coverage_pct,
-            "full_log": results
+def _with_shards(result: Dict[str, Any], test_files: List[str]) -> Dict[str, Any]:
+    if len(test_files) > 1:
+        result["shards"] = len(test_files)
+    return result
+
+def _jest_env(paths: Dict[str, Path], limits: RunLimits, contexts: bool = False, stream: bool = False) -> Dict[str, str]:
+    """
+    Environment for a Jest run: the events file, the V8 heap limit (RLIMIT_AS
+    does not suit Node, which reserves much more address space than it uses),
+    and the output of js/coverage_contexts.js when contexts are recorded.
+    """
+    env = dict(os.environ)
+    paths["events"].unlink(missing_ok=True)
+    env["TESTGEN_EVENTS_FILE"] = str(paths["events"])
+    if stream:
+        env["TESTGEN_STREAM_EVENTS"] = "1"
+    if limits.memory_mb > 0:
+        env["NODE_OPTIONS"] = " ".join(filter(None, [
+            env.get("NODE_OPTIONS"), f"--max-old-space-size={limits.memory_mb}"
+        ]))
+    if contexts:
+        paths["coverage_contexts"].unlink(missing_ok=True)
+        env["TESTGEN_COVERAGE_CONTEXTS"] = str(paths["coverage_contexts"])
+    return env
+
+def get_test_contexts(contexts_path: Path, results: Dict[str, Any]) -> Tuple[Dict[str, List[str]], Dict[str, float]]:
+    """
+    Reads what each test covered from the lines js/coverage_contexts.js
+    appended (one per test file), and how long each test took from Jest's
+    --json results. Returns ({test name: ["file:s<id>" statements and
+    "file:b<id>.<arm>" branches]}, {test name: seconds}).
+    """
+    durations = {
+        test.get("fullName", ""): (test.get("duration") or 0) / 1000
+        for file_result in results.get("testResults", [])
+        for test in file_result.get("assertionResults", [])
+    }
+    contexts: Dict[str, set] = {}
+    if contexts_path.exists():
+        with open(contexts_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    for test_name, elements in json.loads(line).items():
+                        contexts.setdefault(test_name, set()).update(elements)
+    return {name: sorted(elements) for name, elements in contexts.items()}, durations
+
+def get_test_outcomes(results: Dict[str, Any]) -> Dict[str, str]:
+    """{test name: Jest status ("passed", "failed", "pending", ...)} from Jest's --json results."""
+    return {
+        test.get("fullName", ""): test.get("status", "")
+        for file_result in results.get("testResults", [])
+        for test in file_result.get("assertionResults", [])
+    }
+
+def _build_result(
+    stdout: str,
+    stderr: str,
+    paths: Dict[str, Path],
+    contexts: bool = False,
+    returncode: Optional[int] = None,
+    timed_out: bool = False
+) -> Dict[str, Any]:
+    """
+    Reads the files Jest wrote and turns them into the runner's result dict.
+    A run that was killed (timeout, CPU limit, signal) gets partial_result.
+    """
+    reason = kill_reason(returncode, timed_out)
+    if reason is not None:
+        return partial_result(reason, paths["events"], (stdout or "") + (stderr or ""))
+    with span("run.jest.results"):
+        result = _collect_result(stdout, stderr, paths)
+    if contexts and "coverage_percentage" in result:
+        with span("run.test_contexts"):
+            result["test_coverage"], result["test_durations"] = get_test_contexts(
+                paths["coverage_contexts"], result["full_log"]
+            )
+            result["test_outcomes"] = get_test_outcomes(result["full_log"])
+    return result
+
+def get_missing_lines(coverage_final_path: Path, root: Path) -> Dict[str, List[int]]:
+    """Returns {path relative to root: [lines of statements never executed]} from coverage-final.json."""
+    if not coverage_final_path.exists():
+        return {}
+    with open(coverage_final_path, 'r', encoding='utf-8') as f:
+        coverage_data = json.load(f)
+    missing = {}
+    for file_path, data in coverage_data.items():
+        statements = data.get("statementMap", {})
+        lines = {
+            statements[statement_id]["start"]["line"]
+            for statement_id, hits in data.get("s", {}).items()
+            if hits == 0 and statement_id in statements
         }
+        if lines:
+            try:
+                name = Path(file_path).relative_to(root).as_posix()
+            except ValueError:
+                name = file_path
+            missing[name] = sorted(lines)
+    return missing
 
-    except subprocess.CalledProcessError as e:
-        stdout = (e.stdout or b"").decode('utf-8', errors='ignore')
-        stderr = (e.stderr or b"").decode('utf-8', errors='ignore')
+def _collect_result(stdout: str, stderr: str, paths: Dict[str, Path]) -> Dict[str, Any]:
+    results_path = paths["results"]
+    if not results_path.exists():
+        # Jest exits non-zero on failing tests too, so only treat the run as
+        # broken when it did not produce a results file at all.
         return {
             "status": "Error",
             "summary": "Jest execution failed.",
             "error": "Jest process returned a non-zero exit code.",
-            "full_log": stdout + stderr
+            "full_log": (stdout or "") + (stderr or "")
         }
+
+    with open(results_path, 'r', encoding='utf-8') as f:
+        results = json.load(f)
+
+    coverage_pct = 0.0
+    lines = {"covered": 0, "total": 0}
+    coverage_summary_path = paths["coverage_summary"]
+    if coverage_summary_path.exists():
+        with open(coverage_summary_path, 'r', encoding='utf-8') as f:
+            coverage_data = json.load(f)
+            total_lines = coverage_data.get("total", {}).get("lines", {})
+            coverage_pct = total_lines.get("pct", 0.0)
+            lines = {"covered": total_lines.get("covered", 0), "total": total_lines.get("total", 0)}
+
+    results_path.unlink()
+
+    summary = f"{results.get('numPassedTests', 0)} tests passed out of {results.get('numTotalTests', 0)}."
+
+    return {
+        "status": "Success" if results.get('numFailedTests', 0) == 0 else "Tests Failed",
+        "summary": summary,
+        "coverage_percentage": coverage_pct,
+        "lines": lines,
+        "missing_lines": get_missing_lines(paths["coverage_final"], paths["root"]),
+        "full_log": results
+    }
+
+def _unexpected_error(e: Exception) -> Dict[str, Any]:
+    return {
+        "status": "Error",
+        "summary": "An unexpected error occurred during test execution.",
+        "error": str(e)
+    }
+
+def _cache_key(
+    test_file_path: str,
+    module_name: str,
+    paths: Dict[str, Path],
+    limits: RunLimits,
+    contexts: bool,
+    use_cache: bool
+) -> Optional[str]:
+    """The run cache key of this run, or None if the cache is off or bypassed."""
+    if not use_cache or not run_cache.enabled:
+        return None
+    return run_cache.key(
+        "javascript", module_name, paths["root"] / "examples" / f"{module_name}.js", Path(test_file_path),
+        limits, contexts, [PROJECT_ROOT / "package.json", STREAM_REPORTER, COVERAGE_CONTEXTS, paths["root"] / SUPPORT_MANIFEST]
+    )
+
+def _coverage_files(paths: Dict[str, Path]) -> Dict[str, Path]:
+    return {"coverage-summary.json": paths["coverage_summary"], "coverage-final.json": paths["coverage_final"]}
+
+def _run_sync(
+    test_files: List[str],
+    module_name: str,
+    paths: Dict[str, Path],
+    limits: RunLimits,
+    contexts: bool,
+    selection: Optional[SelectionPlan] = None
+) -> Dict[str, Any]:
+    command = _build_command(test_files, module_name, paths, limits, contexts, selection)
+    with span("run.jest.spawn"):
+        process = subprocess.Popen(
+            command,
+            cwd=paths["root"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=_jest_env(paths, limits, contexts),
+            start_new_session=True,
+            preexec_fn=limits.preexec(address_space=False)
+        )
+    watchdog = Watchdog(process.pid, limits.run_timeout)
+    try:
+        with span("run.jest.execute"):
+            output = read_capped(process.stdout, limits.output_bytes)
+            process.wait()
+    finally:
+        watchdog.cancel()
+    return _build_result(
+        output.decode('utf-8', errors='ignore'), "", paths, contexts, process.returncode, watchdog.fired
+    )
+
+async def _run_async(
+    test_files: List[str],
+    module_name: str,
+    paths: Dict[str, Path],
+    limits: RunLimits,
+    on_test: Optional[TestEventCallback],
+    contexts: bool,
+    selection: Optional[SelectionPlan] = None
+) -> Dict[str, Any]:
+    command = _build_command(test_files, module_name, paths, limits, contexts, selection)
+    with span("run.jest.spawn"):
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            cwd=paths["root"],
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=_jest_env(paths, limits, contexts, stream=on_test is not None),
+            start_new_session=True,
+            preexec_fn=limits.preexec(address_space=False)
+        )
+    watchdog = Watchdog(process.pid, limits.run_timeout)
+    try:
+        with span("run.jest.execute"):
+            if on_test is not None:
+                read_stdout = read_test_events(process.stdout, on_test, limits.output_bytes)
+            else:
+                read_stdout = read_capped_async(process.stdout, limits.output_bytes)
+            stdout, stderr = await asyncio.gather(
+                read_stdout,
+                read_capped_async(process.stderr, limits.output_bytes)
+            )
+            await process.wait()
+    finally:
+        watchdog.cancel()
+        if process.returncode is None:
+            kill_group(process.pid)
+    return _build_result(
+        stdout.decode('utf-8', errors='ignore'),
+        stderr.decode('utf-8', errors='ignore'),
+        paths,
+        contexts,
+        process.returncode,
+        watchdog.fired
+    )
+
+def run_js_tests_and_get_coverage(
+    test_file_path: str,
+    module_name: str,
+    workspace: Optional[Workspace] = None,
+    contexts: bool = False,
+    limits: Optional[RunLimits] = None,
+    use_cache: bool = True,
+    shards: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Runs Jest with coverage and returns a parsed report. With contexts it
+    also holds "test_coverage" and "test_durations" (see get_test_contexts)
+    and "test_outcomes" (see get_test_outcomes).
+    limits (default: RunLimits.from_env()) bounds the run; Jest and its
+    workers run in their own process group, which is killed as a whole.
+    Identical runs are served from the run cache unless use_cache is False.
+    A large suite is split into shard files run on parallel Jest workers
+    (see _shard_files), with "shards" set in the result. After a change to
+    the module only the describe blocks it can affect run (see
+    app.selection).
+    """
+    try:
+        limits = limits or RunLimits.from_env()
+        paths = _jest_paths(workspace)
+
+        key = _cache_key(test_file_path, module_name, paths, limits, contexts, use_cache)
+        if key is not None:
+            cached = run_cache.get(key, _coverage_files(paths))
+            if cached is not None:
+                return cached[0]
+
+        selection = _plan_selection(test_file_path, module_name, paths, use_cache)
+        run_contexts = contexts or selection is not None
+        test_files = _shard_files(test_file_path, shards)
+        try:
+            result = _with_shards(
+                _run_sync(test_files, module_name, paths, limits, run_contexts, selection), test_files
+            )
+        finally:
+            _remove_shard_files(test_file_path, test_files)
+        _record_durations(test_file_path, paths)
+        result = _finish_selection(selection, result, module_name, paths, contexts)
+        if key is not None:
+            run_cache.set(key, result, _coverage_files(paths), paths["events"])
+        return result
+
     except Exception as e:
-        return {
-            "status": "Error",
-            "summary": "An unexpected error occurred during test execution.",
-            "error": str(e)
-        }
\ No newline at end of file
+        return _unexpected_error(e)
+
+async def run_js_tests_and_get_coverage_async(
+    test_file_path: str,
+    module_name: str,
+    workspace: Optional[Workspace] = None,
+    on_test: Optional[TestEventCallback] = None,
+    contexts: bool = False,
+    limits: Optional[RunLimits] = None,
+    use_cache: bool = True,
+    shards: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Same as run_js_tests_and_get_coverage, but awaits Jest as an asyncio
+    subprocess so the event loop is not blocked while the suite runs.
+
+    If on_test is given, js/stream_reporter.js also prints each test case
+    result and on_test is called with {"test", "outcome", "duration"} as
+    each test finishes (on a cache hit, with the stored events).
+    """
+    try:
+        limits = limits or RunLimits.from_env()
+        paths = _jest_paths(workspace)
+
+        key = _cache_key(test_file_path, module_name, paths, limits, contexts, use_cache)
+        if key is not None:
+            cached = await asyncio.to_thread(run_cache.get, key, _coverage_files(paths))
+            if cached is not None:
+                result, events = cached
+                if on_test is not None:
+                    for event in events:
+                        on_test(event)
+                return result
+
+        selection = await asyncio.to_thread(_plan_selection, test_file_path, module_name, paths, use_cache)
+        run_contexts = contexts or selection is not None
+        test_files = await asyncio.to_thread(_shard_files, test_file_path, shards)
+        try:
+            result = _with_shards(
+                await _run_async(test_files, module_name, paths, limits, on_test, run_contexts, selection), test_files
+            )
+        finally:
+            _remove_shard_files(test_file_path, test_files)
+        await asyncio.to_thread(_record_durations, test_file_path, paths)
+        result = await asyncio.to_thread(_finish_selection, selection, result, module_name, paths, contexts)
+        if on_test is not None and selection is not None:
+            for event in selection.carried_events():
+                on_test(event)
+        if key is not None:
+            await asyncio.to_thread(run_cache.set, key, result, _coverage_files(paths), paths["events"])
+        return result
+
+    except Exception as e:
+        return _unexpected_error(e)
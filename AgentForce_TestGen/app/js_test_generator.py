@@ -1,12 +1,14 @@
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, Iterator, List, Any, Optional, Tuple
 import re
 import tempfile
 
+from .test_generator import default_table_min_cases
+
 class JSTestGenerator:
-    def __init__(self):
+    def __init__(self, table_min_cases: Optional[int] = None):
         # We will now use a temporary directory
-        pass
+        self.table_min_cases = default_table_min_cases() if table_min_cases is None else table_min_cases
 
     def _format_js_value(self, value: Any) -> str:
         if isinstance(value, str):
@@ -18,49 +20,87 @@ class JSTestGenerator:
             return "null"
         return str(value)
 
-    def generate_test_file(self, module_name: str, test_data: Dict) -> str:
-        # (The rest of the function remains the same...)
-        test_content = []
+    def test_names(self, module_name: str, test_data: Dict) -> Dict[str, List[Tuple[int, int]]]:
+        """
+        Maps each test's full Jest name ("<describe> <it>") to the (group, case)
+        indexes it came from; cases sharing a name map to the same test.
+        """
+        names: Dict[str, List[Tuple[int, int]]] = {}
+        for group_index, test_suite in enumerate(test_data.get("tests", [])):
+            describe_name = test_suite.get("describe", "Test Suite")
+            for case_index, case in enumerate(test_suite.get("cases", [])):
+                if all(k in case for k in ["it", "function_to_test", "input", "expected_output"]):
+                    names.setdefault(f"{describe_name} {case['it']}", []).append((group_index, case_index))
+        return names
 
+    def _imports_line(self, module_name: str, test_data: Dict) -> str:
         try:
             function_names_str = re.search(r'\{\s*(.*?)\s*\}', test_data["imports"]).group(1)
-            imports_line = f"const {{ {function_names_str} }} = require('../examples/{module_name}');"
-        except (AttributeError, IndexError):
-            imports_line = f"// Failed to automatically generate imports. Please check manually."
+            return f"const {{ {function_names_str} }} = require('../examples/{module_name}');"
+        except (AttributeError, IndexError, KeyError):
+            return f"// Failed to automatically generate imports. Please check manually."
 
-        test_content.append(imports_line)
-        test_content.append("")
-
-        for test_suite in test_data.get("tests", []):
-            describe_name = test_suite.get("describe", "Test Suite")
-            test_content.append(f"describe('{describe_name}', () => {{")
+    def _case_lines(self, case: Dict[str, Any]) -> Iterator[str]:
+        func_name = case["function_to_test"]
+        input_val = case["input"]
+        expected_out = case["expected_output"]
 
-            for case in test_suite.get("cases", []):
-                if not all(k in case for k in ["it", "function_to_test", "input", "expected_output"]):
-                    continue
+        formatted_expected = self._format_js_value(expected_out)
 
-                it_desc = case["it"]
-                func_name = case["function_to_test"]
-                input_val = case["input"]
-                expected_out = case["expected_output"]
+        if isinstance(expected_out, (dict, list)):
+            assertion = f"expect({func_name}({input_val})).toEqual({formatted_expected});"
+        else:
+            assertion = f"expect({func_name}({input_val})).toBe({formatted_expected});"
 
-                formatted_expected = self._format_js_value(expected_out)
+        escaped_desc = case["it"].replace("'", "\\'")
+        yield f"  it('{escaped_desc}', () => {{\n"
+        yield f"    {assertion}\n"
+        yield "  });\n"
 
-                if isinstance(expected_out, (dict, list)):
-                    assertion = f"expect({func_name}({input_val})).toEqual({formatted_expected});"
-                else:
-                    assertion = f"expect({func_name}({input_val})).toBe({formatted_expected});"
+    def _table_lines(self, func_name: str, cases: List[Dict[str, Any]]) -> Iterator[str]:
+        # One row per case: [title, [arguments], expected]. The title is the
+        # case's "it" text, so full test names match the it() layout.
+        # toEqual compares primitives with Object.is, like toBe.
+        yield "  test.each([\n"
+        for case in cases:
+            title = self._format_js_value(case["it"])
+            expected = self._format_js_value(case["expected_output"])
+            yield f"    [{title}, [{case['input']}], {expected}],\n"
+        yield "  ])('%s', (title, args, expected) => {\n"
+        yield f"    expect({func_name}(...args)).toEqual(expected);\n"
+        yield "  });\n"
 
-                test_content.extend([
-                    f"  it('{it_desc.replace("'", "\\'")}', () => {{",
-                    f"    {assertion}",
-                    "  });"
-                ])
+    def _file_lines(self, module_name: str, test_data: Dict) -> Iterator[str]:
+        yield self._imports_line(module_name, test_data) + "\n"
+        yield "\n"
 
-            test_content.append("});")
-            test_content.append("")
+        for test_suite in test_data.get("tests", []):
+            describe_name = test_suite.get("describe", "Test Suite")
+            cases = [
+                case for case in test_suite.get("cases", [])
+                if all(k in case for k in ["it", "function_to_test", "input", "expected_output"])
+            ]
+            yield f"describe('{describe_name}', () => {{\n"
+            functions = {case["function_to_test"] for case in cases}
+            # Rows call one function; mixed groups keep one it() per case.
+            if 0 < self.table_min_cases <= len(cases) and len(functions) == 1:
+                yield from self._table_lines(functions.pop(), cases)
+            else:
+                for case in cases:
+                    yield from self._case_lines(case)
+            yield "});\n"
+            yield "\n"
 
+    def generate_test_file(self, module_name: str, test_data: Dict, output_dir: Optional[Path] = None) -> str:
+        """
+        Writes the test file in one pass, streaming lines to disk. Groups with
+        at least table_min_cases cases become one test.each table.
+        """
         # --- FIX: Ensure the temporary file has the .test.js suffix ---
-        with tempfile.NamedTemporaryFile(mode='w+', suffix='.test.js', delete=False, dir="js_tests", encoding='utf-8') as temp_file:
-            temp_file.write("\n".join(test_content))
-            return temp_file.name
\ No newline at end of file
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.test.js', delete=False, dir=output_dir or "js_tests", encoding='utf-8') as temp_file:
+            temp_file.writelines(self._file_lines(module_name, test_data))
+            return temp_file.name
+
+    def render(self, module_name: str, test_data: Dict) -> str:
+        """The test file generate_test_file would write, as a string."""
+        return "".join(self._file_lines(module_name, test_data))
@@ -0,0 +1,113 @@
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from jsonschema import Draft7Validator
+
+_FENCE = re.compile(r"```(?:json)?\s*([\s\S]*?)(?:```|$)")
+
+
+def extract_json_text(raw: str) -> str:
+    """
+    Returns the part of an LLM response that should hold the JSON object:
+    the contents of a (possibly unterminated) code fence, from the first "{".
+    """
+    text = raw.strip()
+    fence = _FENCE.search(text)
+    if fence and "{" in fence.group(1):
+        text = fence.group(1)
+    start = text.find("{")
+    return text[start:] if start >= 0 else text
+
+
+def _outside_strings(text: str) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (index, char) for every character of text that is not inside a
+    string literal. The opening quote of a string is yielded, the rest of
+    it is not.
+    """
+    in_string = escaped = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        yield index, char
+
+
+def _strip_trailing_commas(text: str) -> str:
+    """Removes commas followed only by whitespace and a closing bracket, outside strings."""
+    trailing = set()
+    comma: Optional[int] = None
+    for index, char in _outside_strings(text):
+        if char == ",":
+            comma = index
+        elif char in "}]" and comma is not None:
+            trailing.add(comma)
+            comma = None
+        elif not char.isspace():
+            comma = None
+    return "".join(char for index, char in enumerate(text) if index not in trailing)
+
+
+def _close_truncated(text: str) -> str:
+    """
+    Makes a JSON document that was cut off mid-way parseable: the text is cut
+    back to the last complete value and every bracket still open is closed.
+    """
+    stack: List[str] = []
+    # (cut position, open brackets at that point) after each complete value.
+    safe: Optional[Tuple[int, str]] = None
+    for index, char in _outside_strings(text):
+        if char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if not stack:
+                break
+            stack.pop()
+            safe = (index + 1, "".join(reversed(stack)))
+            if not stack:
+                return text[:index + 1]
+        elif char == ",":
+            safe = (index, "".join(reversed(stack)))
+    if safe is None:
+        return text
+    cut, closing = safe
+    return text[:cut] + closing
+
+
+def repair_json(raw: str) -> Tuple[Optional[Any], bool]:
+    """
+    Parses an LLM response leniently. Returns (data, repaired), where data is
+    None if nothing could be recovered and repaired tells whether the text
+    needed fixing (code fences, trailing commas or truncation).
+    """
+    text = extract_json_text(raw)
+    try:
+        return json.loads(text), text != raw.strip()
+    except json.JSONDecodeError:
+        pass
+    for candidate in (_strip_trailing_commas(text), _strip_trailing_commas(_close_truncated(text))):
+        try:
+            return json.loads(candidate), True
+        except json.JSONDecodeError:
+            continue
+    return None, True
+
+
+def salvage_items(data: Any, array_key: str, item_schema: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Returns the elements of data[array_key] that are valid against item_schema,
+    and how many elements were dropped.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get(array_key), list):
+        return [], 0
+    validator = Draft7Validator(item_schema)
+    valid = [item for item in data[array_key] if validator.is_valid(item)]
+    return valid, len(data[array_key]) - len(valid)
@@ -0,0 +1,190 @@
+import json
+import math
+import os
+import signal
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, the wall-clock limits still apply.
+    resource = None
+
+# Per-test outcomes written by app/pytest_events.py and js/stream_reporter.js
+# as the run goes, so a run that is killed still reports how far it got.
+EVENTS_FILE = "test_events.jsonl"
+
+
+@dataclass
+class RunLimits:
+    """
+    Limits for one run of generated tests: wall-clock seconds for the whole
+    run and for each test, CPU seconds and address space (MB) of the child
+    processes (0: no limit) and how much of their output is kept.
+    """
+    run_timeout: float = 120.0
+    test_timeout: float = 10.0
+    cpu_seconds: int = 0
+    memory_mb: int = 2048
+    output_bytes: int = 4 * 1024 * 1024
+
+    @classmethod
+    def from_env(cls) -> "RunLimits":
+        run_timeout = float(os.getenv("TESTGEN_RUN_TIMEOUT", "120"))
+        return cls(
+            run_timeout=run_timeout,
+            test_timeout=float(os.getenv("TESTGEN_TEST_TIMEOUT", "10")),
+            # By default a run may use as much CPU time as wall-clock time.
+            cpu_seconds=int(os.getenv("TESTGEN_RUN_CPU_SECONDS", str(math.ceil(run_timeout)))),
+            memory_mb=int(os.getenv("TESTGEN_RUN_MEMORY_MB", "2048")),
+            output_bytes=int(os.getenv("TESTGEN_RUN_OUTPUT_BYTES", str(4 * 1024 * 1024)))
+        )
+
+    def apply(self, address_space: bool = True) -> None:
+        """
+        Sets the rlimits on the current process; called in the child between
+        fork and exec. address_space=False leaves RLIMIT_AS alone, for Node,
+        which reserves far more virtual memory than it uses.
+        """
+        if resource is None:
+            return
+        if self.cpu_seconds > 0:
+            resource.setrlimit(resource.RLIMIT_CPU, (self.cpu_seconds, self.cpu_seconds + 5))
+        if address_space and self.memory_mb > 0:
+            limit = self.memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    def preexec(self, address_space: bool = True) -> Optional[Callable[[], None]]:
+        """A preexec_fn for subprocess that applies the rlimits, or None without rlimits."""
+        if resource is None:
+            return None
+        return lambda: self.apply(address_space)
+
+
+def kill_group(pid: int) -> None:
+    """SIGKILLs the process group led by pid (the child was started in its own session)."""
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(pid, signal.SIGKILL)
+        else:
+            os.kill(pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class Watchdog:
+    """Kills a process group once timeout seconds have passed, unless cancelled first."""
+
+    def __init__(self, pid: int, timeout: float):
+        self.pid = pid
+        self.timeout = timeout
+        self.fired = False
+        self._timer = threading.Timer(timeout, self._fire)
+        self._timer.daemon = True
+        if timeout > 0:
+            self._timer.start()
+
+    def _fire(self) -> None:
+        self.fired = True
+        kill_group(self.pid)
+
+    def cancel(self) -> None:
+        self._timer.cancel()
+
+
+class CappedOutput:
+    """
+    Collects process output up to limit bytes: the first and the last half
+    are kept, so the start of the log and the runner's final summary survive.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._head = bytearray()
+        self._tail = bytearray()
+        self.dropped = 0
+
+    def write(self, data: bytes) -> None:
+        if self.limit <= 0:
+            self._head += data
+            return
+        room = self.limit // 2 - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        self._tail += data
+        excess = len(self._tail) - (self.limit - self.limit // 2)
+        if excess > 0:
+            del self._tail[:excess]
+            self.dropped += excess
+
+    def getvalue(self) -> bytes:
+        if not self.dropped:
+            return bytes(self._head + self._tail)
+        marker = f"\n... [{self.dropped} bytes of output dropped] ...\n".encode("utf-8")
+        return bytes(self._head) + marker + bytes(self._tail)
+
+
+def read_capped(stream, limit: int) -> bytes:
+    """Reads a binary stream to EOF, keeping at most limit bytes (see CappedOutput)."""
+    output = CappedOutput(limit)
+    while True:
+        chunk = stream.read(65536)
+        if not chunk:
+            return output.getvalue()
+        output.write(chunk)
+
+
+def read_events(events_path: Path) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Returns the finished tests ({"test", "outcome", "duration"}) recorded in
+    an events file and the test that had started but not finished, if any.
+    """
+    tests: List[Dict[str, Any]] = []
+    started: Dict[str, None] = {}
+    try:
+        with open(events_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("outcome") == "started":
+                    started[event.get("test")] = None
+                else:
+                    started.pop(event.get("test"), None)
+                    tests.append(event)
+    except FileNotFoundError:
+        pass
+    return tests, next(reversed(started), None) if started else None
+
+
+def kill_reason(returncode: Optional[int], timed_out: bool) -> Optional[str]:
+    """Why a run's process ended early: "timeout", "cpu" (RLIMIT_CPU), "signal", or None."""
+    if timed_out:
+        return "timeout"
+    if returncode is None or returncode >= 0:
+        return None
+    if hasattr(signal, "SIGXCPU") and -returncode == signal.SIGXCPU:
+        return "cpu"
+    return "signal"
+
+
+def partial_result(reason: str, events_path: Path, output: str) -> Dict[str, Any]:
+    """
+    Result of a run that was killed before it finished (reason from
+    kill_reason): the tests that completed before the kill and the one that
+    was running.
+    """
+    tests, unfinished = read_events(events_path)
+    passed = sum(1 for test in tests if test.get("outcome") == "passed")
+    return {
+        "status": "Timed Out" if reason == "timeout" else "Killed",
+        "summary": f"Run stopped ({reason}) after {len(tests)} tests: {passed} passed.",
+        "error": "Test run was killed by a signal." if reason == "signal" else f"Test run exceeded its {reason} limit.",
+        "tests": tests,
+        "unfinished_test": unfinished,
+        "full_log": output
+    }
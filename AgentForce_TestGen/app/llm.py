@@ -1,11 +1,19 @@
 import os
-import google.generativeai as genai
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Optional
 from dotenv import load_dotenv
 from pathlib import Path
 import json
 import re
+import threading
+from dataclasses import asdict, dataclass, field, replace
 from jsonschema import validate, ValidationError
+from .cache import TieredCache, cache_from_env, make_key
+from .json_repair import repair_json, salvage_items
+from .llm_backends import LLMBackend, LLMRequest, create_backend
+from .metrics import (
+    CACHE_REQUESTS, LLM_ATTEMPTS, LLM_PROMPT_CHARS, LLM_RESPONSE_CHARS, LLM_RETRIES, span
+)
+from .context import JSContext, PythonContext, SourceContext, estimate_tokens, tokens_saved
 from .parser import FunctionInfo
 
 # --- MODIFIED PYTHON SCHEMA ---
@@ -71,43 +79,485 @@ JS_TEST_SCHEMA = {
 }
 
 
+def complete_array_items(text: str, key: str) -> List[str]:
+    """
+    Returns the raw text of every complete object in the `key` array of a
+    possibly truncated JSON document, in order. Used to pick finished test
+    groups out of a response that is still being streamed.
+    """
+    match = re.search(r'"%s"\s*:\s*\[' % re.escape(key), text)
+    if not match:
+        return []
+    items = []
+    depth = 0
+    start = None
+    in_string = escaped = False
+    for index in range(match.end(), len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            if depth == 0:
+                start = index
+            depth += 1
+        elif char in "}]":
+            if depth == 0:
+                break  # end of the array
+            depth -= 1
+            if depth == 0 and start is not None:
+                items.append(text[start:index + 1])
+                start = None
+    return items
+
+
+# Builds the request for all functions (None) or only the named ones.
+PromptBuilder = Callable[[Optional[List[str]]], LLMRequest]
+
+_RETRY_NOTE = "\n\nYour previous response failed validation with the error: "
+
+
+def annotate_uncovered(source: str, first_line: int, missing_lines: List[int], comment: str) -> str:
+    """Marks the lines of source (which starts at first_line) that no test executed."""
+    missing = set(missing_lines)
+    return "\n".join(
+        f"{line}  {comment} not covered" if number in missing else line
+        for number, line in enumerate(source.splitlines(), start=first_line)
+    )
+
+
+def _with_gap_note(build: "PromptBuilder", missing_lines: List[int], tested_inputs: List[str], comment: str) -> "PromptBuilder":
+    """Wraps a prompt builder so it asks only for cases reaching the uncovered lines."""
+    note = (
+        f"\n\nThe existing tests never execute the lines marked `{comment} not covered` "
+        f"(lines {', '.join(str(n) for n in sorted(missing_lines))}). Generate only new cases whose "
+        "inputs make those lines run."
+    )
+    if tested_inputs:
+        note += " These inputs are already tested, do not repeat them:\n" + "\n".join(f"- {i}" for i in tested_inputs)
+
+    def build_gap(names: Optional[List[str]]) -> LLMRequest:
+        request = build(names)
+        return replace(request, prompt=request.prompt + note)
+    return build_gap
+
+
+@dataclass
+class GenerationStats:
+    """
+    LLM accounting for one request. It is shared by the threads working on
+    that request, so updates go through record().
+    """
+    llm_calls: int = 0
+    retries: int = 0
+    # Responses whose JSON had to be fixed locally, and responses that
+    # parsed as they were but had invalid groups dropped.
+    repaired: int = 0
+    salvaged: int = 0
+    salvaged_groups: int = 0
+    # Estimated with estimate_tokens, for budgets and reporting.
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+    # Source tokens kept out of prompts by context slicing (see app/context.py).
+    context_tokens_saved: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, **counts: int) -> None:
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "llm_calls": self.llm_calls,
+            "retries": self.retries,
+            "repaired": self.repaired,
+            "salvaged": self.salvaged,
+            "salvaged_groups": self.salvaged_groups,
+            "prompt_tokens": self.prompt_tokens,
+            "response_tokens": self.response_tokens,
+            "context_tokens_saved": self.context_tokens_saved,
+        }
+
+    @property
+    def tokens(self) -> int:
+        return self.prompt_tokens + self.response_tokens
+
+
+def _array_key(schema: Dict) -> str:
+    """Name of the top-level array holding the test groups."""
+    return next(k for k, v in schema["properties"].items() if v.get("type") == "array")
+
+
+def _covered_names(items: List[Dict[str, Any]]) -> set:
+    """Function names a list of test groups (Python) or describe blocks (JS) covers."""
+    names = set()
+    for item in items:
+        if "function_name" in item:
+            names.add(item["function_name"])
+        for case in item.get("cases", []):
+            if "function_to_test" in case:
+                names.add(case["function_to_test"])
+    return names
+
+
+def _merge_extras(extras: Dict[str, Any], data: Any, array_key: str) -> None:
+    """
+    Keeps the non-test fields of a response (e.g. JS "imports"). A retry for
+    missing groups brings its own imports, so new string lines are appended.
+    """
+    if not isinstance(data, dict):
+        return
+    for key, value in data.items():
+        if key == array_key:
+            continue
+        if key not in extras:
+            extras[key] = value
+        elif isinstance(value, str) and isinstance(extras[key], str) and value not in extras[key]:
+            extras[key] = f"{extras[key]}\n{value}"
+
+
+def _is_valid(document: Dict[str, Any], schema: Dict) -> bool:
+    try:
+        validate(instance=document, schema=schema)
+        return True
+    except ValidationError:
+        return False
+
+
 class LLMWrapper:
-    def __init__(self, max_retries=3):
+    def __init__(self, max_retries=3, cache: Optional[TieredCache] = None, backend: Optional[LLMBackend] = None):
         env_path = Path(__file__).parent.parent / '.env'
         load_dotenv(env_path)
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        # The backend (TESTGEN_LLM_BACKEND: gemini, openai or fake) is built on
+        # first use, so importing the app needs neither an API key nor the SDK.
+        self._backend = backend
+        self._backend_lock = threading.Lock()
+        self.generation_config = {"temperature": 0.4, "top_k": 1, "max_output_tokens": 2048}
+        # JSON mode: the model only emits syntactically valid JSON, so most
+        # responses parse without repair. Set TESTGEN_LLM_STRUCTURED=0 to disable.
+        if os.getenv("TESTGEN_LLM_STRUCTURED", "1") != "0":
+            self.generation_config["response_mime_type"] = "application/json"
         self.max_retries = max_retries
+        # Responses are cached by content, so re-uploading an unchanged module
+        # skips the Gemini round trip. Set TESTGEN_LLM_CACHE=0 to disable.
+        if cache is None and os.getenv("TESTGEN_LLM_CACHE", "1") != "0":
+            cache = cache_from_env("TESTGEN_LLM_CACHE", Path(__file__).parent.parent / ".cache" / "llm")
+        self.cache = cache
+
+    @property
+    def backend(self) -> LLMBackend:
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = create_backend()
+        return self._backend
+
+    @property
+    def model_name(self) -> str:
+        return self.backend.model_name
+
+    def _cache_key(self, language: str, code: str, functions: List[Any], schema: Dict) -> str:
+        return make_key(language, code, functions, schema, self.model_name, self.generation_config)
+
+    def _cached_generate(
+        self,
+        key: str,
+        build_prompt: PromptBuilder,
+        schema: Dict,
+        expected: List[str],
+        stats: Optional["GenerationStats"] = None
+    ) -> str:
+        """Returns the cached response for key, or generates, validates and stores it."""
+        cached = self._cache_lookup(key)
+        if cached is not None:
+            return cached
+        result = self._generate_and_validate(build_prompt(None), schema, expected, build_prompt, stats)
+        if self.cache is not None:
+            self.cache.set(key, result)
+        return result
+
+    def _stream_generate(
+        self,
+        key: str,
+        build_prompt: PromptBuilder,
+        schema: Dict,
+        expected: List[str],
+        on_item: Callable[[Dict[str, Any]], None],
+        stats: Optional["GenerationStats"] = None
+    ) -> str:
+        """
+        Like _cached_generate, but streams the response and calls on_item for
+        every element of the test array as soon as it is complete and valid.
+        The finished response then goes through the usual repair and retry
+        steps, and only the items not emitted yet are passed on.
+        """
+        array_key = _array_key(schema)
+        cached = self._cache_lookup(key)
+        if cached is not None:
+            for item in json.loads(cached).get(array_key, []):
+                on_item(item)
+            return cached
+
+        item_schema = schema["properties"][array_key]["items"]
+        emitted = set()
+
+        def emit(item: Dict[str, Any]) -> None:
+            marker = json.dumps(item, sort_keys=True)
+            if marker not in emitted:
+                emitted.add(marker)
+                on_item(item)
+
+        request = build_prompt(None)
+        text = ""
+        seen = 0
+        if stats is not None:
+            stats.record(llm_calls=1)
+        backend = self.backend
+        LLM_PROMPT_CHARS.observe(len(request.prompt), backend=backend.name)
+        try:
+            with span("llm.stream"):
+                for chunk in backend.stream(request, self.generation_config):
+                    text += chunk
+                    raw_items = complete_array_items(text, array_key)
+                    for raw_item in raw_items[seen:]:
+                        try:
+                            item = json.loads(raw_item)
+                            validate(instance=item, schema=item_schema)
+                        except (json.JSONDecodeError, ValidationError):
+                            continue
+                        emit(item)
+                    seen = len(raw_items)
+        except Exception:
+            LLM_ATTEMPTS.inc(backend=backend.name, outcome="error")
+            raise
+        LLM_RESPONSE_CHARS.observe(len(text), backend=backend.name)
+        if stats is not None:
+            stats.record(prompt_tokens=estimate_tokens(request.prompt), response_tokens=estimate_tokens(text))
+
+        result = self._generate_and_validate(request, schema, expected, build_prompt, stats, first_response=text)
+        for item in json.loads(result).get(array_key, []):
+            emit(item)
+        if self.cache is not None:
+            self.cache.set(key, result)
+        return result
+
+    def _generate_packed(
+        self,
+        language: str,
+        code: str,
+        functions: List[Any],
+        names: List[str],
+        context: SourceContext,
+        schema: Dict,
+        prompt_builder: Callable[[str, List[Any]], PromptBuilder],
+        stats: Optional["GenerationStats"] = None,
+        on_item: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> str:
+        """
+        Generates tests for a whole module. A file within the context budget
+        goes out in one prompt as before. A larger one is split into packs of
+        functions (SourceContext.pack), each prompted with its sliced context
+        and cached on it, and the responses are merged.
+        """
+        array_key = _array_key(schema)
+        collected: List[Dict[str, Any]] = []
+        extras: Dict[str, Any] = {}
+        for pack in context.pack(names):
+            selected = [f for f, name in zip(functions, names) if name in pack]
+            source = context.build(pack)
+            if stats is not None and source is not code:
+                stats.record(context_tokens_saved=tokens_saved(code, source))
+            metadata = [asdict(f) for f in selected] if language == "python" else selected
+            key = self._cache_key(language, source, metadata, schema)
+            build = prompt_builder(source, selected)
+            if on_item is not None:
+                result = self._stream_generate(key, build, schema, pack, on_item, stats)
+            else:
+                result = self._cached_generate(key, build, schema, pack, stats)
+            data = json.loads(result)
+            _merge_extras(extras, data, array_key)
+            collected.extend(data.get(array_key, []))
+        return json.dumps({**extras, array_key: collected})
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.cache.stats() if self.cache is not None else {"enabled": False}
+
+    def _cache_lookup(self, key: str) -> Optional[str]:
+        if self.cache is None:
+            return None
+        cached = self.cache.get(key)
+        CACHE_REQUESTS.inc(cache="llm", result="hit" if cached is not None else "miss")
+        return cached
+
+    def _call_model(self, request: LLMRequest) -> str:
+        backend = self.backend
+        LLM_PROMPT_CHARS.observe(len(request.prompt), backend=backend.name)
+        try:
+            with span("llm.attempt"):
+                text = backend.generate(request, self.generation_config)
+        except Exception:
+            LLM_ATTEMPTS.inc(backend=backend.name, outcome="error")
+            raise
+        LLM_RESPONSE_CHARS.observe(len(text), backend=backend.name)
+        return text
+
+    def _generate_and_validate(
+        self,
+        request: LLMRequest,
+        schema: Dict,
+        expected: Optional[List[str]] = None,
+        build_prompt: Optional[PromptBuilder] = None,
+        stats: Optional["GenerationStats"] = None,
+        first_response: Optional[str] = None
+    ) -> str:
+        """
+        Main generation loop with local repair, salvage and targeted retries.
+
+        Each response is parsed leniently (code fences, trailing commas and
+        truncated output are fixed locally) and every valid test group in it
+        is kept. If groups for some of the expected functions are still
+        missing after a repaired or invalid response, the retry prompt asks
+        for those functions only. If retries run out, the groups salvaged
+        so far are returned as long as they form a valid document.
+        """
+        array_key = _array_key(schema)
+        item_schema = schema["properties"][array_key]["items"]
+        expected = expected or []
+        collected: List[Dict[str, Any]] = []
+        extras: Dict[str, Any] = {}
+        error = "No JSON object found in the LLM response"
 
-    def _generate_and_validate(self, prompt: str, schema: Dict) -> str:
-        """Main generation loop with validation and retries."""
         for attempt in range(self.max_retries):
-            try:
-                generation_config = {"temperature": 0.4, "top_k": 1, "max_output_tokens": 2048}
-                response = self.model.generate_content(
-                    contents=[{"parts": [{"text": prompt}]}],
-                    generation_config=generation_config
+            if attempt == 0 and first_response is not None:
+                raw_text = first_response
+            else:
+                raw_text = self._call_model(request)
+                if stats is not None:
+                    stats.record(
+                        llm_calls=1,
+                        retries=1 if attempt else 0,
+                        prompt_tokens=estimate_tokens(request.prompt),
+                        response_tokens=estimate_tokens(raw_text)
+                    )
+                if attempt:
+                    LLM_RETRIES.inc(backend=self.backend.name)
+
+            data, repaired = repair_json(raw_text)
+            clean = False
+            if data is not None:
+                try:
+                    validate(instance=data, schema=schema)
+                    clean = not repaired
+                except ValidationError as e:
+                    error = e.message
+                items, dropped = salvage_items(data, array_key, item_schema)
+                if stats is not None and (repaired or dropped):
+                    stats.record(
+                        repaired=1 if repaired else 0,
+                        salvaged=0 if repaired else 1,
+                        salvaged_groups=len(items) if not clean else 0
+                    )
+                _merge_extras(extras, data, array_key)
+                if attempt:
+                    # A retry may repeat groups that were already salvaged.
+                    covered = _covered_names(collected)
+                    items = [item for item in items if not _covered_names([item]) <= covered]
+                collected.extend(items)
+
+            if clean:
+                outcome = "ok"
+            elif data is None:
+                outcome = "invalid"
+            else:
+                outcome = "repaired" if repaired else ("salvaged" if dropped else "invalid")
+            LLM_ATTEMPTS.inc(backend=self.backend.name, outcome=outcome)
+
+            document = {**extras, array_key: collected}
+            missing = [name for name in expected if name not in _covered_names(collected)]
+            if collected and _is_valid(document, schema) and (clean or not missing):
+                return json.dumps(document)
+
+            print(f"Attempt {attempt + 1} failed: {error}. Retrying...")
+            if missing and collected and build_prompt is not None:
+                # Keep what was salvaged and only ask for what is still missing.
+                request = build_prompt(missing)
+            else:
+                base = build_prompt(None) if build_prompt is not None else replace(
+                    request, prompt=request.prompt.split(_RETRY_NOTE)[0]
                 )
-                raw_text = response.text.strip()
-                json_match = re.search(r'```json\s*({[\s\S]*?})\s*```|({[\s\S]*})', raw_text)
-                if not json_match:
-                    raise ValueError("No JSON object found in the LLM response.")
-                json_str = next(group for group in json_match.groups() if group is not None)
-                parsed_json = json.loads(json_str)
-                validate(instance=parsed_json, schema=schema)
-                return json.dumps(parsed_json)
-            except (ValueError, json.JSONDecodeError, ValidationError) as e:
-                print(f"Attempt {attempt + 1} failed: {e}. Retrying...")
-                prompt += f"\n\nYour previous response failed validation with the error: {e}. \nPlease correct your response and ensure it strictly adheres to this JSON schema:\n{json.dumps(schema)}"
+                request = replace(base, prompt=(
+                    base.prompt + f"{_RETRY_NOTE}{error}. \nPlease correct your response and ensure it strictly "
+                    f"adheres to this JSON schema:\n{json.dumps(schema)}"
+                ))
+
+        document = {**extras, array_key: collected}
+        if collected and _is_valid(document, schema):
+            return json.dumps(document)
         raise RuntimeError(f"Failed to generate valid JSON after {self.max_retries} attempts.")
 
     # --- PYTHON METHODS ---
-    def generate_tests(self, code: str, functions: List[FunctionInfo]) -> str:
-        prompt = self._build_py_prompt(code, functions)
-        return self._generate_and_validate(prompt, PY_TEST_SCHEMA)
+    def _py_prompt_builder(self, code: str, functions: List[FunctionInfo]) -> PromptBuilder:
+        def build(names: Optional[List[str]]) -> LLMRequest:
+            selected = [f for f in functions if names is None or f.name in names]
+            with span("llm.prompt"):
+                prompt = self._build_py_prompt(code, selected)
+            return LLMRequest(
+                prompt=prompt,
+                schema=PY_TEST_SCHEMA,
+                language="python",
+                functions=[(f.name, list(f.args)) for f in selected]
+            )
+        return build
+
+    def generate_tests(self, code: str, functions: List[FunctionInfo], stats: Optional["GenerationStats"] = None) -> str:
+        return self._generate_packed(
+            "python", code, functions, [f.name for f in functions], PythonContext(code),
+            PY_TEST_SCHEMA, self._py_prompt_builder, stats
+        )
+
+    def stream_tests(
+        self,
+        code: str,
+        functions: List[FunctionInfo],
+        on_group: Callable[[Dict[str, Any]], None],
+        stats: Optional["GenerationStats"] = None
+    ) -> str:
+        """generate_tests, calling on_group for each test group as it streams in."""
+        return self._generate_packed(
+            "python", code, functions, [f.name for f in functions], PythonContext(code),
+            PY_TEST_SCHEMA, self._py_prompt_builder, stats, on_group
+        )
+
+    def generate_function_tests(self, source: str, function: FunctionInfo, stats: Optional["GenerationStats"] = None) -> str:
+        """
+        Generates tests for a single function given its own source. Not cached
+        here: the incremental generator stores groups by the function's AST hash.
+        """
+        build = self._py_prompt_builder(source, [function])
+        return self._generate_and_validate(build(None), PY_TEST_SCHEMA, [function.name], build, stats)
+
+    def generate_gap_tests(
+        self,
+        source: str,
+        function: FunctionInfo,
+        missing_lines: List[int],
+        tested_inputs: List[str],
+        stats: Optional["GenerationStats"] = None
+    ) -> str:
+        """
+        Asks for extra cases for one function whose lines missing_lines (file
+        line numbers) no test executed. source is the function's own source.
+        """
+        annotated = annotate_uncovered(source, function.lineno, missing_lines, "#")
+        build = _with_gap_note(self._py_prompt_builder(annotated, [function]), missing_lines, tested_inputs, "#")
+        return self._generate_and_validate(build(None), PY_TEST_SCHEMA, [function.name], build, stats)
 
     def _build_py_prompt(self, code: str, functions: List[FunctionInfo]) -> str:
         function_info_str = "\n".join(
@@ -121,6 +571,7 @@ Your response MUST be a single JSON object.
 For each function, create a "test_group" that includes the "function_name" and a list of "cases".
 
 **CRITICAL INSTRUCTION**: The `expected_output` key must contain ONLY the raw expected value (e.g., `0.0`, `12.0`, `true`, `false`, or a string like `"some text"`).
+The `input` key holds the arguments exactly as written between the call's parentheses, as Python literals (e.g., `2`, `'abc'`, `1, 2` for two arguments, `[1, 2]` for one list).
 
 Code to analyze:
 {code}
@@ -130,9 +581,55 @@ Function information:
 """
 
     # --- JAVASCRIPT METHODS ---
-    def generate_js_tests(self, code: str, functions: List[Dict]) -> str:
-        prompt = self._build_js_prompt(code, functions)
-        return self._generate_and_validate(prompt, JS_TEST_SCHEMA)
+    def _js_prompt_builder(self, code: str, functions: List[Dict]) -> PromptBuilder:
+        def build(names: Optional[List[str]]) -> LLMRequest:
+            selected = [f for f in functions if names is None or f["name"] in names]
+            with span("llm.prompt"):
+                prompt = self._build_js_prompt(code, selected)
+            return LLMRequest(
+                prompt=prompt,
+                schema=JS_TEST_SCHEMA,
+                language="javascript",
+                functions=[(f["name"], list(f.get("args", []))) for f in selected]
+            )
+        return build
+
+    def generate_js_tests(self, code: str, functions: List[Dict], stats: Optional["GenerationStats"] = None) -> str:
+        return self._generate_packed(
+            "javascript", code, functions, [f["name"] for f in functions], JSContext(code, functions),
+            JS_TEST_SCHEMA, self._js_prompt_builder, stats
+        )
+
+    def stream_js_tests(
+        self,
+        code: str,
+        functions: List[Dict],
+        on_group: Callable[[Dict[str, Any]], None],
+        stats: Optional["GenerationStats"] = None
+    ) -> str:
+        """generate_js_tests, calling on_group for each describe block as it streams in."""
+        return self._generate_packed(
+            "javascript", code, functions, [f["name"] for f in functions], JSContext(code, functions),
+            JS_TEST_SCHEMA, self._js_prompt_builder, stats, on_group
+        )
+
+    def generate_js_function_tests(self, source: str, function: Dict, stats: Optional["GenerationStats"] = None) -> str:
+        """JavaScript counterpart of generate_function_tests."""
+        build = self._js_prompt_builder(source, [function])
+        return self._generate_and_validate(build(None), JS_TEST_SCHEMA, [function["name"]], build, stats)
+
+    def generate_js_gap_tests(
+        self,
+        source: str,
+        function: Dict,
+        missing_lines: List[int],
+        tested_inputs: List[str],
+        stats: Optional["GenerationStats"] = None
+    ) -> str:
+        """JavaScript counterpart of generate_gap_tests."""
+        annotated = annotate_uncovered(source, function.get("line", 1), missing_lines, "//")
+        build = _with_gap_note(self._js_prompt_builder(annotated, [function]), missing_lines, tested_inputs, "//")
+        return self._generate_and_validate(build(None), JS_TEST_SCHEMA, [function["name"]], build, stats)
 
     def _build_js_prompt(self, code: str, functions: List[Dict]) -> str:
         function_info_str = "\n".join(
@@ -0,0 +1,266 @@
+import hashlib
+import itertools
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .admission import AdmissionController, call_slot
+from .context import estimate_tokens
+
+
+@dataclass
+class LLMRequest:
+    """One prompt plus what a backend may need besides the text."""
+    prompt: str
+    schema: Dict[str, Any]
+    language: str
+    # (name, args) of the functions the prompt asks tests for.
+    functions: List[Tuple[str, List[str]]] = field(default_factory=list)
+
+
+class LLMBackend:
+    """
+    Base class for the model behind LLMWrapper. Subclasses implement
+    _generate and optionally _stream; clients and connections are created
+    on first use and reused afterwards. Every call is first admitted by the
+    backend's AdmissionController (rate limits, priority, backoff on
+    throttling), then at most max_concurrency calls run at once.
+    """
+    name = "base"
+    default_concurrency = 8
+
+    def __init__(self, model_name: str, max_concurrency: Optional[int] = None):
+        self.model_name = model_name
+        limit = max_concurrency or int(os.getenv(f"TESTGEN_{self.name.upper()}_CONCURRENCY", self.default_concurrency))
+        self.max_concurrency = max(1, limit)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._client_lock = threading.Lock()
+        self._client = None
+        self.admission = AdmissionController.from_env(self.name)
+
+    def _get_client(self):
+        with self._client_lock:
+            if self._client is None:
+                self._client = self._create_client()
+            return self._client
+
+    def _create_client(self):
+        return None
+
+    def generate(self, request: LLMRequest, config: Dict[str, Any]) -> str:
+        tokens = estimate_tokens(request.prompt)
+        with call_slot():
+            for attempt in itertools.count():
+                self.admission.admit(tokens)
+                try:
+                    with self._slots:
+                        text = self._generate(request, config)
+                except Exception as e:
+                    if self.admission.backoff(e, attempt):
+                        continue
+                    raise
+                self.admission.settle(tokens, tokens + estimate_tokens(text))
+                return text
+
+    def stream(self, request: LLMRequest, config: Dict[str, Any]) -> Iterator[str]:
+        """
+        Yields the response text in chunks as the model produces it. A
+        throttled stream is retried only if nothing was yielded yet.
+        """
+        tokens = estimate_tokens(request.prompt)
+        with call_slot():
+            for attempt in itertools.count():
+                self.admission.admit(tokens)
+                chars = 0
+                try:
+                    with self._slots:
+                        for chunk in self._stream(request, config):
+                            chars += len(chunk)
+                            yield chunk
+                except Exception as e:
+                    if not chars and self.admission.backoff(e, attempt):
+                        continue
+                    raise
+                self.admission.settle(tokens, tokens + (chars + 3) // 4)
+                return
+
+    def _generate(self, request: LLMRequest, config: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    def _stream(self, request: LLMRequest, config: Dict[str, Any]) -> Iterator[str]:
+        yield self._generate(request, config)
+
+    def close(self) -> None:
+        with self._client_lock:
+            client, self._client = self._client, None
+        if client is not None and hasattr(client, "close"):
+            client.close()
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through google.generativeai, imported on first use."""
+    name = "gemini"
+
+    def __init__(self, model_name: str = "gemini-2.0-flash", max_concurrency: Optional[int] = None):
+        super().__init__(model_name, max_concurrency)
+
+    def _create_client(self):
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment variables")
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        return genai.GenerativeModel(self.model_name)
+
+    def _generate(self, request: LLMRequest, config: Dict[str, Any]) -> str:
+        response = self._get_client().generate_content(
+            contents=[{"parts": [{"text": request.prompt}]}],
+            generation_config=config
+        )
+        return response.text
+
+    def _stream(self, request: LLMRequest, config: Dict[str, Any]) -> Iterator[str]:
+        response = self._get_client().generate_content(
+            contents=[{"parts": [{"text": request.prompt}]}],
+            generation_config=config,
+            stream=True
+        )
+        for chunk in response:
+            yield chunk.text or ""
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    Any server speaking the OpenAI chat completions API (vLLM, llama.cpp,
+    Ollama, ...). One pooled httpx client is shared by all calls.
+    """
+    name = "openai"
+    default_concurrency = 4
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        timeout: float = 120.0
+    ):
+        super().__init__(model_name or os.getenv("TESTGEN_OPENAI_MODEL", "gpt-4o-mini"), max_concurrency)
+        self.base_url = (base_url or os.getenv("TESTGEN_OPENAI_BASE_URL", "http://127.0.0.1:11434/v1")).rstrip("/")
+        self.api_key = api_key or os.getenv("TESTGEN_OPENAI_API_KEY", "")
+        self.timeout = timeout
+
+    def _create_client(self):
+        import httpx
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        return httpx.Client(
+            base_url=self.base_url,
+            headers=headers,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+        )
+
+    def _payload(self, request: LLMRequest, config: Dict[str, Any], stream: bool) -> Dict[str, Any]:
+        payload = {
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": request.prompt}],
+            "temperature": config.get("temperature", 0.4),
+            "max_tokens": config.get("max_output_tokens", 2048),
+            "stream": stream,
+        }
+        if config.get("response_mime_type") == "application/json":
+            payload["response_format"] = {"type": "json_object"}
+        return payload
+
+    def _generate(self, request: LLMRequest, config: Dict[str, Any]) -> str:
+        response = self._get_client().post("/chat/completions", json=self._payload(request, config, False))
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"] or ""
+
+    def _stream(self, request: LLMRequest, config: Dict[str, Any]) -> Iterator[str]:
+        with self._get_client().stream("POST", "/chat/completions", json=self._payload(request, config, True)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                choices = json.loads(data).get("choices") or [{}]
+                yield choices[0].get("delta", {}).get("content") or ""
+
+
+# Literal argument values per language, written as the generators expect inputs.
+_FAKE_VALUES = {
+    "python": ["0", "1", "-1", "2", "10", "''", "'abc'", "[]", "[1, 2, 3]", "True", "None"],
+    "javascript": ["0", "1", "-1", "2", "10", "''", "'abc'", "[]", "[1, 2, 3]", "true", "null"],
+}
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic stand-in for load tests and offline runs. It never makes a
+    network call: test cases are derived from the function signatures in
+    the request, so the same request always gets the same response.
+    """
+    name = "fake"
+    default_concurrency = 64
+
+    def __init__(self, model_name: str = "fake-signatures", cases_per_function: int = 3, max_concurrency: Optional[int] = None):
+        super().__init__(model_name, max_concurrency)
+        self.cases_per_function = cases_per_function
+
+    def _inputs(self, language: str, name: str, args: List[str]) -> List[str]:
+        """
+        One argument list per case, a value for every positional parameter
+        (the generators pass "1, 2" as two arguments). Only a function
+        without parameters gets the empty input, which calls it with none.
+        """
+        seed = int(hashlib.sha256(name.encode("utf-8")).hexdigest(), 16)
+        values = _FAKE_VALUES[language]
+        arity = len([a for a in args if not a.startswith("*")])
+        inputs = []
+        for case in range(self.cases_per_function):
+            inputs.append(", ".join(values[(seed + case * 7 + position * 3) % len(values)] for position in range(arity)))
+        return inputs
+
+    def _generate(self, request: LLMRequest, config: Dict[str, Any]) -> str:
+        if request.language == "python":
+            return json.dumps({"test_groups": [
+                {
+                    "function_name": name,
+                    "cases": [{"input": value, "expected_output": 0} for value in self._inputs("python", name, args)]
+                }
+                for name, args in request.functions
+            ]})
+        names = ", ".join(dict.fromkeys(name.split(".")[0] for name, _ in request.functions))
+        return json.dumps({
+            "imports": f"const {{ {names} }} = require('../examples/module');",
+            "tests": [
+                {
+                    "describe": name,
+                    "cases": [
+                        {"it": f"handles {value}", "function_to_test": name, "input": value, "expected_output": 0}
+                        for value in self._inputs("javascript", name, args)
+                    ]
+                }
+                for name, args in request.functions
+            ]
+        })
+
+
+BACKENDS = {
+    GeminiBackend.name: GeminiBackend,
+    OpenAICompatibleBackend.name: OpenAICompatibleBackend,
+    FakeBackend.name: FakeBackend,
+}
+
+
+def create_backend(name: Optional[str] = None) -> LLMBackend:
+    """Builds the backend named by name or TESTGEN_LLM_BACKEND (default: gemini)."""
+    name = (name or os.getenv("TESTGEN_LLM_BACKEND", "gemini")).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{name}'. Choose one of: {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
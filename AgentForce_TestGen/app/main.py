@@ -1,107 +1,320 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
-from fastapi.responses import JSONResponse
-import uvicorn
+from contextlib import asynccontextmanager
+import asyncio
 import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import asdict
 from pathlib import Path
-from typing import Dict, Any
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+import uvicorn
 
-# --- Python Tools ---
-from .parser import CodeParser  # <-- THIS LINE WAS MISSING
-from .llm import LLMWrapper
-from .test_generator import TestGenerator
-from .runner import run_tests_and_get_coverage
+from .admission import BATCH, AdmissionRejected, llm_priority
+from .artifacts import artifact_job, artifact_store
+from .batch import run_batch
+from .cache import make_key
+from .coverage_loop import CoverageGoal
+from .jobs import JobManager, current_job_id
+from .js_parser import parser_pool
+from .metrics import HTTP_REQUEST_SECONDS, collect_timings, render_metrics
+from .pytest_pool import pytest_pool
+from .run_cache import bypass_run_cache, run_cache as test_run_cache
+from .singleflight import SingleFlight
+from .uploads import SpooledUpload, UploadLimitMiddleware, UploadTooLarge, max_upload_bytes
+from .workspace import sweep_stale_workspaces
+from .pipeline import (
+    llm,
+    map_test_cases_to_new_schema,
+    run_js_pipeline,
+    run_pipeline,
+    run_python_pipeline,
+    stream_pipeline,
+    validate_upload,
+)
 
-# --- JavaScript Tools ---
-from .js_parser import parse_js_file
-from .js_test_generator import JSTestGenerator
-from .js_runner import run_js_tests_and_get_coverage
+async def _run_queued_job(language: str, filename: str, content: str):
+    # Queued jobs are not waited on by a client, so interactive calls go first.
+    # Their artifacts are filed under the job id GET /jobs/{job_id} uses.
+    with llm_priority(BATCH), artifact_job(current_job_id()):
+        return await run_pipeline(language, filename, content)
 
-# --- Compatibility Function ---
-def map_test_cases_to_new_schema(data: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    If the old 'test_cases' format is detected, map it to the new schema.
-    """
-    if "test_cases" in data and "tests" not in data:
-        describes = {}
-        for case in data["test_cases"]:
-            func_name = case["function"]
-            if func_name not in describes:
-                describes[func_name] = {
-                    "describe": func_name,
-                    "cases": []
-                }
-            describes[func_name]["cases"].append({
-                "it": f"should handle input {case['input']}",
-                "function_to_test": func_name,
-                "input": str(case['input']),
-                "expected_output": case['expected_output']
-            })
-        
-        func_names = ", ".join(describes.keys())
-
-        return {
-            "imports": f"const {{ {func_names} }} = require('../examples/sample_input');",
-            "tests": list(describes.values())
-        }
-    return data
+# --- Job Queue ---
+job_manager = JobManager(
+    _run_queued_job,
+    num_workers=int(os.getenv("TESTGEN_WORKERS", "4")),
+    max_finished_jobs=int(os.getenv("TESTGEN_JOB_RETENTION", "1000"))
+)
+
+async def _run_batch_job(language: str, filename: str, archive_path: str):
+    try:
+        with llm_priority(BATCH):
+            return await run_batch(
+                Path(archive_path),
+                llm_concurrency=int(os.getenv("TESTGEN_BATCH_LLM_CONCURRENCY", "8"))
+            )
+    finally:
+        Path(archive_path).unlink(missing_ok=True)
+
+# Batches are large, so they get their own queue and run one at a time;
+# the fan-out happens inside the batch.
+batch_manager = JobManager(_run_batch_job, num_workers=1, max_finished_jobs=100)
+
+generate_flights = SingleFlight("generate")
+
+def singleflight_enabled() -> bool:
+    return os.getenv("TESTGEN_SINGLEFLIGHT", "1") != "0"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweep_stale_workspaces()
+    await asyncio.to_thread(artifact_store.gc)
+    try:
+        parser_pool.start()
+    except OSError as e:
+        # Without node on PATH, parse_js_file keeps using one-shot processes.
+        print(f"Could not start the JavaScript parser pool: {e}")
+    if int(os.getenv("TESTGEN_PYTEST_POOL", "2")) > 0:
+        pytest_pool.start()
+    await job_manager.start()
+    await batch_manager.start()
+    yield
+    await job_manager.stop()
+    await batch_manager.stop()
+    parser_pool.stop()
+    pytest_pool.stop()
 
 app = FastAPI(
     title="TestGen",
     description="AI-powered test case generator for multiple languages",
-    version="0.3.2" # Version bump!
+    version="0.5.0",
+    lifespan=lifespan
 )
+app.add_middleware(UploadLimitMiddleware)
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    return JSONResponse(status_code=429, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)})
+
+@app.middleware("http")
+async def observe_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template (/jobs/{job_id}), not the raw path, to keep
+        # the number of series bounded.
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            path=getattr(route, "path", "unmatched"),
+            status=str(status)
+        )
 
-# --- Tool Instances ---
-py_parser = CodeParser()
-llm = LLMWrapper()
-py_test_gen = TestGenerator()
-js_test_gen = JSTestGenerator()
+async def _generate(
+    language: str,
+    filename: str,
+    content_str: str,
+    goal: CoverageGoal,
+    use_run_cache: bool
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Runs the /generate pipeline; returns its result and the stage timings."""
+    with collect_timings() as request_timings, bypass_run_cache(not use_run_cache), artifact_job():
+        if language == "python":
+            result = await run_python_pipeline(filename, content_str, goal)
+        else:
+            try:
+                result = await run_js_pipeline(filename, content_str, goal)
+            except (RuntimeError, ValueError, FileNotFoundError) as e:
+                raise HTTPException(500, f"Error processing JavaScript file: {str(e)}")
+    return result, request_timings.to_dict()
+
+async def _read_upload(language: str, file: UploadFile) -> SpooledUpload:
+    """Validates an uploaded source file and checks its size without decoding it."""
+    try:
+        validate_upload(language, file.filename)
+        return await SpooledUpload.from_upload(file, max_upload_bytes())
+    except UploadTooLarge as e:
+        raise HTTPException(413, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+def _upload_text(upload: SpooledUpload) -> str:
+    try:
+        return upload.text
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
 @app.post("/generate")
 async def generate_tests(
     language: str = Form(...),
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    coverage_target: Optional[float] = Form(None),
+    token_budget: Optional[int] = Form(None),
+    timings: bool = False,
+    run_cache: bool = True
 ):
     """
     Generate test cases for an uploaded file in the specified language.
+    With coverage_target (percent), more tests are generated for the lines
+    the first run missed until the target or token_budget is reached.
+    With ?timings=true the response includes a per-stage timing breakdown.
+    ?run_cache=false reruns the tests even if an identical run is cached.
+    Concurrent requests with the same language, file name, content and
+    options are served by a single pipeline run (TESTGEN_SINGLEFLIGHT=0
+    turns this off). Answers 429 with Retry-After when the LLM queue is full.
     """
-    if language == "python":
-        if not file.filename.endswith('.py'):
-            raise HTTPException(400, "For Python, only .py files are supported")
-        content_str = (await file.read()).decode('utf-8')
-        functions = py_parser.parse_file(content_str)
-        test_data_str = llm.generate_tests(content_str, functions)
-        test_json = json.loads(test_data_str)
-        module_name = Path(file.filename).stem
-        test_file_path = py_test_gen.generate_test_file(module_name, test_json)
-        coverage_results = run_tests_and_get_coverage(test_file_path, module_name)
-        return {
-            "language": "python",
-            "message": "Python tests generated and executed successfully",
-            "test_file_path": test_file_path,
-            "coverage_report": coverage_results
-        }
-
-    elif language == "javascript":
-        if not file.filename.endswith('.js'):
-            raise HTTPException(400, "For JavaScript, only .js files are supported")
-        content_str = (await file.read()).decode('utf-8')
-        try:
-            js_functions = parse_js_file(content_str)
-            test_data_str = llm.generate_js_tests(content_str, js_functions)
-            raw_json = json.loads(test_data_str)
-            test_json = map_test_cases_to_new_schema(raw_json)
-            module_name = Path(file.filename).stem
-            test_file_path = js_test_gen.generate_test_file(module_name, test_json)
-            coverage_results = run_js_tests_and_get_coverage(test_file_path, module_name)
-            return {
-                "language": "javascript",
-                "message": "JavaScript tests generated and executed successfully",
-                "test_file_path": test_file_path,
-                "coverage_report": coverage_results
-            }
-        except (RuntimeError, ValueError, FileNotFoundError) as e:
-            raise HTTPException(500, f"Error processing JavaScript file: {str(e)}")
+    upload = await _read_upload(language, file)
+    llm.backend.admission.check()
+    goal = CoverageGoal.from_env(coverage_target, token_budget)
 
+    def generate():
+        # Decoded here, when the flight starts, not inside the task: the
+        # upload is closed once this request is gone, the task may not be.
+        return _generate(language, file.filename, _upload_text(upload), goal, run_cache)
+
+    if singleflight_enabled():
+        # Identical uploads in flight share one pipeline run; only its
+        # leader ever decodes the upload.
+        key = make_key(language, file.filename, upload.sha256, asdict(goal), run_cache)
+        result, request_timings = await generate_flights.run(key, generate)
     else:
-        raise HTTPException(400, "Unsupported language. Please choose 'python' or 'javascript'.")
\ No newline at end of file
+        result, request_timings = await generate()
+    result = dict(result)
+    if timings:
+        result["timings"] = request_timings
+    return result
+
+def _format_event(event: dict, sse: bool) -> str:
+    if sse:
+        return f"event: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+    return json.dumps(event, default=str) + "\n"
+
+@app.post("/generate/stream")
+async def generate_tests_stream(
+    request: Request,
+    language: str = Form(...),
+    file: UploadFile = File(...),
+    format: str = Form("ndjson"),
+    coverage_target: Optional[float] = Form(None),
+    token_budget: Optional[int] = Form(None),
+    timings: bool = False,
+    run_cache: bool = True
+):
+    """
+    Same pipeline as /generate, but streams progress events as each stage
+    finishes: parsed functions, test groups, the test file path, per-test
+    results and finally the full result. Sent as NDJSON by default, or as
+    Server-Sent Events with format=sse or an Accept: text/event-stream header.
+    ?timings=true adds the per-stage timing breakdown to the result event.
+    ?run_cache=false reruns the tests even if an identical run is cached.
+    Answers 429 with Retry-After when the LLM queue is full.
+    """
+    content_str = _upload_text(await _read_upload(language, file))
+    llm.backend.admission.check()
+    sse = format == "sse" or "text/event-stream" in request.headers.get("accept", "")
+    goal = CoverageGoal.from_env(coverage_target, token_budget)
+
+    async def body():
+        async for event in stream_pipeline(language, file.filename, content_str, timings, goal, run_cache):
+            yield _format_event(event, sse)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        # Stop reverse proxies from buffering the stream until it ends.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    language: str = Form(...),
+    file: UploadFile = File(...)
+):
+    """
+    Queue a generate-and-run job and return its id immediately.
+    Poll GET /jobs/{job_id} for status and results.
+    """
+    content_str = _upload_text(await _read_upload(language, file))
+    job = job_manager.submit(language, file.filename, content_str)
+    return JSONResponse(status_code=202, content={
+        "job_id": job.id,
+        "status": job.status,
+        "queue_size": job_manager.queue_size()
+    })
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Return the status and, once finished, the result of a queued job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"Job '{job_id}' not found")
+    return job.to_dict()
+
+@app.post("/batch", status_code=202)
+async def submit_batch(file: UploadFile = File(...)):
+    """
+    Queue a whole repository (.zip or .tar.gz archive). Every .py/.js file is
+    parsed, given generated tests and run; poll GET /batch/{job_id} for the
+    per-file and repo-wide report.
+    """
+    suffix = "".join(Path(file.filename or "").suffixes) or ".zip"
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as archive:
+        await asyncio.to_thread(shutil.copyfileobj, file.file, archive)
+    job = batch_manager.submit("batch", file.filename, archive.name)
+    return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status})
+
+@app.get("/batch/{job_id}")
+async def get_batch(job_id: str):
+    """Return the status and, once finished, the aggregated report of a batch."""
+    job = batch_manager.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"Batch '{job_id}' not found")
+    return job.to_dict()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters for the LLM response and test run caches, and the artifact store's size."""
+    return {
+        "llm": llm.cache_stats(),
+        "runs": test_run_cache.stats(),
+        "artifacts": await asyncio.to_thread(artifact_store.stats)
+    }
+
+@app.get("/artifacts/{job_id}")
+async def get_artifacts(job_id: str):
+    """
+    List what a job stored: the final test file, result.json, and the test
+    file, coverage report and log of each run under runs/<n>/. The job id
+    is the one /generate, /generate/stream and /jobs return.
+    """
+    manifest = await asyncio.to_thread(artifact_store.manifest, job_id)
+    if manifest is None:
+        raise HTTPException(404, f"No artifacts for job '{job_id}'")
+    return manifest
+
+@app.get("/artifacts/{job_id}/{name:path}")
+async def get_artifact(job_id: str, name: str):
+    """Download one of a job's artifacts."""
+    data = await asyncio.to_thread(artifact_store.get, job_id, name)
+    if data is None:
+        raise HTTPException(404, f"Artifact '{name}' of job '{job_id}' not found")
+    media_type = "application/json" if name.endswith(".json") else "application/xml" if name.endswith(".xml") else "text/plain"
+    return Response(data, media_type=media_type)
+
+@app.get("/llm/admission")
+async def llm_admission():
+    """Queue length, backoff pause and admitted rate of the LLM admission controller."""
+    return llm.backend.admission.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Stage, LLM, cache and HTTP metrics in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,229 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; covers everything from a cache lookup to a slow LLM call.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Characters of prompt or response text.
+SIZE_BUCKETS = (500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 1000000)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels, rendered in Prometheus text format."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last)], sum, count
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = sorted((key, list(s[0]), s[1], s[2]) for key, s in self._series.items())
+        lines = []
+        for key, bucket_counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "testgen_stage_duration_seconds", "Time spent in each pipeline stage.", ["stage"]
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "testgen_http_request_duration_seconds", "HTTP request latency.", ["method", "path", "status"]
+)
+LLM_ATTEMPTS = REGISTRY.counter(
+    "testgen_llm_attempts_total", "LLM calls by backend and outcome (ok, repaired, salvaged, invalid, error).", ["backend", "outcome"]
+)
+LLM_RETRIES = REGISTRY.counter(
+    "testgen_llm_retries_total", "LLM calls that were retries of an earlier attempt.", ["backend"]
+)
+LLM_PROMPT_CHARS = REGISTRY.histogram(
+    "testgen_llm_prompt_chars", "Prompt size in characters.", ["backend"], SIZE_BUCKETS
+)
+LLM_RESPONSE_CHARS = REGISTRY.histogram(
+    "testgen_llm_response_chars", "Response size in characters.", ["backend"], SIZE_BUCKETS
+)
+LLM_ADMISSION_SECONDS = REGISTRY.histogram(
+    "testgen_llm_admission_wait_seconds", "Time LLM calls waited for admission.", ["backend", "priority"]
+)
+LLM_ADMISSION_REJECTED = REGISTRY.counter(
+    "testgen_llm_admission_rejected_total", "LLM calls rejected because the admission queue was full.", ["backend"]
+)
+LLM_THROTTLED = REGISTRY.counter(
+    "testgen_llm_throttled_total", "LLM calls the provider throttled, by HTTP status (429, 503).", ["backend", "status"]
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "testgen_cache_requests_total", "Cache lookups by cache and result (hit, miss).", ["cache", "result"]
+)
+SINGLEFLIGHT_REQUESTS = REGISTRY.counter(
+    "testgen_singleflight_requests_total",
+    "Requests that started work (leader) or joined identical work in flight (follower).",
+    ["flight", "role"]
+)
+ARTIFACT_WRITES = REGISTRY.counter(
+    "testgen_artifact_writes_total", "Artifacts stored, by whether their content was already in the store.", ["deduplicated"]
+)
+ARTIFACT_EVICTIONS = REGISTRY.counter(
+    "testgen_artifact_evictions_total", "Artifact jobs removed by retention, by reason (age, size).", ["reason"]
+)
+
+
+class RequestTimings:
+    """Stage durations collected for one request; shared across its threads."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._stages: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            entry = self._stages.setdefault(stage, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {
+                stage: {"count": count, "total_s": round(total, 6)}
+                for stage, (count, total) in self._stages.items()
+            }
+        return {"total_s": round(time.perf_counter() - self.started, 6), "stages": stages}
+
+
+_current_timings: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    "testgen_request_timings", default=None
+)
+
+
+@contextmanager
+def collect_timings() -> Iterator[RequestTimings]:
+    """Collects every span recorded in this context (and contexts copied from it)."""
+    timings = RequestTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Times the enclosed block into the stage histogram and the request's timings."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def in_context(func: Callable, *args: Any) -> Callable[[], Any]:
+    """
+    Binds func to a copy of the current context, so spans recorded on an
+    executor thread still reach the request that submitted the work.
+    """
+    context = contextvars.copy_context()
+    return lambda: context.run(func, *args)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
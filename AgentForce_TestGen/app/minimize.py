@@ -0,0 +1,151 @@
+import copy
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .test_generator import format_arguments, parse_arguments
+
+# (array key, group name key) of each language's test plan.
+_PLAN_KEYS = {
+    "python": ("test_groups", "function_name"),
+    "javascript": ("tests", "describe"),
+}
+
+_COMMA = re.compile(r"\s*,\s*")
+
+# Test name -> (group index, case index) of every plan case behind it.
+TestNames = Dict[str, List[Tuple[int, int]]]
+
+
+def minimize_enabled() -> bool:
+    """Off by default: it needs per-test coverage contexts, which slow every run down."""
+    return os.getenv("TESTGEN_MINIMIZE", "0") != "0"
+
+
+def _normalize_input(language: str, value: Any) -> str:
+    if not isinstance(value, str):
+        return json.dumps(value, sort_keys=True, default=repr)
+    if language == "python":
+        # "1,2" and "1 , 2" are the same call; "(1, 2)" passes one tuple.
+        arguments = parse_arguments(value)
+        if arguments is not None:
+            return format_arguments(arguments)
+    return _COMMA.sub(", ", " ".join(value.split()))
+
+
+def case_key(language: str, group: Dict[str, Any], case: Dict[str, Any]) -> Tuple[str, str, str]:
+    """The normalized (function, input, expected output) a case tests."""
+    _, name_key = _PLAN_KEYS[language]
+    function = case.get("function_to_test") or group.get(name_key) or ""
+    return (
+        str(function),
+        _normalize_input(language, case.get("input")),
+        json.dumps(case.get("expected_output"), sort_keys=True, default=repr),
+    )
+
+
+def dedupe_plan(language: str, plan: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """Returns a copy of plan without repeated cases, and how many were removed."""
+    array_key, _ = _PLAN_KEYS[language]
+    deduped = copy.deepcopy(plan)
+    seen: Set[Tuple[str, str, str]] = set()
+    removed = 0
+    for group in deduped.get(array_key, []):
+        cases = []
+        for case in group.get("cases", []):
+            key = case_key(language, group, case)
+            if key in seen:
+                removed += 1
+                continue
+            seen.add(key)
+            cases.append(case)
+        group["cases"] = cases
+    return deduped, removed
+
+
+def select_tests(test_coverage: Dict[str, Iterable[str]], durations: Dict[str, float]) -> List[str]:
+    """
+    Greedy set cover: repeatedly keeps the test that covers the most
+    elements (lines, arcs, branches) not covered yet, the faster one on a
+    tie, until the kept tests cover everything the whole suite covered.
+    Tests that add nothing are left out.
+    """
+    remaining = {name: set(elements) for name, elements in test_coverage.items() if elements}
+    order = {name: index for index, name in enumerate(test_coverage)}
+    selected: List[str] = []
+    while remaining:
+        best = max(
+            remaining,
+            key=lambda name: (len(remaining[name]), -durations.get(name, 0.0), -order[name])
+        )
+        covered = remaining.pop(best)
+        selected.append(best)
+        for name in list(remaining):
+            remaining[name] -= covered
+            if not remaining[name]:
+                del remaining[name]
+    return selected
+
+
+def filter_plan(language: str, plan: Dict[str, Any], keep: Set[Tuple[int, int]]) -> Dict[str, Any]:
+    """Returns a copy of plan with only the (group, case) indexes in keep; empty groups are dropped."""
+    array_key, _ = _PLAN_KEYS[language]
+    filtered = copy.deepcopy(plan)
+    groups = []
+    for group_index, group in enumerate(filtered.get(array_key, [])):
+        group["cases"] = [
+            case for case_index, case in enumerate(group.get("cases", []))
+            if (group_index, case_index) in keep
+        ]
+        if group["cases"]:
+            groups.append(group)
+    filtered[array_key] = groups
+    return filtered
+
+
+def minimize_plan(
+    language: str,
+    plan: Dict[str, Any],
+    test_names: TestNames,
+    result: Dict[str, Any],
+    duplicates_removed: int = 0
+) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Keeps every failing test (they are what the suite is for) and the
+    smallest set of passing tests (see select_tests) that reaches the
+    coverage the passing tests of the run in result reach together, so the
+    kept suite covers exactly what the whole suite covered. The run must
+    have been made with per-test contexts and outcomes. Returns the plan of
+    the kept tests, or None when nothing can be dropped or the run has no
+    contexts, and a report of the saving.
+    """
+    report: Dict[str, Any] = {
+        "duplicates_removed": duplicates_removed,
+        "tests_before": len(test_names),
+        "tests_after": len(test_names),
+    }
+    test_coverage = result.get("test_coverage")
+    outcomes = result.get("test_outcomes")
+    if not test_coverage or not outcomes:
+        report["skipped"] = "no_contexts"
+        return None, report
+
+    passed = [name for name in test_names if outcomes.get(name) == "passed"]
+    failing = [name for name in test_names if outcomes.get(name) != "passed"]
+    durations = result.get("test_durations", {})
+    selected = failing + select_tests({name: test_coverage.get(name, []) for name in passed}, durations)
+    runtime_before = sum(durations.get(name, 0.0) for name in test_names)
+    runtime_after = sum(durations.get(name, 0.0) for name in selected)
+    report.update({
+        "tests_after": len(selected),
+        "failing_kept": len(failing),
+        "covered_elements": len({e for name in selected for e in test_coverage.get(name, [])}),
+        "runtime_before_s": round(runtime_before, 6),
+        "runtime_after_s": round(runtime_after, 6),
+        "runtime_saved_s": round(runtime_before - runtime_after, 6),
+    })
+    if len(selected) == len(test_names):
+        return None, report
+    keep = {ids for name in selected for ids in test_names[name]}
+    return filter_plan(language, plan, keep), report
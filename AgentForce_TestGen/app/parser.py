@@ -1,44 +1,365 @@
 import ast
-from dataclasses import dataclass
-from typing import List, Optional
+import copy
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 
-@dataclass
+from .metrics import CACHE_REQUESTS
+
+@dataclass(slots=True)
 class FunctionInfo:
+    # Dotted for methods ("Cart.total") and nested functions ("outer.inner").
     name: str
+    # Positional parameters a caller passes (no self/cls), then "*args" / "**kwargs".
     args: List[str]
     docstring: Optional[str]
     complexity: str
     imports: List[str]
+    lineno: int = 0
+    end_lineno: int = 0
+    # Hash of the normalized AST (no positions, no comments or formatting),
+    # so a function keeps its hash when unrelated code around it changes.
+    ast_hash: str = ""
+    # function, method, staticmethod, classmethod or nested
+    kind: str = "function"
+    class_name: Optional[str] = None
+    is_async: bool = False
+    kwonlyargs: List[str] = field(default_factory=list)
+    # Source text of default values and annotations ("return" for the return type).
+    defaults: Dict[str, str] = field(default_factory=dict)
+    annotations: Dict[str, str] = field(default_factory=dict)
+    # Dotted names called in the body, in order of first call.
+    calls: List[str] = field(default_factory=list)
+    # Names read in the body and nested bodies (locals included), in order of first use.
+    names: List[str] = field(default_factory=list)
+    loop_depth: int = 0
+
+@dataclass(slots=True)
+class ClassInfo:
+    name: str
+    bases: List[str]
+    docstring: Optional[str]
+    lineno: int = 0
+    end_lineno: int = 0
+    methods: List[str] = field(default_factory=list)
+
+@dataclass(slots=True)
+class Definition:
+    """A module-level import or assignment and the names it binds."""
+    names: List[str]
+    # import or assignment
+    kind: str
+    lineno: int = 0
+    end_lineno: int = 0
+
+@dataclass(slots=True)
+class ModuleInfo:
+    imports: List[str]
+    classes: List[ClassInfo]
+    # Every function, method and nested function, in source order.
+    functions: List[FunctionInfo]
+    definitions: List[Definition] = field(default_factory=list)
+
+    def call_graph(self) -> Dict[str, List[str]]:
+        """Edges from each function to the functions of this module it calls."""
+        names = {f.name for f in self.functions}
+        graph = {}
+        for function in self.functions:
+            edges = []
+            for call in function.calls:
+                target = _resolve_call(function, call, names)
+                if target is not None and target not in edges:
+                    edges.append(target)
+            graph[function.name] = edges
+        return graph
+
+# Kinds a generated test can call as module.<name>(...) without an instance.
+TESTABLE_KINDS = ("function", "staticmethod", "classmethod")
+
+def _resolve_call(function: FunctionInfo, call: str, names: set) -> Optional[str]:
+    head, _, rest = call.partition(".")
+    if f"{function.name}.{call}" in names:
+        return f"{function.name}.{call}"
+    if head in ("self", "cls") and function.class_name and rest:
+        target = f"{function.class_name}.{rest}"
+        return target if target in names else None
+    return call if call in names else None
+
+def hash_function_node(node: ast.AST) -> str:
+    normalized = ast.dump(node, annotate_fields=False, include_attributes=False)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def hash_source(source: str) -> str:
+    """
+    hash_function_node over a whole snippet, so comments and formatting do
+    not change it. A snippet that does not parse on its own is hashed as text.
+    """
+    try:
+        return hash_function_node(ast.parse(source))
+    except SyntaxError:
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+def _dotted_name(node: ast.AST) -> Optional[str]:
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+def _complexity(loop_depth: int) -> str:
+    if loop_depth == 0:
+        return "O(1)"
+    return "O(n)" if loop_depth == 1 else f"O(n^{loop_depth})"
+
+class _Frame:
+    """Per-function state while its body is being visited."""
+    __slots__ = ("info", "calls", "names", "depth", "max_depth")
+
+    def __init__(self, info: FunctionInfo):
+        self.info = info
+        self.calls: Dict[str, None] = {}
+        self.names: Dict[str, None] = {}
+        self.depth = 0
+        self.max_depth = 0
+
+class _ModuleVisitor(ast.NodeVisitor):
+    """
+    Collects imports, classes, functions, call edges and loop depth in one
+    traversal of the tree.
+    """
+
+    def __init__(self):
+        self.imports: List[str] = []
+        self.classes: List[ClassInfo] = []
+        self.functions: List[FunctionInfo] = []
+        self.definitions: List[Definition] = []
+        # Enclosing classes and functions, innermost last: ("class"|"function", name)
+        self._scopes: List[tuple] = []
+        self._frames: List[_Frame] = []
+
+    def _define(self, node: ast.stmt, names: List[str], kind: str) -> None:
+        if not self._scopes and names:
+            self.definitions.append(Definition(names, kind, node.lineno, node.end_lineno))
+
+    def visit_Import(self, node: ast.Import) -> None:
+        self.imports.extend(alias.name for alias in node.names)
+        self._define(node, [alias.asname or alias.name.split(".")[0] for alias in node.names], "import")
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        prefix = "." * node.level + (node.module or "")
+        separator = "." if node.module else ""
+        self.imports.extend(f"{prefix}{separator}{alias.name}" for alias in node.names)
+        self._define(node, [alias.asname or alias.name for alias in node.names], "import")
+
+    def _visit_assignment(self, node: ast.stmt, targets: List[ast.expr]) -> None:
+        names = [
+            target.id
+            for expression in targets
+            for target in ast.walk(expression)
+            if isinstance(target, ast.Name)
+        ]
+        self._define(node, names, "assignment")
+        self.generic_visit(node)
+
+    def visit_Assign(self, node: ast.Assign) -> None:
+        self._visit_assignment(node, node.targets)
+
+    def visit_AnnAssign(self, node: ast.AnnAssign) -> None:
+        self._visit_assignment(node, [node.target])
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        qualname = ".".join([name for _, name in self._scopes] + [node.name])
+        self.classes.append(ClassInfo(
+            name=qualname,
+            bases=[_dotted_name(base) or ast.unparse(base) for base in node.bases],
+            docstring=ast.get_docstring(node),
+            lineno=min([node.lineno] + [d.lineno for d in node.decorator_list]),
+            end_lineno=node.end_lineno
+        ))
+        self._scopes.append(("class", node.name))
+        self.generic_visit(node)
+        self._scopes.pop()
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
+        self._visit_function(node, is_async=False)
+
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef) -> None:
+        self._visit_function(node, is_async=True)
+
+    def _visit_function(self, node, is_async: bool) -> None:
+        decorators = {_dotted_name(d) for d in node.decorator_list}
+        class_name = None
+        if not self._scopes:
+            kind = "function"
+        elif any(scope == "function" for scope, _ in self._scopes):
+            kind = "nested"
+        else:
+            class_name = ".".join(name for _, name in self._scopes)
+            kind = "staticmethod" if "staticmethod" in decorators else (
+                "classmethod" if "classmethod" in decorators else "method"
+            )
+
+        arguments = node.args
+        positional = arguments.posonlyargs + arguments.args
+        if kind in ("method", "classmethod") and positional:
+            positional = positional[1:]
+        args = [a.arg for a in positional]
+        if arguments.vararg:
+            args.append(f"*{arguments.vararg.arg}")
+        if arguments.kwarg:
+            args.append(f"**{arguments.kwarg.arg}")
+
+        defaults = {}
+        for arg, default in zip(positional[len(positional) - len(arguments.defaults):], arguments.defaults):
+            defaults[arg.arg] = ast.unparse(default)
+        for arg, default in zip(arguments.kwonlyargs, arguments.kw_defaults):
+            if default is not None:
+                defaults[arg.arg] = ast.unparse(default)
+
+        annotations = {
+            a.arg: ast.unparse(a.annotation)
+            for a in positional + arguments.kwonlyargs + [arguments.vararg, arguments.kwarg]
+            if a is not None and a.annotation is not None
+        }
+        if node.returns is not None:
+            annotations["return"] = ast.unparse(node.returns)
+
+        info = FunctionInfo(
+            name=".".join([name for _, name in self._scopes] + [node.name]),
+            args=args,
+            docstring=ast.get_docstring(node),
+            complexity="O(1)",
+            imports=[],
+            lineno=min([node.lineno] + [d.lineno for d in node.decorator_list]),
+            end_lineno=node.end_lineno,
+            ast_hash=hash_function_node(node),
+            kind=kind,
+            class_name=class_name,
+            is_async=is_async,
+            kwonlyargs=[a.arg for a in arguments.kwonlyargs],
+            defaults=defaults,
+            annotations=annotations
+        )
+        self.functions.append(info)
+        if class_name is not None:
+            for cls in reversed(self.classes):
+                if cls.name == class_name:
+                    cls.methods.append(node.name)
+                    break
+
+        # Decorators and defaults run in the enclosing scope; only the body
+        # belongs to this function's calls and loops.
+        for expression in node.decorator_list + arguments.defaults + arguments.kw_defaults:
+            if expression is not None:
+                self.visit(expression)
+
+        frame = _Frame(info)
+        self._frames.append(frame)
+        self._scopes.append(("function", node.name))
+        for statement in node.body:
+            self.visit(statement)
+        self._scopes.pop()
+        self._frames.pop()
+        info.calls = list(frame.calls)
+        info.names = list(frame.names)
+        info.loop_depth = frame.max_depth
+        info.complexity = _complexity(frame.max_depth)
+
+    def visit_Call(self, node: ast.Call) -> None:
+        if self._frames:
+            name = _dotted_name(node.func)
+            if name is not None:
+                self._frames[-1].calls[name] = None
+        self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name) -> None:
+        # Enclosing functions read the names their nested functions read.
+        if isinstance(node.ctx, ast.Load):
+            for frame in self._frames:
+                frame.names[node.id] = None
+
+    def _visit_loop(self, node: ast.AST, levels: int = 1) -> None:
+        if not self._frames:
+            self.generic_visit(node)
+            return
+        frame = self._frames[-1]
+        frame.depth += levels
+        frame.max_depth = max(frame.max_depth, frame.depth)
+        self.generic_visit(node)
+        frame.depth -= levels
+
+    def visit_For(self, node: ast.For) -> None:
+        self._visit_loop(node)
+
+    def visit_AsyncFor(self, node: ast.AsyncFor) -> None:
+        self._visit_loop(node)
+
+    def visit_While(self, node: ast.While) -> None:
+        self._visit_loop(node)
+
+    def _visit_comprehension(self, node: ast.AST) -> None:
+        self._visit_loop(node, levels=len(node.generators))
+
+    visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp = _visit_comprehension
 
 class CodeParser:
+    """
+    Parses Python modules. Results are cached by content hash, so parsing
+    the same upload again costs one sha256 and a copy (TESTGEN_PARSE_CACHE_SIZE
+    entries, default 64; 0 disables the cache). Every call returns its own
+    copy, so a caller that edits the result cannot change what others get.
+    """
+
+    def __init__(self, cache_size: Optional[int] = None):
+        self.cache_size = int(os.getenv("TESTGEN_PARSE_CACHE_SIZE", "64")) if cache_size is None else cache_size
+        self._cache: "OrderedDict[str, ModuleInfo]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def parse_module(self, content: str) -> ModuleInfo:
+        key = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        with self._lock:
+            module = self._cache.get(key)
+            if module is not None:
+                self._cache.move_to_end(key)
+        if self.cache_size > 0:
+            CACHE_REQUESTS.inc(cache="parse", result="hit" if module is not None else "miss")
+        if module is not None:
+            return copy.deepcopy(module)
+
+        visitor = _ModuleVisitor()
+        visitor.visit(ast.parse(content))
+        module = ModuleInfo(
+            imports=visitor.imports,
+            classes=visitor.classes,
+            functions=visitor.functions,
+            definitions=visitor.definitions
+        )
+        # All imports of the module, including those below the function.
+        for function in module.functions:
+            function.imports = list(module.imports)
+
+        if self.cache_size > 0:
+            with self._lock:
+                self._cache[key] = copy.deepcopy(module)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return module
+
     def parse_file(self, content: str) -> List[FunctionInfo]:
-        tree = ast.parse(content)
-        functions = []
-        
-        imports = []
-        for node in ast.walk(tree):
-            if isinstance(node, (ast.Import, ast.ImportFrom)):
-                if isinstance(node, ast.Import):
-                    imports.extend(n.name for n in node.names)
-                else:
-                    imports.extend(f"{node.module}.{n.name}" for n in node.names)
-
-        for node in tree.body:
-            if isinstance(node, ast.FunctionDef):
-                functions.append(FunctionInfo(
-                    name=node.name,
-                    args=[arg.arg for arg in node.args.args],
-                    docstring=ast.get_docstring(node),
-                    complexity=self._estimate_complexity(node),
-                    imports=imports
-                ))
-        
-        return functions
-
-    def _estimate_complexity(self, node: ast.FunctionDef) -> str:
-        loops = len([n for n in ast.walk(node) if isinstance(n, (ast.For, ast.While))])
-        if loops > 1:
-            return "O(n^2)" if any(
-                isinstance(n, ast.For) for n in ast.walk(node)
-            ) else "O(n)"
-        return "O(1)"
\ No newline at end of file
+        """
+        Returns the functions a generated test can call as module.<name>(...):
+        module-level functions (async included) and static and class methods.
+        Instance methods and nested functions are only in parse_module().
+        """
+        return [f for f in self.parse_module(content).functions if f.kind in TESTABLE_KINDS]
+
+def function_source(content: str, function: FunctionInfo) -> str:
+    """Returns the source lines of a parsed function, decorators included."""
+    lines = content.splitlines()
+    return "\n".join(lines[function.lineno - 1:function.end_lineno])
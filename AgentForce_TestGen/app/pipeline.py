@@ -0,0 +1,558 @@
+import asyncio
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Any, List, Optional, Sequence, Tuple
+
+# --- Python Tools ---
+from .parser import CodeParser, FunctionInfo
+from .llm import GenerationStats, LLMWrapper
+from .incremental import IncrementalGenerator, incremental_enabled, testable_js_functions
+from .test_generator import TestGenerator
+from .runner import run_tests_and_get_coverage_async
+
+# --- JavaScript Tools ---
+from .js_parser import parse_js_file_async
+from .js_test_generator import JSTestGenerator
+from .js_runner import run_js_tests_and_get_coverage_async
+
+from .coverage_loop import CoverageGoal, run_coverage_rounds
+from .minimize import dedupe_plan, minimize_enabled, minimize_plan
+from .admission import BATCH, AdmissionRejected, current_priority
+from .artifacts import artifact_job, artifact_store, current_artifact_job, new_job_id
+from .run_cache import bypass_run_cache
+from .metrics import RequestTimings, collect_timings, in_context, span
+from .workspace import Workspace
+
+SUPPORTED_EXTENSIONS = {"python": ".py", "javascript": ".js"}
+
+EventCallback = Callable[[Dict[str, Any]], None]
+
+# Names of the artifacts a run stores (see record_run and archive_result).
+TEST_FILE_NAMES = {"python": "test_{}.py", "javascript": "{}.test.js"}
+COVERAGE_REPORTS = {"python": Path("coverage.xml"), "javascript": Path("coverage") / "coverage-final.json"}
+
+# --- Tool Instances ---
+py_parser = CodeParser()
+llm = LLMWrapper()
+py_test_gen = TestGenerator()
+js_test_gen = JSTestGenerator()
+incremental_gen = IncrementalGenerator(
+    llm,
+    max_concurrency=int(os.getenv("TESTGEN_LLM_CONCURRENCY", "4")),
+    batch_concurrency=int(os.getenv("TESTGEN_BATCH_LLM_THREADS", "4"))
+)
+
+# The Gemini client is synchronous, so LLM calls are pushed onto a dedicated
+# thread pool and awaited from the event loop.
+llm_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TESTGEN_LLM_THREADS", "8")),
+    thread_name_prefix="testgen-llm"
+)
+# Batch-priority calls wait for admission on threads of their own, so they
+# never hold the threads interactive requests need to reach the queue. The
+# per-function calls of incremental generation are split the same way
+# (see IncrementalGenerator).
+batch_llm_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TESTGEN_BATCH_LLM_THREADS", "4")),
+    thread_name_prefix="testgen-llm-batch"
+)
+
+
+# --- Compatibility Function ---
+def map_test_cases_to_new_schema(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    If the old 'test_cases' format is detected, map it to the new schema.
+    """
+    if "test_cases" in data and "tests" not in data:
+        describes = {}
+        for case in data["test_cases"]:
+            func_name = case["function"]
+            if func_name not in describes:
+                describes[func_name] = {
+                    "describe": func_name,
+                    "cases": []
+                }
+            describes[func_name]["cases"].append({
+                "it": f"should handle input {case['input']}",
+                "function_to_test": func_name,
+                "input": str(case['input']),
+                "expected_output": case['expected_output']
+            })
+
+        func_names = ", ".join(describes.keys())
+
+        return {
+            "imports": f"const {{ {func_names} }} = require('../examples/sample_input');",
+            "tests": list(describes.values())
+        }
+    return data
+
+
+def validate_upload(language: str, filename: str) -> None:
+    """Raises ValueError if the language/filename pair cannot be processed."""
+    if language not in SUPPORTED_EXTENSIONS:
+        raise ValueError("Unsupported language. Please choose 'python' or 'javascript'.")
+    if not filename or not filename.endswith(SUPPORTED_EXTENSIONS[language]):
+        label = "Python" if language == "python" else "JavaScript"
+        raise ValueError(f"For {label}, only {SUPPORTED_EXTENSIONS[language]} files are supported")
+
+
+def _keep_test_file(generated_path: str, output_dir: Path) -> str:
+    """Copies a generated test file out of its job workspace before cleanup."""
+    output_dir.mkdir(exist_ok=True)
+    return str(shutil.copy(generated_path, output_dir / Path(generated_path).name))
+
+
+def record_run(workspace: Workspace, generated_path: str, result: Dict[str, Any]) -> None:
+    """
+    Stores a run's test file, coverage report and log as runs/<n>/ of the
+    current artifact job, if there is one, before its workspace is removed.
+    """
+    job_id = current_artifact_job()
+    if job_id is None:
+        return
+    try:
+        files = (artifact_store.manifest(job_id) or {}).get("files", {})
+        prefix = f"runs/{1 + len({name.split('/')[1] for name in files if name.startswith('runs/')})}/"
+        test_name = TEST_FILE_NAMES[workspace.language].format(workspace.module_name)
+        artifact_store.put_file(job_id, prefix + test_name, Path(generated_path))
+        report = COVERAGE_REPORTS[workspace.language]
+        artifact_store.put_file(job_id, prefix + report.name, workspace.root / report)
+        if result.get("full_log"):
+            artifact_store.put(job_id, prefix + "output.log", result["full_log"].encode("utf-8"))
+    except OSError as e:
+        print(f"Could not store run artifacts: {e}")
+
+
+def archive_result(language: str, module_name: str, test_json: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Stores the final test file and the result itself in the current
+    artifact job (a new one if there is none). The result gets the job id,
+    and as test_file_path the path GET /artifacts serves the test file from.
+    """
+    job_id = current_artifact_job() or new_job_id()
+    result["job_id"] = job_id
+    result["test_file_path"] = None
+    generator = py_test_gen if language == "python" else js_test_gen
+    name = TEST_FILE_NAMES[language].format(module_name)
+    try:
+        artifact_store.put(job_id, name, generator.render(module_name, test_json).encode("utf-8"))
+        result["test_file_path"] = f"/artifacts/{job_id}/{name}"
+        artifact_store.put(job_id, "result.json", json.dumps(result, default=str).encode("utf-8"))
+    except OSError as e:
+        print(f"Could not store the test file: {e}")
+    return result
+
+
+async def _run_llm(func, *args):
+    loop = asyncio.get_running_loop()
+    executor = batch_llm_executor if current_priority() == BATCH else llm_executor
+    # Copy the context so spans recorded on the LLM thread reach this request.
+    return await loop.run_in_executor(executor, in_context(func, *args))
+
+
+async def generate_python_plan(
+    content_str: str,
+    functions: List[FunctionInfo],
+    on_group: Optional[EventCallback] = None,
+    stats: Optional[GenerationStats] = None
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    LLM stage for Python: returns the validated test plan and generation
+    stats, including LLM calls and retries under "llm". on_group is called
+    from a worker thread for each test group as soon as it is validated.
+    Pass stats to keep counting LLM usage in later stages.
+    """
+    stats = stats if stats is not None else GenerationStats()
+    if incremental_enabled():
+        test_json, generation = await _run_llm(incremental_gen.generate_python, content_str, functions, on_group, stats)
+    elif on_group is not None:
+        test_json = json.loads(await _run_llm(llm.stream_tests, content_str, functions, on_group, stats))
+        generation = {"mode": "whole_file"}
+    else:
+        test_json = json.loads(await _run_llm(llm.generate_tests, content_str, functions, stats))
+        generation = {"mode": "whole_file"}
+    async_functions = [f.name for f in functions if f.is_async]
+    if async_functions:
+        # The test generator awaits these with asyncio.run.
+        test_json["async_functions"] = async_functions
+    generation["llm"] = stats.to_dict()
+    return test_json, generation
+
+
+async def execute_python_plan(
+    module_name: str,
+    content_str: str,
+    test_json: Dict[str, Any],
+    keep_dir: Optional[Path],
+    on_file: Optional[Callable[[str], None]] = None,
+    on_test: Optional[EventCallback] = None,
+    contexts: bool = False,
+    package_dir: Optional[Path] = None,
+    python_path: Sequence[Path] = ()
+) -> Tuple[Optional[str], Dict[str, Any]]:
+    """
+    Writes the test file into a fresh workspace and runs it. Returns the
+    kept copy of the test file (None if keep_dir is None) and the run result.
+    The pipelines keep nothing: each run is stored as an artifact of the
+    current job instead (see record_run). on_file gets the test file path
+    before the run starts; on_test gets each test's outcome as it is
+    reported. With contexts, the result also has per-test coverage and
+    durations for minimize_suite. package_dir and python_path place a
+    module that is part of a project next to the rest of its package (see
+    Workspace).
+    """
+    with span("workspace.create"):
+        workspace = await asyncio.to_thread(
+            Workspace, module_name, "python", content_str, None, package_dir, python_path
+        )
+    try:
+        with span("generate.test_file"):
+            generated_path = await asyncio.to_thread(
+                py_test_gen.generate_test_file, module_name, test_json, workspace.tests_dir
+            )
+        test_file_path = None
+        if keep_dir is not None:
+            test_file_path = await asyncio.to_thread(_keep_test_file, generated_path, keep_dir)
+        if on_file is not None:
+            on_file(test_file_path or generated_path)
+        coverage_results = await run_tests_and_get_coverage_async(
+            generated_path, module_name, workspace, on_test, contexts
+        )
+        with span("artifacts.store"):
+            await asyncio.to_thread(record_run, workspace, generated_path, coverage_results)
+    finally:
+        with span("workspace.cleanup"):
+            await asyncio.to_thread(workspace.cleanup)
+    return test_file_path, coverage_results
+
+
+async def generate_js_plan(
+    content_str: str,
+    js_functions: List[Dict[str, Any]],
+    module_name: str,
+    on_group: Optional[EventCallback] = None,
+    stats: Optional[GenerationStats] = None
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """JavaScript counterpart of generate_python_plan."""
+    stats = stats if stats is not None else GenerationStats()
+    if incremental_enabled():
+        test_json, generation = await _run_llm(
+            incremental_gen.generate_js, content_str, js_functions, module_name, on_group, stats
+        )
+    else:
+        if on_group is not None:
+            raw_json = json.loads(await _run_llm(llm.stream_js_tests, content_str, js_functions, on_group, stats))
+        else:
+            raw_json = json.loads(await _run_llm(llm.generate_js_tests, content_str, js_functions, stats))
+        test_json, generation = map_test_cases_to_new_schema(raw_json), {"mode": "whole_file"}
+    generation["llm"] = stats.to_dict()
+    return test_json, generation
+
+
+async def execute_js_plan(
+    module_name: str,
+    content_str: str,
+    test_json: Dict[str, Any],
+    keep_dir: Optional[Path],
+    on_file: Optional[Callable[[str], None]] = None,
+    on_test: Optional[EventCallback] = None,
+    contexts: bool = False,
+    package_dir: Optional[Path] = None
+) -> Tuple[Optional[str], Dict[str, Any]]:
+    """JavaScript counterpart of execute_python_plan."""
+    with span("workspace.create"):
+        workspace = await asyncio.to_thread(Workspace, module_name, "javascript", content_str, None, package_dir)
+    try:
+        with span("generate.test_file"):
+            generated_path = await asyncio.to_thread(
+                js_test_gen.generate_test_file, module_name, test_json, workspace.tests_dir
+            )
+        test_file_path = None
+        if keep_dir is not None:
+            test_file_path = await asyncio.to_thread(_keep_test_file, generated_path, keep_dir)
+        if on_file is not None:
+            on_file(test_file_path or generated_path)
+        coverage_results = await run_js_tests_and_get_coverage_async(
+            generated_path, module_name, workspace, on_test, contexts
+        )
+        with span("artifacts.store"):
+            await asyncio.to_thread(record_run, workspace, generated_path, coverage_results)
+    finally:
+        with span("workspace.cleanup"):
+            await asyncio.to_thread(workspace.cleanup)
+    return test_file_path, coverage_results
+
+
+async def improve_coverage(
+    language: str,
+    module_name: str,
+    content_str: str,
+    functions: List[Any],
+    test_json: Dict[str, Any],
+    test_file_path: Optional[str],
+    coverage_results: Dict[str, Any],
+    goal: CoverageGoal,
+    stats: GenerationStats,
+    generation: Dict[str, Any],
+    on_round: Optional[EventCallback] = None
+) -> Tuple[Dict[str, Any], Optional[str], Dict[str, Any]]:
+    """
+    Runs coverage-guided rounds (see run_coverage_rounds) on an executed plan
+    when goal is enabled, and records them under generation["coverage_loop"].
+    Returns the plan, kept test file and run result of the best plan.
+    """
+    if not goal.enabled:
+        return test_json, test_file_path, coverage_results
+    contexts = minimize_enabled()
+    if language == "python":
+        generate_gaps = lambda gaps: _run_llm(incremental_gen.generate_python_gaps, content_str, gaps, stats)
+        execute = lambda plan: execute_python_plan(module_name, content_str, plan, None, contexts=contexts)
+    else:
+        functions = testable_js_functions(functions)
+        generate_gaps = lambda gaps: _run_llm(incremental_gen.generate_js_gaps, content_str, gaps, stats)
+        execute = lambda plan: execute_js_plan(module_name, content_str, plan, None, contexts=contexts)
+    test_json, test_file_path, coverage_results, report = await run_coverage_rounds(
+        goal, language, module_name, functions, test_json, test_file_path, coverage_results,
+        generate_gaps, execute, stats, on_round
+    )
+    generation["coverage_loop"] = report
+    generation["llm"] = stats.to_dict()
+    return test_json, test_file_path, coverage_results
+
+
+def dedupe_tests(language: str, test_json: Dict[str, Any], generation: Dict[str, Any]) -> Dict[str, Any]:
+    """Drops repeated cases from a generated plan when minimization is on."""
+    if not minimize_enabled():
+        return test_json
+    test_json, removed = dedupe_plan(language, test_json)
+    generation["minimize"] = {"duplicates_removed": removed}
+    return test_json
+
+
+async def minimize_suite(
+    language: str,
+    module_name: str,
+    content_str: str,
+    test_json: Dict[str, Any],
+    coverage_results: Dict[str, Any],
+    generation: Dict[str, Any]
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Keeps only the tests minimize_plan selects from the per-test coverage
+    and outcomes of the final run, and records the saving under
+    generation["minimize"]. The kept tests cover exactly the elements the
+    whole suite covered, so the coverage of the run result holds for them
+    and nothing is run again; its test counts stay those of the whole suite
+    (tests_before). The per-test data is removed from the result either way.
+    """
+    run = {
+        "test_coverage": coverage_results.pop("test_coverage", None),
+        "test_durations": coverage_results.pop("test_durations", {}),
+        "test_outcomes": coverage_results.pop("test_outcomes", None),
+    }
+    if not minimize_enabled():
+        return test_json, coverage_results
+    generator = py_test_gen if language == "python" else js_test_gen
+    duplicates_removed = generation.get("minimize", {}).get("duplicates_removed", 0)
+    with span("minimize"):
+        minimized, report = minimize_plan(
+            language, test_json, generator.test_names(module_name, test_json), run, duplicates_removed
+        )
+    generation["minimize"] = report
+    if minimized is None:
+        return test_json, coverage_results
+    report["coverage_before"] = report["coverage_after"] = coverage_results.get("coverage_percentage")
+    return minimized, coverage_results
+
+
+async def run_python_pipeline(
+    filename: str,
+    content_str: str,
+    goal: Optional[CoverageGoal] = None
+) -> Dict[str, Any]:
+    """
+    parse -> LLM -> generate -> run for a Python module, without blocking the
+    loop; then more rounds towards goal (default: from the environment).
+    """
+    goal = goal or CoverageGoal.from_env()
+    stats = GenerationStats()
+    with span("parse.python"):
+        functions = await asyncio.to_thread(py_parser.parse_file, content_str)
+    test_json, generation = await generate_python_plan(content_str, functions, stats=stats)
+    test_json = dedupe_tests("python", test_json, generation)
+    module_name = Path(filename).stem
+    test_file_path, coverage_results = await execute_python_plan(
+        module_name, content_str, test_json, None, contexts=minimize_enabled()
+    )
+    test_json, test_file_path, coverage_results = await improve_coverage(
+        "python", module_name, content_str, functions, test_json, test_file_path, coverage_results,
+        goal, stats, generation
+    )
+    test_json, coverage_results = await minimize_suite(
+        "python", module_name, content_str, test_json, coverage_results, generation
+    )
+    return await asyncio.to_thread(archive_result, "python", module_name, test_json, {
+        "language": "python",
+        "message": "Python tests generated and executed successfully",
+        "generation": generation,
+        "coverage_report": coverage_results
+    })
+
+
+async def run_js_pipeline(
+    filename: str,
+    content_str: str,
+    goal: Optional[CoverageGoal] = None
+) -> Dict[str, Any]:
+    """JavaScript counterpart of run_python_pipeline."""
+    goal = goal or CoverageGoal.from_env()
+    stats = GenerationStats()
+    js_functions = await parse_js_file_async(content_str)
+    module_name = Path(filename).stem
+    test_json, generation = await generate_js_plan(content_str, js_functions, module_name, stats=stats)
+    test_json = dedupe_tests("javascript", test_json, generation)
+    test_file_path, coverage_results = await execute_js_plan(
+        module_name, content_str, test_json, None, contexts=minimize_enabled()
+    )
+    test_json, test_file_path, coverage_results = await improve_coverage(
+        "javascript", module_name, content_str, js_functions, test_json, test_file_path, coverage_results,
+        goal, stats, generation
+    )
+    test_json, coverage_results = await minimize_suite(
+        "javascript", module_name, content_str, test_json, coverage_results, generation
+    )
+    return await asyncio.to_thread(archive_result, "javascript", module_name, test_json, {
+        "language": "javascript",
+        "message": "JavaScript tests generated and executed successfully",
+        "generation": generation,
+        "coverage_report": coverage_results
+    })
+
+
+async def run_pipeline(
+    language: str,
+    filename: str,
+    content_str: str,
+    goal: Optional[CoverageGoal] = None
+) -> Dict[str, Any]:
+    validate_upload(language, filename)
+    if language == "python":
+        return await run_python_pipeline(filename, content_str, goal)
+    return await run_js_pipeline(filename, content_str, goal)
+
+
+def _function_summary(language: str, function: Any) -> Dict[str, Any]:
+    if language == "python":
+        return {"name": function.name, "args": function.args, "line": function.lineno}
+    return {"name": function["name"], "args": function.get("args", []), "line": function.get("line")}
+
+
+async def stream_pipeline(
+    language: str,
+    filename: str,
+    content_str: str,
+    timings: bool = False,
+    goal: Optional[CoverageGoal] = None,
+    use_run_cache: bool = True
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Runs the same pipeline as run_pipeline but yields progress events as the
+    stages finish, each {"event": name, "data": {...}}:
+
+        parsed      functions found in the upload
+        test_group  one validated test group (per function, or as streamed)
+        test_file   path of the generated test file, before it runs
+        test_result one test's outcome as the runner reports it
+        coverage_round  one coverage-guided round finished (see run_coverage_rounds)
+        result      the same body /generate returns
+        error       the pipeline failed; always the last event
+
+    With timings, the result also carries the per-stage timing breakdown.
+    use_run_cache=False reruns the tests even if the run cache has them.
+    The pipeline runs in a background task; if the consumer stops reading
+    (e.g. the client disconnects) the task is cancelled.
+    """
+    goal = goal or CoverageGoal.from_env()
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    def emit(event: str, data: Any) -> None:
+        # Called from the event loop and from LLM worker threads alike.
+        loop.call_soon_threadsafe(events.put_nowait, {"event": event, "data": data})
+
+    async def produce() -> None:
+        with collect_timings() as request_timings, bypass_run_cache(not use_run_cache), artifact_job():
+            await run_stages(request_timings if timings else None)
+
+    async def run_stages(request_timings: Optional[RequestTimings]) -> None:
+        try:
+            module_name = Path(filename).stem
+            on_group = lambda group: emit("test_group", group)
+            on_file = lambda path: emit("test_file", {"test_file_path": path})
+            on_test = lambda result: emit("test_result", result)
+            on_round = lambda report: emit("coverage_round", report)
+            stats = GenerationStats()
+
+            if language == "python":
+                with span("parse.python"):
+                    functions = await asyncio.to_thread(py_parser.parse_file, content_str)
+            else:
+                functions = await parse_js_file_async(content_str)
+            emit("parsed", {
+                "module": module_name,
+                "functions": [_function_summary(language, f) for f in functions]
+            })
+
+            if language == "python":
+                test_json, generation = await generate_python_plan(content_str, functions, on_group, stats)
+                test_json = dedupe_tests(language, test_json, generation)
+                test_file_path, coverage_results = await execute_python_plan(
+                    module_name, content_str, test_json, None, on_file, on_test, minimize_enabled()
+                )
+            else:
+                test_json, generation = await generate_js_plan(content_str, functions, module_name, on_group, stats)
+                test_json = dedupe_tests(language, test_json, generation)
+                test_file_path, coverage_results = await execute_js_plan(
+                    module_name, content_str, test_json, None, on_file, on_test, minimize_enabled()
+                )
+            test_json, test_file_path, coverage_results = await improve_coverage(
+                language, module_name, content_str, functions, test_json, test_file_path, coverage_results,
+                goal, stats, generation, on_round
+            )
+            test_json, coverage_results = await minimize_suite(
+                language, module_name, content_str, test_json, coverage_results, generation
+            )
+
+            label = "Python" if language == "python" else "JavaScript"
+            result = await asyncio.to_thread(archive_result, language, module_name, test_json, {
+                "language": language,
+                "message": f"{label} tests generated and executed successfully",
+                "generation": generation,
+                "coverage_report": coverage_results
+            })
+            if request_timings is not None:
+                result["timings"] = request_timings.to_dict()
+            emit("result", result)
+        except AdmissionRejected as e:
+            emit("error", {"error": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            emit("error", {"error": str(e)})
+        finally:
+            loop.call_soon_threadsafe(events.put_nowait, done)
+
+    validate_upload(language, filename)
+    task = asyncio.create_task(produce())
+    try:
+        while True:
+            event = await events.get()
+            if event is done:
+                return
+            yield event
+    finally:
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,136 @@
+"""
+pytest plugin that reports each test's outcome the moment it is known, and
+enforces the per-test wall-clock limit.
+
+Loaded with `-p app.pytest_events` by the runner. Options:
+
+    --testgen-stream         write every result to stdout as one line starting
+                             with EVENT_MARKER followed by JSON, which the
+                             streaming runner picks out of the normal output
+    --testgen-events-file    also append start and result events to this file,
+                             flushed per test, so a run that is killed still
+                             shows which tests finished
+    --testgen-test-timeout   fail a test that runs longer than this many
+                             seconds (SIGALRM; not available on Windows)
+    --testgen-shard          "i/N": run only shard i of N (0-based) of the
+                             collected tests, split with app.sharding.balance
+    --testgen-durations      JSON file of past {test name: seconds} used to
+                             balance the shards
+    --testgen-select         JSON file of the test functions to run (see
+                             app.selection); a run that selects none of them
+                             still succeeds
+"""
+import json
+import signal
+import sys
+
+import pytest
+
+from .sharding import balance
+
+EVENT_MARKER = "@@testgen-event@@"
+
+_config = None
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("testgen")
+    group.addoption("--testgen-stream", action="store_true", default=False)
+    group.addoption("--testgen-events-file", default=None)
+    group.addoption("--testgen-test-timeout", type=float, default=0.0)
+    group.addoption("--testgen-shard", default=None)
+    group.addoption("--testgen-durations", default=None)
+    group.addoption("--testgen-select", default=None)
+
+
+def pytest_configure(config):
+    global _config
+    _config = config
+
+
+def _load_json(path, default):
+    if not path:
+        return default
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _deselect(config, items, keep) -> None:
+    selected = [item for item in items if keep(item)]
+    if len(selected) < len(items):
+        config.hook.pytest_deselected(items=[item for item in items if not keep(item)])
+        items[:] = selected
+
+
+def pytest_collection_modifyitems(session, config, items):
+    select = config.getoption("testgen_select")
+    if select:
+        names = set(_load_json(select, []))
+        _deselect(config, items, lambda item: (getattr(item, "originalname", None) or item.name) in names)
+
+    shard = config.getoption("testgen_shard")
+    if not shard:
+        return
+    index, count = (int(part) for part in shard.split("/"))
+    durations = _load_json(config.getoption("testgen_durations"), {})
+    # Every shard process collects the same items and computes the same split.
+    keep = set(balance([item.name for item in items], durations, count)[index])
+    _deselect(config, items, lambda item: item.name in keep)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    # Every test may have been carried forward from the previous run.
+    if exitstatus == pytest.ExitCode.NO_TESTS_COLLECTED and session.config.getoption("testgen_select"):
+        session.exitstatus = pytest.ExitCode.OK
+
+
+def _append_event(event) -> None:
+    path = _config.getoption("testgen_events_file")
+    if path:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event) + "\n")
+
+
+def pytest_runtest_logstart(nodeid, location):
+    _append_event({"test": nodeid, "outcome": "started"})
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    timeout = item.config.getoption("testgen_test_timeout")
+    if not timeout or not hasattr(signal, "setitimer"):
+        yield
+        return
+
+    def on_timeout(signum, frame):
+        pytest.fail(f"Test exceeded the {timeout:g}s time limit.", pytrace=False)
+
+    previous = signal.signal(signal.SIGALRM, on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def pytest_runtest_logreport(report):
+    # One event per test: the call phase, or setup/teardown if that is where
+    # the test failed or was skipped.
+    if report.when != "call" and report.passed:
+        return
+    outcome = report.outcome
+    if report.when != "call" and report.failed:
+        outcome = "error"
+    event = {
+        "test": report.nodeid,
+        "outcome": outcome,
+        "duration": round(report.duration, 4),
+    }
+    if _config.getoption("testgen_stream"):
+        sys.stdout.write(f"\n{EVENT_MARKER}{json.dumps(event)}\n")
+        sys.stdout.flush()
+    _append_event(event)
@@ -0,0 +1,176 @@
+import multiprocessing
+import os
+import queue
+import sys
+import tempfile
+import threading
+from typing import List, Optional, Tuple
+
+from .limits import RunLimits, Watchdog, read_capped
+
+
+def _warm_up() -> None:
+    """
+    Runs one throwaway pytest --cov session in a scratch directory so that
+    pytest, its plugins, coverage and the XML reporter are all imported and
+    initialised before the first real job is forked off.
+    """
+    import pytest
+    with tempfile.TemporaryDirectory() as scratch:
+        with open(os.path.join(scratch, "test_warmup.py"), "w", encoding="utf-8") as f:
+            f.write("def test_warmup():\n    assert True\n")
+        with open(os.devnull, "w") as devnull:
+            saved = os.dup(1), os.dup(2)
+            os.dup2(devnull.fileno(), 1)
+            os.dup2(devnull.fileno(), 2)
+            try:
+                pytest.main([
+                    scratch, "-q", "-p", "no:cacheprovider",
+                    f"--rootdir={scratch}", f"--cov={scratch}",
+                    f"--cov-report=xml:{os.path.join(scratch, 'coverage.xml')}"
+                ])
+            except Exception:
+                pass
+            finally:
+                os.dup2(saved[0], 1)
+                os.dup2(saved[1], 2)
+                os.close(saved[0])
+                os.close(saved[1])
+
+
+def _run_forked(args: List[str], cwd: str, limits: Optional[RunLimits] = None) -> Tuple[int, bytes, bool]:
+    """
+    Forks a child of the warm worker, runs pytest.main in it and returns the
+    exit code, combined stdout/stderr (capped) and whether the run was
+    killed for exceeding its wall-clock limit. The child starts from the
+    warm, untouched worker state and exits afterwards, so nothing imported
+    or patched by one test run leaks into the next. It leads its own
+    process group, which is killed as a whole on timeout.
+    """
+    limits = limits or RunLimits()
+    with tempfile.TemporaryFile() as output:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.setsid()
+                limits.apply()
+                os.chdir(cwd)
+                os.dup2(output.fileno(), 1)
+                os.dup2(output.fileno(), 2)
+                sys.path.insert(0, cwd)
+                import pytest
+                code = pytest.main(args)
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(int(code))
+            except BaseException:
+                os._exit(70)
+        watchdog = Watchdog(pid, limits.run_timeout)
+        try:
+            _, status = os.waitpid(pid, 0)
+        finally:
+            watchdog.cancel()
+        output.seek(0)
+        return os.waitstatus_to_exitcode(status), read_capped(output, limits.output_bytes), watchdog.fired
+
+
+def _serve(conn) -> None:
+    """Warm worker loop: receives (args, cwd, limits) jobs and answers (returncode, output, timed_out)."""
+    _warm_up()
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        args, cwd, limits = job
+        try:
+            conn.send(_run_forked(args, cwd, limits))
+        except Exception as e:
+            conn.send((70, f"Warm pytest worker failed: {e}".encode("utf-8"), False))
+
+
+class PytestForkServer:
+    """
+    Pool of pre-warmed processes with pytest and coverage already imported.
+    Each job is executed in a fresh fork of one of them, which skips the
+    interpreter start-up and import cost of `python -m pytest`.
+    """
+
+    def __init__(self, size: int = 2):
+        self.size = max(1, size)
+        self._idle: "queue.Queue" = queue.Queue()
+        self._processes = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def supported() -> bool:
+        return hasattr(os, "fork")
+
+    @property
+    def started(self) -> bool:
+        return bool(self._processes)
+
+    def _spawn_worker(self):
+        # Workers are started with "spawn" so they do not inherit the threads
+        # of the server process; forking happens only inside the workers.
+        ctx = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=_serve, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        return process, parent_conn
+
+    def start(self) -> None:
+        if not self.supported():
+            return
+        with self._lock:
+            if self._processes:
+                return
+            for _ in range(self.size):
+                process, conn = self._spawn_worker()
+                self._processes.append(process)
+                self._idle.put((process, conn))
+
+    def stop(self) -> None:
+        with self._lock:
+            processes, self._processes = self._processes, []
+        while True:
+            try:
+                _, conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
+
+    def run(self, args: List[str], cwd: str, limits: Optional[RunLimits] = None) -> Optional[Tuple[int, bytes, bool]]:
+        """
+        Runs `pytest <args>` in cwd on a warm worker under limits and returns
+        (returncode, output, timed_out). Returns None if the worker died, so
+        callers can fall back to a plain subprocess.
+        """
+        process, conn = self._idle.get()
+        try:
+            conn.send((args, cwd, limits))
+            result = conn.recv()
+        except (EOFError, OSError):
+            result = None
+            with self._lock:
+                if process in self._processes:
+                    self._processes.remove(process)
+                    process, conn = self._spawn_worker()
+                    self._processes.append(process)
+        self._idle.put((process, conn))
+        return result
+
+
+# Started by the app on startup (TESTGEN_PYTEST_POOL=0 disables it); the
+# runner falls back to `python -m pytest` whenever it is not running.
+pytest_pool = PytestForkServer(size=max(1, int(os.getenv("TESTGEN_PYTEST_POOL", "2"))))
@@ -0,0 +1,153 @@
+import contextvars
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from contextlib import contextmanager
+from dataclasses import asdict
+from functools import lru_cache
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .cache import TieredCache, cache_from_env, make_key
+from .limits import RunLimits, read_events
+from .metrics import CACHE_REQUESTS
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# Bump when the runners change what they put in a result, so old entries
+# are not served in the new format.
+RESULT_FORMAT = 1
+
+# Only finished runs are stored; errors and killed runs may be transient.
+CACHEABLE_STATUSES = ("Success", "Tests Failed")
+
+_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar("testgen_run_cache_bypass", default=False)
+
+
+@contextmanager
+def bypass_run_cache(bypass: bool = True) -> Iterator[None]:
+    """Runs started inside this block (and tasks/threads it spawns) skip the run cache."""
+    token = _bypass.set(bypass)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def run_cache_bypassed() -> bool:
+    """True inside bypass_run_cache: results of earlier runs must not be reused."""
+    return _bypass.get()
+
+
+def _sha256_file(path: Path) -> str:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return ""
+
+
+def _package_version(name: str) -> str:
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return "missing"
+
+
+@lru_cache(maxsize=None)
+def runner_version(language: str) -> str:
+    """Versions of everything that can change a run's outcome, for the cache key."""
+    if language == "python":
+        python = ".".join(map(str, sys.version_info[:3]))
+        tools = ", ".join(f"{name} {_package_version(name)}" for name in ("pytest", "pytest-cov", "coverage"))
+        return f"python {python}, {tools}"
+    try:
+        with open(PROJECT_ROOT / "node_modules" / "jest" / "package.json", encoding="utf-8") as f:
+            jest = json.load(f).get("version", "unknown")
+    except (OSError, ValueError):
+        jest = "missing"
+    try:
+        node = subprocess.run(["node", "--version"], capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        node = "missing"
+    return f"node {node}, jest {jest}"
+
+
+class RunCache:
+    """
+    Results of test runs keyed on the module source, the generated test
+    file, the runner versions and the run configuration. An entry holds the
+    result dict, the coverage files the run wrote (restored on a hit) and
+    its per-test events (for streaming callers on a hit). Bounded
+    like the other caches by TESTGEN_RUN_CACHE_* (see cache_from_env);
+    TESTGEN_RUN_CACHE=0 turns it off.
+    """
+
+    def __init__(self, store: Optional[TieredCache] = None):
+        self.store = store
+
+    @classmethod
+    def from_env(cls) -> "RunCache":
+        if os.getenv("TESTGEN_RUN_CACHE", "1") == "0":
+            return cls(None)
+        return cls(cache_from_env("TESTGEN_RUN_CACHE", PROJECT_ROOT / ".cache" / "runs"))
+
+    @property
+    def enabled(self) -> bool:
+        return self.store is not None and not run_cache_bypassed()
+
+    def key(
+        self,
+        language: str,
+        module_name: str,
+        module_path: Path,
+        test_file_path: Path,
+        limits: RunLimits,
+        contexts: bool,
+        config_files: List[Path]
+    ) -> str:
+        return make_key(
+            "run", RESULT_FORMAT, language, module_name,
+            _sha256_file(module_path), _sha256_file(test_file_path),
+            runner_version(language), asdict(limits), contexts,
+            [_sha256_file(path) for path in config_files]
+        )
+
+    def get(self, key: str, files: Dict[str, Path]) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """
+        Returns the cached (result, test events) for key, or None. The stored
+        coverage files are written back to files[name].
+        """
+        raw = self.store.get(key)
+        CACHE_REQUESTS.inc(cache="runs", result="hit" if raw is not None else "miss")
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        for name, text in entry.get("files", {}).items():
+            if name in files:
+                files[name].parent.mkdir(parents=True, exist_ok=True)
+                files[name].write_text(text, encoding="utf-8")
+        result = entry["result"]
+        result["cached"] = True
+        return result, entry.get("events", [])
+
+    def set(self, key: str, result: Dict[str, Any], files: Dict[str, Path], events_path: Path) -> None:
+        """Stores a finished run: the result, the coverage files in files and its events."""
+        if result.get("status") not in CACHEABLE_STATUSES:
+            return
+        stored_files = {}
+        for name, path in files.items():
+            try:
+                stored_files[name] = path.read_text(encoding="utf-8")
+            except OSError:
+                continue
+        events, _ = read_events(events_path)
+        self.store.set(key, json.dumps({"result": result, "files": stored_files, "events": events}))
+
+    def stats(self) -> Dict[str, Any]:
+        return self.store.stats() if self.store is not None else {"enabled": False}
+
+
+run_cache = RunCache.from_env()
@@ -1,8 +1,33 @@
+import asyncio
+import json
+import os
+import shutil
 import subprocess
 import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import sys
 import xml.etree.ElementTree as ET
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .limits import (
+    EVENTS_FILE, CappedOutput, RunLimits, Watchdog, kill_group, kill_reason, partial_result, read_capped, read_events
+)
+from .metrics import span
+from .pytest_events import EVENT_MARKER
+from .pytest_pool import pytest_pool
+from .run_cache import run_cache, run_cache_bypassed
+from .selection import SelectionPlan, python_snapshot, selection_enabled
+from .sharding import count_python_tests, duration_store, shard_count
+from .workspace import SUPPORT_MANIFEST, Workspace, read_support_manifest
+
+PROJECT_ROOT = Path(__file__).parent.parent
+PYTEST_INI = PROJECT_ROOT / "pytest.ini"
+JUNIT_XML = "junit.xml"
+SHARDS_DIR = "shards"
+
+TestEventCallback = Callable[[Dict[str, Any]], None]
 
 def get_coverage_from_xml(xml_path: str) -> float:
     try:
@@ -15,55 +40,662 @@ def get_coverage_from_xml(xml_path: str) -> float:
     except (ET.ParseError, FileNotFoundError):
         return 0.0
 
-def run_tests_and_get_coverage(test_file_path: str, module_name: str) -> dict:
+def get_line_counts_from_xml(xml_path: str) -> dict:
+    """Returns {"covered": n, "total": n} from a Cobertura coverage.xml."""
     try:
-        project_root = Path(__file__).parent.parent
-        coverage_xml_path = project_root / "coverage.xml"
-
-        command = [
-            sys.executable,
-            "-m", "pytest",
-            test_file_path,
-            f"--cov={project_root / 'examples'}",
-            f"--cov-report=xml:{coverage_xml_path}"
-        ]
+        root = ET.parse(xml_path).getroot()
+        return {
+            "covered": int(root.get("lines-covered", 0)),
+            "total": int(root.get("lines-valid", 0))
+        }
+    except (ET.ParseError, FileNotFoundError, ValueError):
+        return {"covered": 0, "total": 0}
 
-        # --- FIX: Handle Windows-specific encoding ---
-        # Run the process and attempt to decode output, with a fallback for Windows
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            check=True,  # We'll handle the exception below
-            cwd=project_root
-        )
-        try:
-            output = result.stdout.decode('utf-8')
-        except UnicodeDecodeError:
-            output = result.stdout.decode('cp1252') # Fallback for Windows console
+def get_missing_lines_from_xml(xml_path: str) -> Dict[str, list]:
+    """Returns {filename: [line numbers no test executed]} from a Cobertura coverage.xml."""
+    try:
+        root = ET.parse(xml_path).getroot()
+    except (ET.ParseError, FileNotFoundError):
+        return {}
+    missing: Dict[str, list] = {}
+    for cls in root.iter("class"):
+        lines = [int(line.get("number")) for line in cls.iter("line") if line.get("hits") == "0"]
+        if lines:
+            missing.setdefault(cls.get("filename", ""), []).extend(lines)
+    return {filename: sorted(set(lines)) for filename, lines in missing.items()}
 
-        passed_match = re.search(r"(\d+)\s+passed", output)
-        summary = f"{passed_match.group(1) if passed_match else '0'} tests passed."
-        coverage_pct = get_coverage_from_xml(str(coverage_xml_path))
+def get_test_contexts(data_file: Path, junit_path: Path) -> Tuple[Dict[str, list], Dict[str, float]]:
+    """
+    Reads what each test covered from a run with --cov-context=test and
+    --cov-branch, and how long each test took from its JUnit XML. Returns
+    ({test name: ["file:line" and "file:from>to" arcs]}, {test name: seconds}).
+    """
+    durations: Dict[str, float] = {}
+    try:
+        for case in ET.parse(junit_path).getroot().iter("testcase"):
+            durations[case.get("name", "")] = float(case.get("time", 0) or 0)
+    except (ET.ParseError, FileNotFoundError, ValueError):
+        pass
 
-        return {
-            "status": "Success",
-            "summary": summary,
-            "coverage_percentage": coverage_pct,
-            "full_log": output
-        }
+    contexts: Dict[str, list] = {}
+    if not data_file.exists():
+        return contexts, durations
+    from coverage import CoverageData
+    data = CoverageData(basename=str(data_file))
+    data.read()
+    for context in data.measured_contexts():
+        # "test_x.py::test_mod_3|run": setup/run/teardown phases of one test.
+        test_name = context.split("::")[-1].split("|")[0]
+        if not test_name:
+            continue
+        data.set_query_contexts([f"^{re.escape(context)}$"])
+        elements = contexts.setdefault(test_name, [])
+        for file_path in data.measured_files():
+            name = Path(file_path).name
+            elements.extend(f"{name}:{line}" for line in data.lines(file_path) or [])
+            elements.extend(f"{name}:{start}>{end}" for start, end in data.arcs(file_path) or [])
+    data.set_query_contexts(None)
+    return {name: sorted(set(elements)) for name, elements in contexts.items()}, durations
 
-    except subprocess.CalledProcessError as e:
-        stdout = (e.stdout or b"").decode('utf-8', errors='ignore')
-        stderr = (e.stderr or b"").decode('utf-8', errors='ignore')
-        return {
+def get_test_outcomes(junit_path: Path) -> Dict[str, str]:
+    """{test name: "passed", "failed", "error" or "skipped"} from a run's JUnit XML."""
+    outcomes: Dict[str, str] = {}
+    try:
+        for case in ET.parse(junit_path).getroot().iter("testcase"):
+            outcome = "passed"
+            for tag in ("failure", "error", "skipped"):
+                if case.find(tag) is not None:
+                    outcome = "failed" if tag == "failure" else tag
+                    break
+            outcomes[case.get("name", "")] = outcome
+    except (ET.ParseError, FileNotFoundError):
+        pass
+    return outcomes
+
+def _decode_output(raw: bytes) -> str:
+    # --- FIX: Handle Windows-specific encoding ---
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw.decode('cp1252') # Fallback for Windows console
+
+def _build_command(test_file_path: str, cov_source: Path, coverage_xml_path: Path) -> list:
+    return [
+        sys.executable,
+        "-m", "pytest",
+        test_file_path,
+        f"--cov={cov_source}",
+        f"--cov-report=xml:{coverage_xml_path}"
+    ]
+
+def _cov_source(workspace: Optional[Workspace]) -> Path:
+    return workspace.examples_dir if workspace is not None else PROJECT_ROOT / "examples"
+
+def _prepare_run(
+    test_file_path: str,
+    workspace: Optional[Workspace],
+    limits: RunLimits,
+    contexts: bool = False
+) -> Tuple[Path, Path, list]:
+    """
+    Returns (cwd, coverage_xml_path, command). With a workspace, pytest runs
+    inside it, coverage is limited to the uploaded module and every output
+    file stays in the workspace; the project's pytest.ini still applies.
+    The app.pytest_events plugin enforces limits.test_timeout and records
+    each test in an events file next to coverage.xml. With contexts,
+    coverage is also recorded per test (with branches) and per-test
+    durations go to a JUnit XML file there too.
+    """
+    if workspace is None:
+        cwd = Path(__file__).parent.parent
+        coverage_xml_path = cwd / "coverage.xml"
+        command = _build_command(test_file_path, _cov_source(workspace), coverage_xml_path)
+    else:
+        cwd, coverage_xml_path = workspace.root, workspace.coverage_xml
+        command = _build_command(test_file_path, _cov_source(workspace), workspace.coverage_xml)
+        command += ["-c", str(PYTEST_INI), f"--rootdir={workspace.root}"]
+    events_path = cwd / EVENTS_FILE
+    events_path.unlink(missing_ok=True)
+    command += [
+        "-p", "app.pytest_events",
+        f"--testgen-events-file={events_path}",
+        f"--testgen-test-timeout={limits.test_timeout}"
+    ]
+    if contexts:
+        command += ["--cov-context=test", "--cov-branch", f"--junitxml={cwd / JUNIT_XML}"]
+    return cwd, coverage_xml_path, command
+
+def _build_result(
+    returncode: int,
+    stdout: bytes,
+    stderr: bytes,
+    coverage_xml_path: Path,
+    contexts: bool = False,
+    timed_out: bool = False
+) -> dict:
+    """
+    Turns a finished pytest process into the runner's result dict. A run
+    that was killed (timeout, CPU limit, signal) gets partial_result.
+    """
+    reason = kill_reason(returncode, timed_out)
+    if reason is not None:
+        output = (stdout or b"").decode('utf-8', errors='ignore') + (stderr or b"").decode('utf-8', errors='ignore')
+        return partial_result(reason, coverage_xml_path.parent / EVENTS_FILE, output)
+    with span("run.coverage_xml"):
+        result = _collect_result(returncode, stdout, stderr, coverage_xml_path)
+    if contexts and "coverage_percentage" in result:
+        with span("run.test_contexts"):
+            run_dir = coverage_xml_path.parent
+            result["test_coverage"], result["test_durations"] = get_test_contexts(
+                run_dir / ".coverage", run_dir / JUNIT_XML
+            )
+            result["test_outcomes"] = get_test_outcomes(run_dir / JUNIT_XML)
+    return result
+
+def _collect_result(returncode: int, stdout: bytes, stderr: bytes, coverage_xml_path: Path) -> dict:
+    if returncode != 0:
+        result = {
             "status": "Tests Failed",
             "summary": "Pytest execution failed.",
             "error": "Pytest process returned a non-zero exit code.",
-            "full_log": stdout + stderr
+            "full_log": (stdout or b"").decode('utf-8', errors='ignore') + (stderr or b"").decode('utf-8', errors='ignore')
         }
+        # Coverage is still written when some tests fail; keep it.
+        if coverage_xml_path.exists():
+            result["coverage_percentage"] = get_coverage_from_xml(str(coverage_xml_path))
+            result["lines"] = get_line_counts_from_xml(str(coverage_xml_path))
+            result["missing_lines"] = get_missing_lines_from_xml(str(coverage_xml_path))
+        return result
+
+    output = _decode_output(stdout)
+    passed_match = re.search(r"(\d+)\s+passed", output)
+    summary = f"{passed_match.group(1) if passed_match else '0'} tests passed."
+    coverage_pct = get_coverage_from_xml(str(coverage_xml_path))
+
+    return {
+        "status": "Success",
+        "summary": summary,
+        "coverage_percentage": coverage_pct,
+        "lines": get_line_counts_from_xml(str(coverage_xml_path)),
+        "missing_lines": get_missing_lines_from_xml(str(coverage_xml_path)),
+        "full_log": output
+    }
+
+def _unexpected_error(e: Exception) -> dict:
+    return {
+        "status": "Error",
+        "summary": "An unexpected error occurred during test execution.",
+        "error": str(e)
+    }
+
+def _child_env() -> Dict[str, str]:
+    # pytest runs inside the workspace; app.pytest_events must stay importable.
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get("PYTHONPATH")]))
+    return env
+
+def _run_on_pool(command: list, cwd: Path, coverage_xml_path: Path, limits: RunLimits, contexts: bool = False):
+    """Runs the pytest part of command on a warm worker; None if that is not possible."""
+    if not pytest_pool.started:
+        return None
+    with span("run.pytest.pool"):
+        result = pytest_pool.run(command[3:], str(cwd), limits)
+    if result is None:
+        return None
+    returncode, output, timed_out = result
+    return _build_result(returncode, output, b"", coverage_xml_path, contexts, timed_out)
+
+async def read_test_events(stream: asyncio.StreamReader, on_test: TestEventCallback, limit: int = 0) -> bytes:
+    """
+    Reads a runner's stdout to the end, calling on_test for every per-test
+    event line as it arrives. Returns the output with the event lines
+    removed, capped at limit bytes (0: no cap; see CappedOutput).
+    """
+    marker = EVENT_MARKER.encode("utf-8")
+    output = CappedOutput(limit)
+    buffer = b""
+    while True:
+        chunk = await stream.read(65536)
+        if chunk:
+            buffer += chunk
+        lines = buffer.split(b"\n")
+        # Keep a trailing partial line for the next chunk, unless at EOF.
+        buffer = lines.pop() if chunk else b""
+        for line in lines:
+            position = line.find(marker)
+            if position < 0:
+                output.write(line + b"\n")
+                continue
+            if position > 0:
+                output.write(line[:position])
+            try:
+                on_test(json.loads(line[position + len(marker):]))
+            except ValueError:
+                pass
+        if not chunk:
+            return output.getvalue()
+
+async def read_capped_async(stream: asyncio.StreamReader, limit: int) -> bytes:
+    """Async counterpart of limits.read_capped."""
+    output = CappedOutput(limit)
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            return output.getvalue()
+        output.write(chunk)
+
+async def _exec_async(
+    command: list,
+    cwd: Path,
+    limits: RunLimits,
+    on_test: Optional[TestEventCallback] = None,
+    env: Optional[Dict[str, str]] = None
+) -> Tuple[Optional[int], bytes, bytes, bool]:
+    """
+    Runs pytest as an asyncio subprocess in its own process group, under
+    limits, and returns (returncode, stdout, stderr, timed_out). With
+    on_test, the events plugin also streams each test's outcome on stdout
+    and they are forwarded as they arrive. The group is killed when the run
+    times out or the awaiting task is cancelled.
+    """
+    if on_test is not None:
+        command = command + ["--testgen-stream"]
+    with span("run.pytest.spawn"):
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            env=env or _child_env(),
+            start_new_session=True,
+            preexec_fn=limits.preexec()
+        )
+    watchdog = Watchdog(process.pid, limits.run_timeout)
+    try:
+        with span("run.pytest.execute"):
+            if on_test is not None:
+                read_stdout = read_test_events(process.stdout, on_test, limits.output_bytes)
+            else:
+                read_stdout = read_capped_async(process.stdout, limits.output_bytes)
+            stdout, stderr = await asyncio.gather(
+                read_stdout,
+                read_capped_async(process.stderr, limits.output_bytes)
+            )
+            await process.wait()
+    finally:
+        watchdog.cancel()
+        if process.returncode is None:
+            kill_group(process.pid)
+    return process.returncode, stdout, stderr, watchdog.fired
+
+async def _run_subprocess_async(
+    command: list,
+    cwd: Path,
+    coverage_xml_path: Path,
+    limits: RunLimits,
+    on_test: Optional[TestEventCallback] = None,
+    contexts: bool = False
+) -> dict:
+    """Runs pytest with _exec_async and builds the result."""
+    returncode, stdout, stderr, timed_out = await _exec_async(command, cwd, limits, on_test)
+    return _build_result(returncode, stdout, stderr, coverage_xml_path, contexts, timed_out)
+
+def _exec_sync(command: list, cwd: Path, limits: RunLimits, env: Optional[Dict[str, str]] = None) -> Tuple[int, bytes, bool]:
+    """Runs pytest in its own process group under limits; returns (returncode, output, timed_out)."""
+    with span("run.pytest.spawn"):
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=cwd,
+            env=env or _child_env(),
+            start_new_session=True,
+            preexec_fn=limits.preexec()
+        )
+    watchdog = Watchdog(process.pid, limits.run_timeout)
+    try:
+        with span("run.pytest.execute"):
+            output = read_capped(process.stdout, limits.output_bytes)
+            process.wait()
+    finally:
+        watchdog.cancel()
+    return process.returncode, output, watchdog.fired
+
+def _shard_commands(
+    command: list,
+    cwd: Path,
+    test_file_path: str,
+    shards: int,
+    contexts: bool
+) -> List[Tuple[list, Dict[str, str]]]:
+    """
+    (command, env) of every shard. All shards collect the whole file and
+    keep their part (app.pytest_events --testgen-shard), balanced by the
+    durations of earlier runs. Each writes its coverage data (and JUnit
+    XML) to its own directory; _combine_shards merges them.
+    """
+    shards_dir = cwd / SHARDS_DIR
+    shutil.rmtree(shards_dir, ignore_errors=True)
+    shards_dir.mkdir()
+    durations_path = shards_dir / "durations.json"
+    durations = duration_store.get("python", Path(test_file_path).read_text(encoding="utf-8"))
+    durations_path.write_text(json.dumps(durations), encoding="utf-8")
+
+    base = [arg for arg in command if not arg.startswith(("--cov-report=", "--junitxml="))]
+    commands = []
+    for index in range(shards):
+        shard_dir = shards_dir / str(index)
+        shard_dir.mkdir()
+        shard_command = base + [
+            "--cov-report=", f"--testgen-shard={index}/{shards}", f"--testgen-durations={durations_path}"
+        ]
+        if contexts:
+            shard_command.append(f"--junitxml={shard_dir / JUNIT_XML}")
+        env = _child_env()
+        env["COVERAGE_FILE"] = str(shard_dir / ".coverage")
+        commands.append((shard_command, env))
+    return commands
+
+def _combine_shards(cwd: Path, coverage_xml_path: Path, cov_source: Path, shards: int, contexts: bool) -> None:
+    """
+    coverage combine of the shards' data into <cwd>/.coverage and the XML
+    report from it, as a single run would have written them, plus the
+    shards' JUnit XML merged into one file.
+    """
+    from coverage import Coverage
+    from coverage.exceptions import CoverageException
+
+    shards_dir = cwd / SHARDS_DIR
+    data_file = cwd / ".coverage"
+    data_file.unlink(missing_ok=True)
+    coverage_xml_path.unlink(missing_ok=True)
+    shard_data = [str(shards_dir / str(i) / ".coverage") for i in range(shards) if (shards_dir / str(i) / ".coverage").exists()]
+    if shard_data:
+        cov = Coverage(data_file=str(data_file), source=[str(cov_source)], branch=contexts, config_file=False)
+        cov.combine(shard_data, keep=True)
+        cov.save()
+        try:
+            cov.xml_report(outfile=str(coverage_xml_path))
+        except CoverageException:
+            pass
+
+    if contexts:
+        suite = ET.Element("testsuite", name="pytest")
+        for i in range(shards):
+            try:
+                suite.extend(ET.parse(shards_dir / str(i) / JUNIT_XML).getroot().iter("testcase"))
+            except (ET.ParseError, FileNotFoundError):
+                continue
+        root = ET.Element("testsuites")
+        root.append(suite)
+        ET.ElementTree(root).write(cwd / JUNIT_XML, encoding="utf-8", xml_declaration=True)
+
+def _sharded_result(
+    runs: List[Tuple[Optional[int], bytes, bool]],
+    cwd: Path,
+    coverage_xml_path: Path,
+    cov_source: Path,
+    contexts: bool
+) -> dict:
+    """
+    Merges the shards' runs into one result: failed if any shard failed,
+    partial if any was killed, with combined coverage and the summed count
+    of passed tests.
+    """
+    shards = len(runs)
+    output = b"".join(
+        f"\n===== shard {index + 1}/{shards} =====\n".encode("utf-8") + run_output
+        for index, (_, run_output, _) in enumerate(runs)
+    )
+    try:
+        killed = next(((code, fired) for code, _, fired in runs if kill_reason(code, fired)), None)
+        if killed is not None:
+            return _build_result(killed[0], output, b"", coverage_xml_path, contexts, killed[1])
+
+        with span("run.shards.combine"):
+            _combine_shards(cwd, coverage_xml_path, cov_source, shards, contexts)
+        # Exit code 5: a shard that got no tests.
+        returncode = next((code for code, _, _ in runs if code not in (0, 5)), 0)
+        result = _build_result(returncode, output, b"", coverage_xml_path, contexts)
+        if result["status"] == "Success":
+            passed = sum(
+                int(counts[-1]) for _, run_output, _ in runs
+                for counts in [re.findall(rb"(\d+)\s+passed", run_output)] if counts
+            )
+            result["summary"] = f"{passed} tests passed."
+        result["shards"] = shards
+        return result
+    finally:
+        shutil.rmtree(cwd / SHARDS_DIR, ignore_errors=True)
+
+def _run_sharded_sync(
+    command: list,
+    cwd: Path,
+    coverage_xml_path: Path,
+    cov_source: Path,
+    test_file_path: str,
+    shards: int,
+    limits: RunLimits,
+    contexts: bool
+) -> dict:
+    commands = _shard_commands(command, cwd, test_file_path, shards, contexts)
+    with ThreadPoolExecutor(max_workers=shards, thread_name_prefix="testgen-shard") as executor:
+        runs = list(executor.map(lambda item: _exec_sync(item[0], cwd, limits, item[1]), commands))
+    return _sharded_result(runs, cwd, coverage_xml_path, cov_source, contexts)
+
+async def _run_sharded_async(
+    command: list,
+    cwd: Path,
+    coverage_xml_path: Path,
+    cov_source: Path,
+    test_file_path: str,
+    shards: int,
+    limits: RunLimits,
+    on_test: Optional[TestEventCallback],
+    contexts: bool
+) -> dict:
+    commands = await asyncio.to_thread(_shard_commands, command, cwd, test_file_path, shards, contexts)
+    runs = await asyncio.gather(*[
+        _exec_async(shard_command, cwd, limits, on_test, env) for shard_command, env in commands
+    ])
+    runs = [(code, stdout + stderr, fired) for code, stdout, stderr, fired in runs]
+    return await asyncio.to_thread(_sharded_result, runs, cwd, coverage_xml_path, cov_source, contexts)
+
+def _record_durations(test_file_path: str, cwd: Path) -> None:
+    duration_store.update("python", Path(test_file_path).read_text(encoding="utf-8"), read_events(cwd / EVENTS_FILE)[0])
+
+def _cache_key(
+    test_file_path: str,
+    module_name: str,
+    workspace: Optional[Workspace],
+    limits: RunLimits,
+    contexts: bool,
+    use_cache: bool
+) -> Optional[str]:
+    """The run cache key of this run, or None if the cache is off or bypassed."""
+    if not use_cache or not run_cache.enabled:
+        return None
+    root = workspace.root if workspace is not None else PROJECT_ROOT
+    return run_cache.key(
+        "python", module_name, _cov_source(workspace) / f"{module_name}.py", Path(test_file_path),
+        limits, contexts, [PYTEST_INI, root / SUPPORT_MANIFEST]
+    )
+
+def _plan_selection(
+    test_file_path: str,
+    module_name: str,
+    workspace: Optional[Workspace],
+    use_cache: bool
+) -> Optional[SelectionPlan]:
+    """
+    The tests to run after the module changed (see app.selection), or None
+    if selection is off. Without use_cache, or with the run cache bypassed,
+    every test runs and the run is only recorded.
+    """
+    if not selection_enabled():
+        return None
+    module_path = _cov_source(workspace) / f"{module_name}.py"
+    try:
+        snapshot = python_snapshot(
+            module_path.read_text(encoding="utf-8"), Path(test_file_path).read_text(encoding="utf-8"),
+            read_support_manifest(workspace.root) if workspace is not None else ""
+        )
+    except (OSError, SyntaxError, ValueError):
+        return None
+    return SelectionPlan("python", module_name, snapshot, carry=use_cache and not run_cache_bypassed())
+
+def _select(command: list, cwd: Path, selection: Optional[SelectionPlan]) -> list:
+    path = selection.write(cwd) if selection is not None else None
+    return command + [f"--testgen-select={path}"] if path is not None else command
+
+def _finish_selection(
+    selection: Optional[SelectionPlan],
+    result: dict,
+    module_name: str,
+    cwd: Path,
+    contexts: bool
+) -> dict:
+    if selection is None:
+        return result
+    file_name = f"{module_name}.py"
+    elements = {}
+    for case, items in (result.get("test_coverage") or {}).items():
+        elements[case] = [
+            tuple(int(number) for number in item.rpartition(":")[2].split(">"))
+            for item in items if item.rpartition(":")[0] == file_name
+        ]
+    return selection.finish(
+        result, elements, read_events(cwd / EVENTS_FILE)[0],
+        lambda test: test.split("::")[-1],
+        lambda element: f"{file_name}:" + ">".join(map(str, element)),
+        contexts
+    )
+
+def _run_sync(command: list, cwd: Path, coverage_xml_path: Path, limits: RunLimits, contexts: bool) -> dict:
+    pooled = _run_on_pool(command, cwd, coverage_xml_path, limits, contexts)
+    if pooled is not None:
+        return pooled
+    returncode, output, timed_out = _exec_sync(command, cwd, limits)
+    return _build_result(returncode, output, b"", coverage_xml_path, contexts, timed_out)
+
+def run_tests_and_get_coverage(
+    test_file_path: str,
+    module_name: str,
+    workspace: Optional[Workspace] = None,
+    contexts: bool = False,
+    limits: Optional[RunLimits] = None,
+    use_cache: bool = True,
+    shards: Optional[int] = None
+) -> dict:
+    """
+    Runs pytest with coverage and returns a parsed report. With contexts it
+    also holds "test_coverage" and "test_durations" (see get_test_contexts)
+    and "test_outcomes" (see get_test_outcomes).
+    limits (default: RunLimits.from_env()) bounds the run; a run that hits
+    one returns the tests that finished before it was killed.
+
+    The same module and test file under the same runner and configuration
+    are served from the run cache (marked "cached": true) unless use_cache
+    is False or the cache is bypassed.
+
+    A large suite is split into shards (see sharding.shard_count, or pass
+    shards) that run in parallel processes; their results and coverage
+    are merged into the same result dict, with "shards" set.
+
+    After a change to the module, only the tests it can affect run; the
+    others are carried forward from the previous run (see app.selection),
+    and "selection" lists what ran.
+    """
+    try:
+        limits = limits or RunLimits.from_env()
+        key = _cache_key(test_file_path, module_name, workspace, limits, contexts, use_cache)
+        selection = _plan_selection(test_file_path, module_name, workspace, use_cache)
+        # Selection needs each run's per-test coverage.
+        run_contexts = contexts or selection is not None
+        cwd, coverage_xml_path, command = _prepare_run(test_file_path, workspace, limits, run_contexts)
+        coverage_files = {"coverage.xml": coverage_xml_path}
+
+        if key is not None:
+            cached = run_cache.get(key, coverage_files)
+            if cached is not None:
+                return cached[0]
+
+        command = _select(command, cwd, selection)
+        if shards is None:
+            tests = count_python_tests(Path(test_file_path))
+            shards = shard_count(selection.tests(tests) if selection is not None else tests)
+        if shards > 1:
+            result = _run_sharded_sync(
+                command, cwd, coverage_xml_path, _cov_source(workspace), test_file_path, shards, limits, run_contexts
+            )
+        else:
+            result = _run_sync(command, cwd, coverage_xml_path, limits, run_contexts)
+        _record_durations(test_file_path, cwd)
+        result = _finish_selection(selection, result, module_name, cwd, contexts)
+        if key is not None:
+            run_cache.set(key, result, coverage_files, cwd / EVENTS_FILE)
+        return result
+
     except Exception as e:
-        return {
-            "status": "Error",
-            "summary": "An unexpected error occurred during test execution.",
-            "error": str(e)
-        }
\ No newline at end of file
+        return _unexpected_error(e)
+
+async def run_tests_and_get_coverage_async(
+    test_file_path: str,
+    module_name: str,
+    workspace: Optional[Workspace] = None,
+    on_test: Optional[TestEventCallback] = None,
+    contexts: bool = False,
+    limits: Optional[RunLimits] = None,
+    use_cache: bool = True,
+    shards: Optional[int] = None
+) -> dict:
+    """
+    Same as run_tests_and_get_coverage, but awaits pytest as an asyncio
+    subprocess so the event loop keeps serving other requests meanwhile.
+
+    If on_test is given it is called with {"test", "outcome", "duration"}
+    as each test finishes (on a cache hit, with the stored events). Such
+    runs bypass the warm pool, whose output is only available once the
+    whole session is over.
+    """
+    try:
+        limits = limits or RunLimits.from_env()
+        key = _cache_key(test_file_path, module_name, workspace, limits, contexts, use_cache)
+        selection = await asyncio.to_thread(_plan_selection, test_file_path, module_name, workspace, use_cache)
+        run_contexts = contexts or selection is not None
+        cwd, coverage_xml_path, command = _prepare_run(test_file_path, workspace, limits, run_contexts)
+        coverage_files = {"coverage.xml": coverage_xml_path}
+
+        if key is not None:
+            cached = await asyncio.to_thread(run_cache.get, key, coverage_files)
+            if cached is not None:
+                result, events = cached
+                if on_test is not None:
+                    for event in events:
+                        on_test(event)
+                return result
+
+        command = await asyncio.to_thread(_select, command, cwd, selection)
+        if shards is None:
+            tests = await asyncio.to_thread(count_python_tests, Path(test_file_path))
+            shards = shard_count(selection.tests(tests) if selection is not None else tests)
+        result = None
+        if shards > 1:
+            result = await _run_sharded_async(
+                command, cwd, coverage_xml_path, _cov_source(workspace), test_file_path, shards, limits, on_test, run_contexts
+            )
+        elif on_test is None and pytest_pool.started:
+            result = await asyncio.to_thread(_run_on_pool, command, cwd, coverage_xml_path, limits, run_contexts)
+        if result is None:
+            result = await _run_subprocess_async(command, cwd, coverage_xml_path, limits, on_test, run_contexts)
+        await asyncio.to_thread(_record_durations, test_file_path, cwd)
+        result = await asyncio.to_thread(_finish_selection, selection, result, module_name, cwd, contexts)
+        if on_test is not None and selection is not None:
+            for event in selection.carried_events():
+                on_test(event)
+        if key is not None:
+            await asyncio.to_thread(run_cache.set, key, result, coverage_files, cwd / EVENTS_FILE)
+        return result
+
+    except Exception as e:
+        return _unexpected_error(e)
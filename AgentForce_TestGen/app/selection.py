@@ -0,0 +1,465 @@
+"""
+Change-aware test selection.
+
+Every run records which lines of which module functions each generated test
+executed (from the per-test coverage contexts), keyed by a hash of the
+test's own source. When the module is uploaded again, its functions are
+diffed against the recorded ones by hash, and only the tests that are new,
+changed, failed last time or executed a changed function run again. The
+others carry their recorded outcome, duration and coverage forward; their
+lines are stored relative to the start of each function, so they still
+apply after unrelated edits move the function. Any change to module-level
+code or to the test file's imports and helpers reruns everything. Records
+are keyed on the module's content, not just its name, so an unrelated
+upload that shares the name never picks up another module's results.
+"""
+import ast
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .cache import TieredCache, cache_from_env, make_key
+from .parser import CodeParser
+from .sharding import split_describe_blocks
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+SELECTION_FILE = "selected_tests.json"
+
+# Only finished runs are recorded; errors and killed runs say nothing about the tests.
+RECORDED_STATUSES = ("Success", "Tests Failed")
+
+# A covered line or branch: (line,) or (from, to); negative numbers are
+# coverage.py's code object entries and exits.
+Element = Tuple[int, ...]
+
+_parser = CodeParser()
+
+
+def selection_enabled() -> bool:
+    return os.getenv("TESTGEN_TEST_SELECTION", "1") != "0"
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class Unit:
+    """
+    A test that can be selected on its own: a pytest function or table, or
+    a Jest describe block. cases are the names its results are reported
+    under, or None if they cannot be known before the run (never carried).
+    """
+    name: str
+    hash: str
+    cases: Optional[List[str]]
+
+
+@dataclass
+class Snapshot:
+    """What selection compares between runs: hashes of the module's functions, its other code and the tests."""
+    header: str
+    functions: Dict[str, str]
+    # name -> (first line, last line)
+    ranges: Dict[str, Tuple[int, int]]
+    test_header: str
+    units: List[Unit] = field(default_factory=list)
+    # Hash of the whole module source, the identity its record is stored under.
+    source: str = ""
+
+    def function_at(self, line: int) -> Optional[str]:
+        """The innermost function whose lines include line."""
+        best = None
+        for name, (start, end) in self.ranges.items():
+            if start <= line <= end and (best is None or start >= self.ranges[best][0]):
+                best = name
+        return best
+
+
+def _without_ranges(source: str, ranges: Iterable[Tuple[int, int]]) -> str:
+    """source without the given lines and without blank lines, so moving a function does not change it."""
+    skipped = {line for start, end in ranges for line in range(start, end + 1)}
+    return "\n".join(
+        text.strip() for number, text in enumerate(source.splitlines(), 1)
+        if number not in skipped and text.strip()
+    )
+
+
+def python_snapshot(module_source: str, test_source: str, support: str = "") -> Snapshot:
+    """support is the workspace's support file manifest; it counts as module-level code."""
+    module = _parser.parse_module(module_source)
+    ranges = {f.name: (f.lineno, f.end_lineno) for f in module.functions}
+    functions = {f.name: f.ast_hash for f in module.functions}
+
+    tree = ast.parse(test_source)
+    units = []
+    header = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test"):
+            units.append(_python_unit(node))
+        else:
+            header.append(ast.dump(node, annotate_fields=False))
+    return Snapshot(
+        _sha256(_python_header(ast.parse(module_source)) + support), functions, ranges, _sha256("\n".join(header)),
+        units, _sha256(module_source)
+    )
+
+
+def _python_header(tree: ast.Module) -> str:
+    """Hash of the module without its functions and methods (their hashes are compared one by one)."""
+    parts = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        if isinstance(node, ast.ClassDef):
+            node = ast.ClassDef(
+                name=node.name, bases=node.bases, keywords=node.keywords, decorator_list=node.decorator_list,
+                body=[item for item in node.body if not isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))]
+            )
+        parts.append(ast.dump(node, annotate_fields=False))
+    return _sha256("\n".join(parts))
+
+
+def _python_unit(node: ast.AST) -> Unit:
+    """
+    A test function, hashed without its name and parametrize ids: generated
+    tests are numbered, so the same test is renumbered when cases are added
+    before it. Its cases are known if it is not parametrized or its ids are
+    a range() or a list of constants.
+    """
+    cases: Optional[List[str]] = [node.name]
+    normalized = ast.parse(ast.unparse(node)).body[0]
+    normalized.name = "_"
+    for decorator in normalized.decorator_list:
+        if not (isinstance(decorator, ast.Call) and ast.unparse(decorator.func).endswith("parametrize")):
+            continue
+        ids = next((k for k in decorator.keywords if k.arg == "ids"), None)
+        decorator.keywords = [k for k in decorator.keywords if k.arg != "ids"]
+        cases = _parametrize_ids(node.name, ids.value if ids is not None else None)
+    return Unit(node.name, _sha256(ast.dump(normalized, annotate_fields=False)), cases)
+
+
+def _parametrize_ids(name: str, ids: Optional[ast.AST]) -> Optional[List[str]]:
+    try:
+        if isinstance(ids, ast.Call) and ast.unparse(ids.func) == "range":
+            values = [str(i) for i in range(*(ast.literal_eval(arg) for arg in ids.args))]
+        elif isinstance(ids, (ast.List, ast.Tuple)):
+            values = [str(ast.literal_eval(element)) for element in ids.elts]
+        else:
+            return None
+    except (ValueError, TypeError):
+        return None
+    return [f"{name}[{value}]" for value in values]
+
+
+_JS_TITLE = re.compile(r"""^\s+(?:it|test)\((['"])((?:\\.|(?!\1).)*)\1|^\s{4}\[(['"])((?:\\.|(?!\3).)*)\3""", re.MULTILINE)
+
+
+def _unescape(title: str) -> str:
+    return re.sub(r"\\(.)", r"\1", title)
+
+
+def js_snapshot(module_source: str, functions: List[Dict[str, Any]], test_source: str, support: str = "") -> Snapshot:
+    """JavaScript counterpart of python_snapshot, with the functions from js_parser."""
+    lines = module_source.splitlines()
+    ranges = {
+        f["name"]: (f["line"], f.get("endLine", f["line"]))
+        for f in functions if "line" in f
+    }
+    hashes = {
+        name: _sha256("\n".join(text.strip() for text in lines[start - 1:end]))
+        for name, (start, end) in ranges.items()
+    }
+
+    header, blocks = split_describe_blocks(test_source)
+    units = []
+    for name, block in blocks:
+        titles = [match.group(2) if match.group(2) is not None else match.group(4) for match in _JS_TITLE.finditer(block)]
+        cases = [f"{name} {_unescape(title)}" for title in titles]
+        # A title with a format placeholder is only known after the run.
+        units.append(Unit(name, _sha256(block), None if any("%" in case for case in cases) else cases))
+    return Snapshot(
+        _sha256(_without_ranges(module_source, ranges.values()) + support), hashes, ranges, _sha256(header), units,
+        _sha256(module_source)
+    )
+
+
+class ImpactStore:
+    """
+    Recorded runs per language: function hashes and, per test (by hash),
+    its outcome and what each of its cases covered. A record is stored
+    under the hash of the exact module source it was made from and checked
+    against it on read; an index per module name lists the last max_records
+    sources, and best picks the one a new upload is most likely an edit of.
+    Bounded like the other caches by TESTGEN_IMPACT_CACHE_* (see
+    cache_from_env).
+    """
+
+    def __init__(self, store: Optional[TieredCache] = None, max_records: int = 8):
+        self.store = store
+        self.max_records = max(1, max_records)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ImpactStore":
+        return cls(
+            cache_from_env("TESTGEN_IMPACT_CACHE", PROJECT_ROOT / ".cache" / "impact"),
+            int(os.getenv("TESTGEN_IMPACT_RECORDS", "8"))
+        )
+
+    def _key(self, language: str, module_name: str, source: str) -> str:
+        return make_key("impact", language, module_name, source)
+
+    def _index_key(self, language: str, module_name: str) -> str:
+        return make_key("impact-index", language, module_name)
+
+    def _load(self, key: str) -> Any:
+        raw = self.store.get(key) if self.store is not None else None
+        return json.loads(raw) if raw is not None else None
+
+    def get(self, language: str, module_name: str, source: str) -> Optional[Dict[str, Any]]:
+        """The record of the module whose source hashes to source, if there is one."""
+        record = self._load(self._key(language, module_name, source))
+        if record is None or record.get("module") != module_name or record.get("source") != source:
+            return None
+        return record
+
+    def best(self, language: str, module_name: str, snapshot: Snapshot) -> Optional[Dict[str, Any]]:
+        """
+        The recorded version of the module that snapshot can reuse results
+        from: same module-level code and test header, and the most function
+        hashes in common (the latest wins ties). A record sharing no
+        function with snapshot is another module of the same name.
+        """
+        best, best_score = None, 0
+        for source in self._load(self._index_key(language, module_name)) or []:
+            record = self.get(language, module_name, source)
+            if record is None or record["header"] != snapshot.header or record["test_header"] != snapshot.test_header:
+                continue
+            score = sum(1 for name, digest in snapshot.functions.items() if record["functions"].get(name) == digest)
+            if score > best_score or (best is None and not snapshot.functions):
+                best, best_score = record, score
+        return best
+
+    def set(self, language: str, module_name: str, record: Dict[str, Any]) -> None:
+        """
+        Stores record (which names its module and source), merging the test
+        units of an earlier run of the same source and tests, so concurrent
+        runs of one module add to each other instead of the last one winning.
+        """
+        if self.store is None:
+            return
+        source = record["source"]
+        with self._lock:
+            earlier = self.get(language, module_name, source)
+            if earlier is not None and earlier["test_header"] == record["test_header"]:
+                record = {**record, "units": {**earlier["units"], **record["units"]}}
+            self.store.set(self._key(language, module_name, source), json.dumps(record))
+            index_key = self._index_key(language, module_name)
+            index = [known for known in self._load(index_key) or [] if known != source]
+            self.store.set(index_key, json.dumps(([source] + index)[:self.max_records]))
+
+
+impact_store = ImpactStore.from_env()
+
+
+class SelectionPlan:
+    """
+    The tests of one run that have to execute, given the previous record of
+    the module. selected is None when every test runs, which is always the
+    case without carry (the run must not reuse earlier results). finish
+    turns the run's result into the result of the whole suite and records
+    the run.
+    """
+
+    def __init__(
+        self,
+        language: str,
+        module_name: str,
+        snapshot: Snapshot,
+        carry: bool = True,
+        store: Optional[ImpactStore] = None
+    ):
+        self.language = language
+        self.module_name = module_name
+        self.snapshot = snapshot
+        self.store = store or impact_store
+        self.previous = self.store.best(language, module_name, snapshot) if carry else None
+        self.changed: List[str] = []
+        self.carried: Dict[str, Dict[str, Any]] = {}
+        self.selected: Optional[List[str]] = None
+        self._plan()
+
+    def _plan(self) -> None:
+        previous = self.previous
+        if previous is None or previous["header"] != self.snapshot.header or previous["test_header"] != self.snapshot.test_header:
+            return
+        functions = self.snapshot.functions
+        self.changed = sorted(
+            name for name in set(functions) | set(previous["functions"])
+            if functions.get(name) != previous["functions"].get(name)
+        )
+        changed = set(self.changed)
+        selected = []
+        for unit in self.snapshot.units:
+            recorded = previous["units"].get(unit.hash)
+            if (
+                recorded is not None and unit.cases is not None and recorded["outcome"] == "passed"
+                and len(recorded["cases"]) == len(unit.cases) and not changed & set(recorded["functions"])
+            ):
+                self.carried[unit.name] = recorded
+            else:
+                selected.append(unit.name)
+        if self.carried:
+            self.selected = selected
+
+    def tests(self, total: int) -> int:
+        """How many of total tests run."""
+        if self.selected is None:
+            return total
+        return total - sum(len(recorded["cases"]) for recorded in self.carried.values())
+
+    def carried_events(self) -> List[Dict[str, Any]]:
+        """Test events for the carried cases, as a streaming caller would have seen them."""
+        return [
+            {"test": case, "outcome": "passed", "duration": stored["duration"], "carried": True}
+            for unit in self.snapshot.units if unit.name in self.carried
+            for case, stored in zip(unit.cases, self.carried[unit.name]["cases"])
+        ]
+
+    def write(self, directory: Path) -> Optional[Path]:
+        """Writes the selected test names for the runner, or returns None if everything runs."""
+        if self.selected is None:
+            return None
+        path = directory / SELECTION_FILE
+        path.write_text(json.dumps(self.selected), encoding="utf-8")
+        return path
+
+    def _relative(self, element: Element) -> Optional[List[Any]]:
+        """element with each line as [function, offset from its first line, negative]."""
+        out = []
+        for number in element:
+            function = self.snapshot.function_at(abs(number))
+            if function is None:
+                return None
+            out.append([function, abs(number) - self.snapshot.ranges[function][0], number < 0])
+        return out
+
+    def _absolute(self, element: List[Any]) -> Element:
+        return tuple(
+            -(self.snapshot.ranges[function][0] + offset) if negative else self.snapshot.ranges[function][0] + offset
+            for function, offset, negative in element
+        )
+
+    def finish(
+        self,
+        result: Dict[str, Any],
+        elements: Dict[str, List[Element]],
+        events: List[Dict[str, Any]],
+        case_name: Callable[[str], str],
+        render: Callable[[Element], str],
+        contexts: bool
+    ) -> Dict[str, Any]:
+        """
+        Records this run and merges the carried tests into result: their
+        lines leave missing_lines and count as covered, their passes are
+        added to the summary and, with contexts, their per-test coverage and
+        durations are added too. elements holds what each case the run
+        executed covered in the module; case_name maps a reported test name
+        to its case name; render turns an element back into the runner's
+        per-test coverage format.
+        """
+        if result.get("status") not in RECORDED_STATUSES:
+            return self._strip(result, contexts)
+
+        outcomes: Dict[str, List[str]] = {}
+        durations: Dict[str, float] = dict(result.get("test_durations") or {})
+        for event in events:
+            name = case_name(str(event.get("test", "")))
+            outcomes.setdefault(name, []).append(event.get("outcome"))
+            if event.get("duration") is not None:
+                durations.setdefault(name, float(event["duration"]))
+
+        units: Dict[str, Any] = {}
+        for unit in self.snapshot.units:
+            if unit.name in self.carried:
+                units[unit.hash] = self.carried[unit.name]
+                continue
+            if unit.cases is None or not all(case in outcomes for case in unit.cases):
+                continue
+            cases = []
+            touched = set()
+            for case in unit.cases:
+                relative = [r for r in (self._relative(e) for e in elements.get(case, [])) if r is not None]
+                touched.update(function for r in relative for function, _, _ in r)
+                cases.append({"elements": relative, "duration": durations.get(case, 0.0)})
+            passed = all(outcome == "passed" for case in unit.cases for outcome in outcomes[case])
+            units[unit.hash] = {"outcome": "passed" if passed else "failed", "functions": sorted(touched), "cases": cases}
+        self.store.set(self.language, self.module_name, {
+            "module": self.module_name,
+            "source": self.snapshot.source,
+            "header": self.snapshot.header,
+            "test_header": self.snapshot.test_header,
+            "functions": self.snapshot.functions,
+            "units": units,
+        })
+
+        carried_cases = 0
+        carried_lines = set()
+        for unit in self.snapshot.units:
+            recorded = self.carried.get(unit.name)
+            if recorded is None:
+                continue
+            for case, stored in zip(unit.cases, recorded["cases"]):
+                carried_cases += 1
+                absolute = [self._absolute(element) for element in stored["elements"]]
+                carried_lines.update(element[0] for element in absolute if len(element) == 1 and element[0] > 0)
+                if contexts and "test_coverage" in result:
+                    result["test_coverage"][case] = sorted(render(element) for element in absolute)
+                    result.setdefault("test_durations", {})[case] = stored["duration"]
+                    result.setdefault("test_outcomes", {})[case] = "passed"
+        if carried_cases:
+            self._merge_coverage(result, carried_lines)
+            # "N tests passed." / "N tests passed out of M." (Jest counts the skipped ones in M).
+            result["summary"] = re.sub(
+                r"\d+", lambda m: str(int(m.group()) + carried_cases), result.get("summary", ""), count=1
+            )
+        if self.selected is not None:
+            result["selection"] = {
+                "changed_functions": self.changed,
+                "run_tests": sorted(self.selected),
+                "carried_tests": carried_cases,
+            }
+        return self._strip(result, contexts)
+
+    def _merge_coverage(self, result: Dict[str, Any], lines: set) -> None:
+        missing = result.get("missing_lines") or {}
+        newly_covered = 0
+        for file_name in list(missing):
+            if Path(file_name).stem != self.module_name:
+                continue
+            still_missing = [line for line in missing[file_name] if line not in lines]
+            newly_covered += len(missing[file_name]) - len(still_missing)
+            if still_missing:
+                missing[file_name] = still_missing
+            else:
+                del missing[file_name]
+        counts = result.get("lines")
+        if counts and counts.get("total"):
+            counts["covered"] = min(counts["total"], counts["covered"] + newly_covered)
+            result["coverage_percentage"] = round(counts["covered"] / counts["total"] * 100, 2)
+
+    @staticmethod
+    def _strip(result: Dict[str, Any], contexts: bool) -> Dict[str, Any]:
+        # Contexts were recorded for selection only; callers that did not ask keep the usual result.
+        if not contexts:
+            result.pop("test_coverage", None)
+            result.pop("test_durations", None)
+            result.pop("test_outcomes", None)
+        return result
@@ -0,0 +1,197 @@
+import ast
+import heapq
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .cache import TieredCache, cache_from_env, make_key
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (its affinity mask where the OS has one)."""
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 1
+
+
+def shard_count(tests: int) -> int:
+    """
+    How many shards to split a suite of this many tests into: up to
+    TESTGEN_SHARDS (default: the available CPUs), with at least
+    TESTGEN_SHARD_MIN_TESTS tests (default 50) per shard, so small suites
+    keep running in a single process.
+    """
+    shards = int(os.getenv("TESTGEN_SHARDS", "0")) or available_cpus()
+    min_tests = max(1, int(os.getenv("TESTGEN_SHARD_MIN_TESTS", "50")))
+    return max(1, min(shards, tests // min_tests))
+
+
+def balance(names: Sequence[str], durations: Dict[str, float], shards: int) -> List[List[str]]:
+    """
+    Longest-processing-time-first: names, slowest first, each go to the
+    shard with the least total duration so far. Tests without a recorded
+    duration count as the mean of the recorded ones. Within a shard the
+    original order is kept. The result only depends on the arguments, so
+    every shard process computes the same split.
+    """
+    known = [durations[name] for name in names if name in durations]
+    default = sum(known) / len(known) if known else 1.0
+    order = {name: index for index, name in enumerate(names)}
+    ranked = sorted(names, key=lambda name: (-durations.get(name, default), order[name]))
+    loads = [(0.0, shard) for shard in range(max(1, shards))]
+    assigned: List[List[str]] = [[] for _ in loads]
+    for name in ranked:
+        load, shard = heapq.heappop(loads)
+        assigned[shard].append(name)
+        heapq.heappush(loads, (load + durations.get(name, default), shard))
+    return [sorted(shard, key=order.__getitem__) for shard in assigned]
+
+
+def count_python_tests(test_file_path: Path) -> int:
+    """
+    Number of tests in a generated pytest file without collecting it: one
+    per test function, or one per row of a parametrize table.
+    """
+    try:
+        tree = ast.parse(Path(test_file_path).read_text(encoding="utf-8"))
+    except (OSError, SyntaxError, ValueError):
+        return 0
+    count = 0
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) or not node.name.startswith("test"):
+            continue
+        rows = 1
+        for decorator in node.decorator_list:
+            if isinstance(decorator, ast.Call) and ast.unparse(decorator.func).endswith("parametrize"):
+                values = decorator.args[1] if len(decorator.args) > 1 else None
+                if isinstance(values, (ast.List, ast.Tuple)):
+                    rows *= len(values.elts)
+        count += rows
+    return count
+
+
+# Top-level describe() blocks of a generated Jest file (see JSTestGenerator).
+_DESCRIBE = re.compile(r"^describe\(('|\")(.*?)\1", re.MULTILINE)
+_JS_TEST = re.compile(r"^\s+(?:it|test)\(|^\s{4}\[", re.MULTILINE)
+
+
+def split_describe_blocks(source: str) -> Tuple[str, List[Tuple[str, str]]]:
+    """
+    Splits a Jest file into its header (imports) and its top-level describe
+    blocks as (describe name, source) pairs. A file with no top-level
+    describe is all header.
+    """
+    starts = list(_DESCRIBE.finditer(source))
+    if not starts:
+        return source, []
+    blocks = []
+    for match, end in zip(starts, [m.start() for m in starts[1:]] + [len(source)]):
+        blocks.append((match.group(2), source[match.start():end]))
+    return source[:starts[0].start()], blocks
+
+
+def count_js_tests(source: str) -> int:
+    """Number of it()/test() cases and test.each rows in a generated Jest file."""
+    return len(_JS_TEST.findall(source))
+
+
+def js_shard_sources(source: str, durations: Dict[str, float], shards: int) -> List[str]:
+    """
+    The generated Jest file split into up to shards files of whole describe
+    blocks, balanced by the summed durations of each block's tests (Jest
+    full names start with the describe name). Each file repeats the header.
+    """
+    header, blocks = split_describe_blocks(source)
+    if shards <= 1 or len(blocks) <= 1:
+        return [source]
+    weights: Dict[str, float] = {}
+    for index, (name, _) in enumerate(blocks):
+        tests = [seconds for test, seconds in durations.items() if test.startswith(name + " ")]
+        if tests:
+            weights[str(index)] = sum(tests)
+    groups = balance([str(index) for index in range(len(blocks))], weights, shards)
+    return [header + "".join(blocks[int(index)][1] for index in group) for group in groups if group]
+
+
+def test_units(language: str, source: str) -> List[Tuple[str, str]]:
+    """
+    (name, hash of its source) of every unit of a generated test file that
+    is balanced as a whole: a pytest function or table, or a Jest describe
+    block.
+    """
+    if language == "javascript":
+        return [(name, make_key("js", block)) for name, block in split_describe_blocks(source)[1]]
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return []
+    return [
+        (node.name, make_key("python", ast.dump(node, annotate_fields=False)))
+        for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test")
+    ]
+
+
+def _in_unit(language: str, test: str, unit: str) -> bool:
+    """Whether test (a pytest name with its parametrize id, or a Jest full name) belongs to unit."""
+    if language == "javascript":
+        return test.startswith(unit + " ")
+    return test == unit or test.startswith(unit + "[")
+
+
+class DurationStore:
+    """
+    Last known duration of every generated test, fed by the events file of
+    each finished run and read to balance shards. Durations are stored per
+    test unit (see test_units) under the hash of its source, not under the
+    module name, so unrelated uploads that share a name never mix, and the
+    tests an edit leaves alone keep theirs. Bounded like the other caches
+    by TESTGEN_DURATION_CACHE_* (see cache_from_env).
+    """
+
+    def __init__(self, store: Optional[TieredCache] = None):
+        self.store = store
+
+    @classmethod
+    def from_env(cls) -> "DurationStore":
+        return cls(cache_from_env("TESTGEN_DURATION_CACHE", PROJECT_ROOT / ".cache" / "durations"))
+
+    def _key(self, language: str, unit_hash: str) -> str:
+        return make_key("durations", language, unit_hash)
+
+    def get(self, language: str, test_source: str) -> Dict[str, float]:
+        """{test name: seconds} for the tests of test_source that ran before."""
+        durations: Dict[str, float] = {}
+        if self.store is None:
+            return durations
+        for _, unit_hash in test_units(language, test_source):
+            raw = self.store.get(self._key(language, unit_hash))
+            if raw is not None:
+                durations.update(json.loads(raw))
+        return durations
+
+    def update(self, language: str, test_source: str, tests: List[Dict[str, Any]]) -> None:
+        """Records the durations of tests ({"test", "duration"} events) run from test_source; pytest node ids are cut to the test name."""
+        if self.store is None or not tests:
+            return
+        durations: Dict[str, float] = {}
+        for test in tests:
+            if test.get("duration") is None:
+                continue
+            name = str(test.get("test", ""))
+            if language == "python":
+                name = name.split("::")[-1]
+            durations[name] = float(test["duration"])
+        for unit, unit_hash in test_units(language, test_source):
+            own = {name: seconds for name, seconds in durations.items() if _in_unit(language, name, unit)}
+            if own:
+                key = self._key(language, unit_hash)
+                raw = self.store.get(key)
+                self.store.set(key, json.dumps({**(json.loads(raw) if raw is not None else {}), **own}))
+
+
+duration_store = DurationStore.from_env()
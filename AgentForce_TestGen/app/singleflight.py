@@ -0,0 +1,61 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from .metrics import SINGLEFLIGHT_REQUESTS
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller starts
+    the work as a task, later callers with that key attach to it and all of
+    them get its result (or its exception). The task is shielded from the
+    callers, so one waiter going away (e.g. its client disconnected) does
+    not cancel the work for the others; it is cancelled only when every
+    waiter has gone. Once the task finishes the key is free again, so
+    results are shared between concurrent callers only, never cached.
+    """
+
+    def __init__(self, name: str = "generate"):
+        self.name = name
+        self._flights: Dict[str, _Flight] = {}
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def waiters(self, key: str) -> int:
+        flight = self._flights.get(key)
+        return flight.waiters if flight is not None else 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task: self._forget(key, flight))
+            SINGLEFLIGHT_REQUESTS.inc(flight=self.name, role="leader")
+        else:
+            SINGLEFLIGHT_REQUESTS.inc(flight=self.name, role="follower")
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            # This waiter was cancelled; the work goes on while others wait for it.
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+                self._forget(key, flight)
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        # A newer flight may already own the key after a cancelled one.
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
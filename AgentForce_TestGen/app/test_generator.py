@@ -1,69 +1,176 @@
 import json
-from typing import Dict, Any
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
 import tempfile
 import ast
 
+# Positional and keyword arguments of one call.
+Arguments = Tuple[Tuple[Any, ...], Dict[str, Any]]
+# (test number, case index, arguments, expected output) of one generated test.
+Case = Tuple[int, int, Arguments, Any]
+
+def parse_arguments(value: Any) -> Optional[Arguments]:
+    """
+    The arguments a case's input stands for. An input is written like the
+    inside of the call's parentheses, every argument a literal: "2",
+    "'abc'", "1, 2" (two arguments), "(1, 2)" (one tuple), "[1], key=2".
+    None if the input is not such a list.
+    """
+    text = value if isinstance(value, str) else repr(value)
+    try:
+        call = ast.parse(f"_({text})", mode="eval").body
+        if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Name) and call.func.id == "_"):
+            return None
+        if any(keyword.arg is None for keyword in call.keywords):
+            return None
+        args = tuple(ast.literal_eval(arg) for arg in call.args)
+        kwargs = {keyword.arg: ast.literal_eval(keyword.value) for keyword in call.keywords}
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return None
+    return args, kwargs
+
+def format_arguments(arguments: Arguments) -> str:
+    """The source of arguments as written between a call's parentheses."""
+    args, kwargs = arguments
+    return ", ".join([repr(arg) for arg in args] + [f"{name}={value!r}" for name, value in kwargs.items()])
+
+def default_table_min_cases() -> int:
+    """
+    Groups with at least this many cases are written as one table-driven
+    test (TESTGEN_TABLE_MIN_CASES, default 10; 0 writes one test per case).
+    """
+    return int(os.getenv("TESTGEN_TABLE_MIN_CASES", "10"))
+
 class TestGenerator:
-    def __init__(self, output_dir: str = "tests"):
+    def __init__(self, output_dir: str = "tests", table_min_cases: Optional[int] = None):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
+        self.table_min_cases = default_table_min_cases() if table_min_cases is None else table_min_cases
 
     def _format_py_value(self, value: Any) -> str:
         if isinstance(value, str):
-            return f"'{value.replace("'", "\\'")}'"
+            escaped_value = value.replace("'", "\\'")
+            return f"'{escaped_value}'"
         return str(value)
 
-    def generate_test_file(self, module_name: str, test_data: Dict) -> str:
-        test_content = [
-            "import pytest",
-            f"from examples import {module_name}",
-            ""
-        ]
-
+    def _iter_groups(self, module_name: str, test_data: Dict) -> Iterator[Tuple[Optional[str], int, str, List[Case]]]:
+        """
+        Yields (table test name or None, group index, function name, cases)
+        for every group with at least one case that becomes a test, in file
+        order. Cases are (test number, case index, arguments, expected
+        output), arguments parsed by parse_arguments (cases whose input is
+        not an argument list are left out); test numbers run across the
+        whole file. Groups with at least
+        table_min_cases cases get a table test name and are written as one
+        parametrized test.
+        """
         test_counter = 1
+        table_names = set()
         # --- FINAL FIX: Use the function_name from the test group ---
-        for group in test_data.get("test_groups", []):
+        for group_index, group in enumerate(test_data.get("test_groups", [])):
             func_name = group.get("function_name")
             if not func_name:
                 continue # Skip groups without a function name
 
-            for case in group.get("cases", []):
+            cases = []
+            for case_index, case in enumerate(group.get("cases", [])):
                 if "input" not in case or "expected_output" not in case:
                     continue
 
-                try:
-                    input_val = ast.literal_eval(case["input"])
-                except (ValueError, SyntaxError):
+                arguments = parse_arguments(case["input"])
+                if arguments is None:
                     continue
-                
-                expected_out = case["expected_output"]
-                
-                test_name = f"test_{module_name}_{test_counter}"
+
+                cases.append((test_counter, case_index, arguments, case["expected_output"]))
                 test_counter += 1
+            if not cases:
+                continue
+
+            table_name = None
+            if 0 < self.table_min_cases <= len(cases):
+                table_name = f"test_{module_name}_{func_name.replace('.', '_')}"
+                if table_name in table_names:
+                    table_name = f"{table_name}_{group_index}"
+                table_names.add(table_name)
+            yield table_name, group_index, func_name, cases
+
+    def test_names(self, module_name: str, test_data: Dict) -> Dict[str, List[Tuple[int, int]]]:
+        """Maps each generated test (or table row, "name[number]") to the (group, case) indexes it came from."""
+        names = {}
+        for table_name, group_index, _, cases in self._iter_groups(module_name, test_data):
+            for number, case_index, _, _ in cases:
+                name = f"{table_name}[{number}]" if table_name else f"test_{module_name}_{number}"
+                names[name] = [(group_index, case_index)]
+        return names
 
-                # Use the dynamic function name here
-                test_content.extend([
-                    f"def {test_name}():",
-                    f"    # Test for {func_name} with input: {input_val}",
-                    f"    result = {module_name}.{func_name}({input_val})",
-                ])
+    def _format_expected(self, expected_out: Any) -> str:
+        if isinstance(expected_out, float):
+            return f"pytest.approx({expected_out})"
+        return self._format_py_value(expected_out)
 
-                if isinstance(expected_out, float):
-                    test_content.append(f"    assert result == pytest.approx({expected_out})")
-                else:
-                    formatted_expected = self._format_py_value(expected_out)
-                    test_content.append(f"    assert result == {formatted_expected}")
+    def _case_lines(self, module_name: str, func_name: str, case: Case, is_async: bool) -> Iterator[str]:
+        number, _, arguments, expected_out = case
+        # Use the dynamic function name here
+        call = f"{module_name}.{func_name}({format_arguments(arguments)})"
+        if is_async:
+            call = f"asyncio.run({call})"
+        yield f"def test_{module_name}_{number}():\n"
+        yield f"    # Test for {func_name} with input: {format_arguments(arguments)}\n"
+        yield f"    result = {call}\n"
+        yield f"    assert result == {self._format_expected(expected_out)}\n"
+        yield "\n"
 
-                test_content.append("")
+    def _table_lines(self, module_name: str, table_name: str, func_name: str, cases: List[Case], is_async: bool) -> Iterator[str]:
+        # Rows hold the same arguments the per-case tests would pass.
+        keywords = any(kwargs for _, _, (_, kwargs), _ in cases)
+        params = "args, kwargs, expected" if keywords else "args, expected"
+        call = f"{module_name}.{func_name}(*args, **kwargs)" if keywords else f"{module_name}.{func_name}(*args)"
+        if is_async:
+            call = f"asyncio.run({call})"
+        yield f'@pytest.mark.parametrize("{params}", [\n'
+        for _, _, (args, kwargs), expected_out in cases:
+            row = f"{args!r}, {kwargs!r}" if keywords else f"{args!r}"
+            yield f"    ({row}, {self._format_expected(expected_out)}),\n"
+        # Row ids are the test numbers, so each row is named like the
+        # one-function-per-case test it replaces.
+        yield f"], ids=range({cases[0][0]}, {cases[-1][0] + 1}))\n"
+        yield f"def {table_name}({params}):\n"
+        yield f"    # Table of tests for {func_name}\n"
+        yield f"    result = {call}\n"
+        yield "    assert result == expected\n"
+        yield "\n"
 
-        temp_file = tempfile.NamedTemporaryFile(
-            mode='w+',
+    def _file_lines(self, module_name: str, test_data: Dict) -> Iterator[str]:
+        async_functions = set(test_data.get("async_functions", []))
+        if async_functions:
+            yield "import asyncio\n"
+        yield "import pytest\n"
+        yield f"from examples import {module_name}\n"
+        yield "\n"
+        for table_name, _, func_name, cases in self._iter_groups(module_name, test_data):
+            is_async = func_name in async_functions
+            if table_name:
+                yield from self._table_lines(module_name, table_name, func_name, cases, is_async)
+            else:
+                for case in cases:
+                    yield from self._case_lines(module_name, func_name, case, is_async)
+
+    def generate_test_file(self, module_name: str, test_data: Dict, output_dir: Optional[Path] = None) -> str:
+        """
+        Writes the test file in one pass: lines are streamed to disk as they
+        are formatted instead of being collected first.
+        """
+        with tempfile.NamedTemporaryFile(
+            mode='w',
             suffix='.py',
             delete=False,
-            dir=self.output_dir,
+            dir=output_dir or self.output_dir,
             encoding='utf-8'
-        )
-        temp_file.write("\n".join(test_content))
-        temp_file.close()
-        return temp_file.name
\ No newline at end of file
+        ) as temp_file:
+            temp_file.writelines(self._file_lines(module_name, test_data))
+            return temp_file.name
+
+    def render(self, module_name: str, test_data: Dict) -> str:
+        """The test file generate_test_file would write, as a string."""
+        return "".join(self._file_lines(module_name, test_data))
@@ -0,0 +1,165 @@
+"""
+Bounded handling of uploaded files.
+
+Request bodies are capped while they arrive (UploadLimitMiddleware), before
+the multipart parser has buffered them, and each uploaded file is then read
+once in chunks from the spooled temporary file Starlette stores it in
+(SpooledUpload) to check its size and hash it. The file is decoded only when
+the pipeline actually needs its text, so a request that is rejected or that
+joins an identical one in flight never holds the decoded source.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, BinaryIO, Optional
+
+CHUNK_BYTES = 64 * 1024
+
+# Room for the multipart boundaries and the other form fields on top of the file.
+_FORM_OVERHEAD = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds the {limit} byte limit.")
+        self.limit = limit
+
+
+def max_upload_bytes() -> int:
+    """Largest source file /generate, /generate/stream and /jobs accept."""
+    return int(os.getenv("TESTGEN_MAX_UPLOAD_BYTES", str(2 * 1024 * 1024)))
+
+
+def max_archive_bytes() -> int:
+    """Largest repository archive /batch accepts."""
+    return int(os.getenv("TESTGEN_MAX_ARCHIVE_BYTES", str(256 * 1024 * 1024)))
+
+
+def max_archive_members() -> int:
+    """Most files and directories a batch archive may hold."""
+    return int(os.getenv("TESTGEN_MAX_ARCHIVE_MEMBERS", "20000"))
+
+
+def max_extracted_bytes() -> int:
+    """Largest total uncompressed size of a batch archive."""
+    return int(os.getenv("TESTGEN_MAX_EXTRACTED_BYTES", str(1024 * 1024 * 1024)))
+
+
+class SpooledUpload:
+    """
+    An uploaded file, left in its spooled temporary file (memory up to
+    Starlette's spool size, disk beyond). size and sha256 are known after
+    from_file; text decodes the content on first access and keeps it, so
+    every later stage shares that one string.
+    """
+
+    def __init__(self, filename: str, file: BinaryIO, size: int, sha256: str):
+        self.filename = filename
+        self.file = file
+        self.size = size
+        self.sha256 = sha256
+        self._text: Optional[str] = None
+
+    @classmethod
+    def from_file(cls, filename: str, file: BinaryIO, limit: int) -> "SpooledUpload":
+        """Reads file once in chunks; raises UploadTooLarge as soon as it passes limit bytes."""
+        digest = hashlib.sha256()
+        size = 0
+        file.seek(0)
+        while True:
+            chunk = file.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if limit > 0 and size > limit:
+                raise UploadTooLarge(limit)
+            digest.update(chunk)
+        file.seek(0)
+        return cls(filename, file, size, digest.hexdigest())
+
+    @classmethod
+    async def from_upload(cls, upload: Any, limit: int) -> "SpooledUpload":
+        """from_file for a FastAPI UploadFile, off the event loop (its file may be on disk)."""
+        return await asyncio.to_thread(cls.from_file, upload.filename, upload.file, limit)
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self.file.seek(0)
+            try:
+                self._text = self.file.read().decode("utf-8")
+            except UnicodeDecodeError as e:
+                raise ValueError(f"Uploaded file is not valid UTF-8: {e}") from None
+        return self._text
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware that answers 413 to a POST whose body is larger than its
+    limit: at once when Content-Length says so, otherwise as soon as the
+    streamed body passes the limit, before the rest of it is read. /batch
+    takes archives (max_archive_bytes), every other route a source file
+    (max_upload_bytes).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        file_limit = max_archive_bytes() if scope["path"].startswith("/batch") else max_upload_bytes()
+        if file_limit <= 0:
+            await self.app(scope, receive, send)
+            return
+        limit = file_limit + _FORM_OVERHEAD
+        headers = dict(scope.get("headers") or [])
+        try:
+            declared = int(headers.get(b"content-length", b"0"))
+        except ValueError:
+            declared = 0
+        if declared > limit:
+            await _reject(send, file_limit)
+            return
+
+        received = 0
+        response_started = False
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit and not response_started:
+                    # Answer now and make the app see a disconnect; whatever it
+                    # sends after that is dropped.
+                    rejected = True
+                    await _reject(send, file_limit)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        await self.app(scope, limited_receive, tracked_send)
+
+
+async def _reject(send, limit: int) -> None:
+    body = json.dumps({"detail": str(UploadTooLarge(limit))}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# All job workspaces live under this directory so stale ones can be swept.
+WORKSPACE_BASE = Path(os.getenv("TESTGEN_WORKSPACE_DIR", Path(tempfile.gettempdir()) / "testgen-workspaces"))
+
+EXTENSIONS = {"python": ".py", "javascript": ".js"}
+
+# Files of the module's package copied next to it (see Workspace).
+SUPPORT_SUFFIXES = {".py", ".js", ".cjs", ".mjs", ".json"}
+# Directories that never contain code worth generating tests for, or importing.
+SKIP_DIRS = {"node_modules", "__pycache__", "venv", ".venv", "env", "build", "dist", "coverage", "site-packages"}
+# Lists the copied files and their hashes; part of the run cache key and
+# of the module's selection header, so editing a sibling reruns the tests.
+SUPPORT_MANIFEST = "support_files.json"
+
+
+class Workspace:
+    """
+    Private scratch directory for one job. It mirrors the project layout the
+    generated tests expect, so runs never share result or coverage files:
+
+        <root>/examples/<module>.py|.js   the uploaded module
+        <root>/tests/, <root>/js_tests/   generated test files
+        <root>/coverage.xml               pytest coverage report
+        <root>/jest_results.json          Jest results
+        <root>/coverage/                  Jest coverage output
+
+    With package_dir (the directory the module came from, e.g. in a batch
+    over a repository), the source files of that directory and its
+    subdirectories are copied into examples/ next to the module, so its
+    relative and sibling imports resolve. For Python, a conftest.py also
+    puts examples/ and python_path (the roots of the project's packages)
+    on sys.path, for absolute imports of the project's own modules.
+
+    Use it as a context manager; the directory is removed on exit, even if
+    the job fails.
+    """
+
+    def __init__(
+        self,
+        module_name: str,
+        language: str,
+        source: str,
+        base_dir: Optional[Path] = None,
+        package_dir: Optional[Path] = None,
+        python_path: Sequence[Path] = ()
+    ):
+        base = Path(base_dir or WORKSPACE_BASE)
+        base.mkdir(parents=True, exist_ok=True)
+        self.root = Path(tempfile.mkdtemp(prefix=f"{module_name}-", dir=base))
+        self.module_name = module_name
+        self.language = language
+
+        self.examples_dir = self.root / "examples"
+        self.examples_dir.mkdir()
+        self.module_path = self.examples_dir / f"{module_name}{EXTENSIONS[language]}"
+        self.support_files: List[Path] = []
+        if package_dir is not None:
+            self.support_files = _copy_package(Path(package_dir), self.examples_dir, self.module_path.name)
+        (self.examples_dir / "__init__.py").touch()
+        self.module_path.write_text(source, encoding="utf-8")
+
+        self.tests_dir = self.root / ("tests" if language == "python" else "js_tests")
+        self.tests_dir.mkdir()
+        if self.support_files:
+            manifest = {
+                path.relative_to(self.examples_dir).as_posix(): hashlib.sha256(path.read_bytes()).hexdigest()
+                for path in self.support_files
+            }
+            (self.root / SUPPORT_MANIFEST).write_text(json.dumps(manifest, sort_keys=True), encoding="utf-8")
+            if language == "python":
+                entries = [str(self.examples_dir)] + [str(Path(path).resolve()) for path in python_path]
+                (self.tests_dir / "conftest.py").write_text(
+                    f"import sys\n\nsys.path[:0] = [p for p in {entries!r} if p not in sys.path]\n",
+                    encoding="utf-8"
+                )
+
+        self.coverage_xml = self.root / "coverage.xml"
+        self.jest_results = self.root / "jest_results.json"
+        self.coverage_dir = self.root / "coverage"
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self) -> "Workspace":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.cleanup()
+
+
+def _copy_package(package_dir: Path, dest: Path, module_file: str) -> List[Path]:
+    """Copies the source files under package_dir (but the module itself) into dest; returns the copies."""
+    copied = []
+    for dirpath, dirnames, filenames in os.walk(package_dir):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and not d.startswith("."))
+        relative = Path(dirpath).relative_to(package_dir)
+        for filename in sorted(filenames):
+            # examples/ stands in for the module's package; its own __init__ may import beyond it.
+            if Path(filename).suffix not in SUPPORT_SUFFIXES or (
+                relative == Path(".") and filename in (module_file, "__init__.py")
+            ):
+                continue
+            target = dest / relative / filename
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(Path(dirpath) / filename, target)
+            copied.append(target)
+    return copied
+
+
+def read_support_manifest(root: Path) -> str:
+    """The support file manifest of the workspace at root, or "" if it has none."""
+    try:
+        return (Path(root) / SUPPORT_MANIFEST).read_text(encoding="utf-8")
+    except OSError:
+        return ""
+
+
+def sweep_stale_workspaces(max_age: float = 3600, base_dir: Optional[Path] = None) -> int:
+    """
+    Removes workspaces left behind by a crashed process. Returns how many
+    directories were deleted.
+    """
+    base = Path(base_dir or WORKSPACE_BASE)
+    if not base.is_dir():
+        return 0
+    removed = 0
+    now = time.time()
+    for path in base.iterdir():
+        try:
+            if path.is_dir() and now - path.stat().st_mtime > max_age:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        except OSError:
+            continue
+    return removed
@@ -0,0 +1,101 @@
+import json
+import math
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for no samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    return {
+        "runs": len(samples),
+        "min_s": round(min(samples), 6),
+        "median_s": round(statistics.median(samples), 6),
+        "p95_s": round(percentile(samples, 95), 6),
+        "max_s": round(max(samples), 6),
+    }
+
+
+def time_call(func: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """Runs func repeat times; returns the timing summary and the last result."""
+    samples = []
+    result = None
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - started)
+    return {"timing": summarize(samples), "result": result}
+
+
+def peak_memory(func: Callable[[], Any]) -> Dict[str, Any]:
+    """Runs func once under tracemalloc; returns its peak Python heap use (KiB) and result."""
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"peak_kib": round(peak / 1024, 1), "result": result}
+
+
+def environment() -> Dict[str, Any]:
+    """Identifies the commit and machine a result file was produced on."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+    }
+
+
+def write_results(kind: str, report: Dict[str, Any], output: Optional[str]) -> Path:
+    """Writes report as JSON to output, or to results/<kind>-<commit>.json."""
+    if output:
+        path = Path(output)
+    else:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        path = RESULTS_DIR / f"{kind}-{report['environment'].get('commit') or 'local'}.json"
+    path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return path
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], key_fields: List[str], metric: str) -> List[str]:
+    """
+    Lines comparing metric for every entry present in both reports. Entries
+    are matched on key_fields; ratio > 1 means the current run is slower.
+    """
+    def index(report):
+        return {tuple(e.get(k) for k in key_fields): e for e in report.get("results", [])}
+
+    old, new = index(baseline), index(current)
+    lines = []
+    for key, entry in new.items():
+        if key not in old or metric not in old[key] or metric not in entry:
+            continue
+        before, after = old[key][metric], entry[metric]
+        ratio = after / before if before else float("inf")
+        flag = "  REGRESSION" if ratio > 1.2 else ""
+        label = " ".join(str(k) for k in key)
+        lines.append(f"{label:<40} {before:>10.4f}s -> {after:>10.4f}s  x{ratio:.2f}{flag}")
+    return lines
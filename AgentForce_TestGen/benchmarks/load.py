@@ -0,0 +1,143 @@
+"""
+Concurrent load generator for the FastAPI app.
+
+By default the app runs in-process with the fake LLM backend; pass --url to
+load a running server instead.
+
+    python -m benchmarks.load --requests 200 --concurrency 16 --functions 20
+    python -m benchmarks.load --url http://127.0.0.1:8000 --file examples/sample_input.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault("TESTGEN_LLM_BACKEND", "fake")
+
+import httpx
+
+from .common import compare, environment, percentile, write_results
+from .synthetic import js_module, python_module
+
+
+@asynccontextmanager
+async def _client(url: Optional[str], timeout: float):
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+            yield client
+        return
+    from app.main import app
+    # ASGITransport does not run the lifespan, so start the app's pools here.
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testgen", timeout=timeout) as client:
+            yield client
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    language: str,
+    filename: str,
+    content: bytes,
+    total: int,
+    concurrency: int
+) -> Dict[str, Any]:
+    """Sends total requests with at most concurrency in flight and summarizes them."""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    remaining = iter(range(total))
+
+    async def worker() -> None:
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await client.post(
+                    endpoint,
+                    data={"language": language},
+                    files={"file": (filename, content)}
+                )
+                await response.aread()
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    elapsed = time.perf_counter() - started
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total,
+        "statuses": statuses,
+        "duration_s": round(elapsed, 3),
+        "rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "p50_s": round(percentile(latencies, 50), 4),
+        "p95_s": round(percentile(latencies, 95), 4),
+        "p99_s": round(percentile(latencies, 99), 4),
+        "max_s": round(max(latencies), 4) if latencies else 0.0,
+    }
+
+
+def main(argv=None) -> None:
+    arg_parser = argparse.ArgumentParser(description="Load test the TestGen API.")
+    arg_parser.add_argument("--url", help="Base URL of a running server (default: in-process app, fake LLM)")
+    arg_parser.add_argument("--endpoint", default="/generate")
+    arg_parser.add_argument("--requests", type=int, default=100)
+    arg_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32],
+                            help="One load run per concurrency level")
+    arg_parser.add_argument("--language", default="python", choices=["python", "javascript"])
+    arg_parser.add_argument("--file", help="Module to upload (default: a synthetic module)")
+    arg_parser.add_argument("--functions", type=int, default=10, help="Size of the synthetic module")
+    arg_parser.add_argument("--timeout", type=float, default=300.0)
+    arg_parser.add_argument("--output", "-o", help="Result file (default: benchmarks/results/load-<commit>.json)")
+    arg_parser.add_argument("--compare", help="Earlier result file to compare p95 latency against")
+    args = arg_parser.parse_args(argv)
+
+    if args.file:
+        filename, content = Path(args.file).name, Path(args.file).read_bytes()
+    elif args.language == "python":
+        filename, content = "bench_load.py", python_module(args.functions).encode("utf-8")
+    else:
+        filename, content = "bench_load.js", js_module(args.functions).encode("utf-8")
+
+    async def run_all() -> List[Dict[str, Any]]:
+        results = []
+        async with _client(args.url, args.timeout) as client:
+            for concurrency in args.concurrency:
+                result = await run_load(
+                    client, args.endpoint, args.language, filename, content, args.requests, concurrency
+                )
+                print(
+                    f"c={concurrency:<4} {result['rps']:>8.2f} req/s  p50 {result['p50_s']:.3f}s  "
+                    f"p95 {result['p95_s']:.3f}s  p99 {result['p99_s']:.3f}s  {result['statuses']}"
+                )
+                results.append(result)
+        return results
+
+    report = {
+        "environment": environment(),
+        "config": {
+            "url": args.url or "in-process",
+            "language": args.language,
+            "file": filename,
+            "functions": None if args.file else args.functions,
+        },
+        "results": asyncio.run(run_all()),
+    }
+    path = write_results("load", report, args.output)
+    print(f"Results written to {path}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print("\n".join(compare(baseline, report, ["endpoint", "concurrency"], "p95_s")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Times each stage of the parse -> prompt -> generate -> write -> run pipeline
+on synthetic modules, with the deterministic fake LLM backend.
+
+    python -m benchmarks.pipeline --sizes 10 100 1000 5000 --repeat 3
+    python -m benchmarks.pipeline --compare benchmarks/results/pipeline-abc123.json
+"""
+import argparse
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Must be set before the app modules read them.
+os.environ.setdefault("TESTGEN_LLM_BACKEND", "fake")
+os.environ.setdefault("TESTGEN_LLM_CACHE", "0")
+
+from app.context import JSContext, PythonContext, SourceContext, estimate_tokens
+from app.js_parser import parse_js_file, parser_pool
+from app.js_runner import run_js_tests_and_get_coverage
+from app.js_test_generator import JSTestGenerator
+from app.llm import LLMWrapper
+from app.llm_backends import FakeBackend
+from app.parser import CodeParser
+from app.pytest_pool import pytest_pool
+from app.runner import run_tests_and_get_coverage
+from app.test_generator import TestGenerator
+from app.uploads import SpooledUpload
+from app.workspace import Workspace
+
+from .common import compare, environment, peak_memory, time_call, write_results
+from .synthetic import js_module, python_module
+
+
+def _entry(language: str, size: int, stage: str, timed: Dict[str, Any], **extra) -> Dict[str, Any]:
+    return {"language": language, "size": size, "stage": stage, **timed["timing"], **extra}
+
+
+def _spooled(filename: str, code: str) -> SpooledUpload:
+    """The upload as the server holds it: in a spooled temporary file like Starlette's."""
+    file = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    file.write(code.encode("utf-8"))
+    return SpooledUpload.from_file(filename, file, limit=0)
+
+
+def _request_memory(language: str, size: int, module_name: str, code: str, handle) -> Dict[str, Any]:
+    """
+    Peak heap use of one request from the spooled upload to the written test
+    file (handle gets the decoded source), next to the size of the source.
+    """
+    measured = peak_memory(lambda: handle(_spooled(module_name, code).text))
+    return {
+        "language": language, "size": size, "stage": "request_memory",
+        "peak_kib": measured["peak_kib"], "source_kib": round(len(code.encode("utf-8")) / 1024, 1),
+    }
+
+
+def _context_entry(language: str, size: int, code: str, make_context, names: List[str], repeat: int) -> Dict[str, Any]:
+    """
+    Times slicing the module into packed prompt contexts and reports the
+    source tokens they hold against the single whole-file prompt.
+    """
+    def slice_module():
+        context: SourceContext = make_context()
+        return [context.build(pack) for pack in context.pack(names)]
+
+    sliced = time_call(slice_module, repeat)
+    contexts = sliced["result"]
+    whole = estimate_tokens(code)
+    sent = sum(estimate_tokens(text) for text in contexts)
+    return _entry(
+        language, size, "context", sliced,
+        packs=len(contexts), whole_file_tokens=whole, context_tokens=sent, tokens_saved=whole - sent,
+        largest_prompt_tokens=max((estimate_tokens(text) for text in contexts), default=0)
+    )
+
+
+def bench_python(size: int, repeat: int, run_max: int, llm: LLMWrapper) -> List[Dict[str, Any]]:
+    module_name = f"bench_py_{size}"
+    code = python_module(size)
+    results = []
+
+    uploaded = time_call(lambda: _spooled(f"{module_name}.py", code).text, repeat)
+    results.append(_entry("python", size, "upload", uploaded))
+
+    parsed = time_call(lambda: CodeParser().parse_file(code), repeat)
+    functions = parsed["result"]
+    results.append(_entry("python", size, "parse", parsed, functions=len(functions)))
+
+    results.append(_context_entry(
+        "python", size, code, lambda: PythonContext(code), [f.name for f in functions], repeat
+    ))
+
+    build = llm._py_prompt_builder(code, functions)
+    prompt = time_call(lambda: build(None), repeat)
+    results.append(_entry("python", size, "prompt", prompt, prompt_chars=len(prompt["result"].prompt)))
+
+    generated = time_call(lambda: json.loads(llm.generate_tests(code, functions)), repeat)
+    plan = generated["result"]
+    results.append(_entry("python", size, "generate", generated, groups=len(plan["test_groups"])))
+
+    with Workspace(module_name, "python", code) as workspace:
+        generator = TestGenerator(output_dir=str(workspace.tests_dir))
+        written = time_call(lambda: generator.generate_test_file(module_name, plan, workspace.tests_dir), repeat)
+        results.append(_entry("python", size, "write_tests", written))
+
+        def handle(text: str) -> str:
+            functions = CodeParser().parse_file(text)
+            return generator.generate_test_file(module_name, json.loads(llm.generate_tests(text, functions)), workspace.tests_dir)
+        results.append(_request_memory("python", size, module_name, code, handle))
+
+        if size <= run_max:
+            ran = time_call(lambda: run_tests_and_get_coverage(written["result"], module_name, workspace), 1)
+            results.append(_entry(
+                "python", size, "run", ran,
+                status=ran["result"].get("status"),
+                warm_pool=pytest_pool.started
+            ))
+    return results
+
+
+def bench_javascript(size: int, repeat: int, run_max: int, llm: LLMWrapper) -> List[Dict[str, Any]]:
+    module_name = f"bench_js_{size}"
+    code = js_module(size)
+    results = []
+
+    uploaded = time_call(lambda: _spooled(f"{module_name}.js", code).text, repeat)
+    results.append(_entry("javascript", size, "upload", uploaded))
+
+    try:
+        parsed = time_call(lambda: parse_js_file(code), repeat)
+    except (RuntimeError, ValueError, OSError) as e:
+        return [{"language": "javascript", "size": size, "stage": "parse", "error": str(e)}]
+    functions = parsed["result"]
+    results.append(_entry("javascript", size, "parse", parsed, functions=len(functions), pooled=parser_pool.started))
+
+    results.append(_context_entry(
+        "javascript", size, code, lambda: JSContext(code, functions), [f["name"] for f in functions], repeat
+    ))
+
+    build = llm._js_prompt_builder(code, functions)
+    prompt = time_call(lambda: build(None), repeat)
+    results.append(_entry("javascript", size, "prompt", prompt, prompt_chars=len(prompt["result"].prompt)))
+
+    generated = time_call(lambda: json.loads(llm.generate_js_tests(code, functions)), repeat)
+    plan = generated["result"]
+    # The fake backend does not know the module name; point the import at it.
+    names = ", ".join(dict.fromkeys(t["describe"].split(".")[0] for t in plan["tests"]))
+    plan["imports"] = f"const {{ {names} }} = require('../examples/{module_name}');"
+    results.append(_entry("javascript", size, "generate", generated, groups=len(plan["tests"])))
+
+    with Workspace(module_name, "javascript", code) as workspace:
+        generator = JSTestGenerator()
+        written = time_call(lambda: generator.generate_test_file(module_name, plan, workspace.tests_dir), repeat)
+        results.append(_entry("javascript", size, "write_tests", written))
+
+        def handle(text: str) -> str:
+            raw = json.loads(llm.generate_js_tests(text, parse_js_file(text)))
+            raw["imports"] = plan["imports"]
+            return generator.generate_test_file(module_name, raw, workspace.tests_dir)
+        results.append(_request_memory("javascript", size, module_name, code, handle))
+
+        if size <= run_max:
+            ran = time_call(lambda: run_js_tests_and_get_coverage(written["result"], module_name, workspace), 1)
+            entry = _entry("javascript", size, "run", ran, status=ran["result"].get("status"))
+            if ran["result"].get("status") == "Error":
+                entry["error"] = ran["result"].get("error")
+            results.append(entry)
+    return results
+
+
+def main(argv=None) -> None:
+    arg_parser = argparse.ArgumentParser(description="Benchmark the test generation pipeline stage by stage.")
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    arg_parser.add_argument("--languages", nargs="+", default=["python", "javascript"], choices=["python", "javascript"])
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Runs per stage (test runs always run once)")
+    arg_parser.add_argument("--run-max", type=int, default=1000, help="Largest module size to run tests for")
+    arg_parser.add_argument("--warm-pool", action="store_true", help="Run pytest on the warm worker pool")
+    arg_parser.add_argument("--output", "-o", help="Result file (default: benchmarks/results/pipeline-<commit>.json)")
+    arg_parser.add_argument("--compare", help="Earlier result file to compare median times against")
+    args = arg_parser.parse_args(argv)
+
+    llm = LLMWrapper(backend=FakeBackend())
+    if "javascript" in args.languages:
+        try:
+            parser_pool.start()
+        except OSError as e:
+            print(f"JavaScript parser pool unavailable, using one-shot node processes: {e}")
+    if args.warm_pool:
+        pytest_pool.start()
+
+    results: List[Dict[str, Any]] = []
+    try:
+        for size in args.sizes:
+            for language in args.languages:
+                bench = bench_python if language == "python" else bench_javascript
+                for entry in bench(size, args.repeat, args.run_max, llm):
+                    results.append(entry)
+                    if "median_s" in entry:
+                        timing = f"{entry['median_s']:.4f}s"
+                    elif "peak_kib" in entry:
+                        timing = f"{entry['peak_kib']:.1f} KiB peak ({entry['source_kib']:.1f} KiB source)"
+                    else:
+                        timing = entry["error"].strip().splitlines()[0]
+                    print(f"{language:<11} {size:>5} {entry['stage']:<12} {timing}")
+    finally:
+        parser_pool.stop()
+        pytest_pool.stop()
+
+    report = {
+        "environment": environment(),
+        "config": {"sizes": args.sizes, "repeat": args.repeat, "run_max": args.run_max, "warm_pool": args.warm_pool},
+        "results": results,
+    }
+    path = write_results("pipeline", report, args.output)
+    print(f"Results written to {path}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print("\n".join(compare(baseline, report, ["language", "size", "stage"], "median_s")))
+
+
+if __name__ == "__main__":
+    main()
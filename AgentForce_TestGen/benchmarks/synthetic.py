@@ -0,0 +1,83 @@
+"""
+Synthetic Python and JavaScript modules of a given size for the benchmarks.
+
+Modules are deterministic for a given size, so timings from different
+commits are measured on identical input. Roughly a third of the functions
+are methods, some of them on nested classes.
+"""
+from typing import List
+
+_PY_BODIES = [
+    "    return {a} + {b}\n",
+    "    if {a} > {b}:\n        return {a} - {b}\n    return {b} - {a}\n",
+    "    total = 0\n    for item in range({a}):\n        total += item * {b}\n    return total\n",
+    "    result = []\n    for i in range({a}):\n        for j in range({b}):\n            result.append(i * j)\n    return len(result)\n",
+    "    while {a} > 0:\n        {a} -= {b} or 1\n    return {a}\n",
+]
+
+_JS_BODIES = [
+    "  return {a} + {b};\n",
+    "  if ({a} > {b}) {{\n    return {a} - {b};\n  }}\n  return {b} - {a};\n",
+    "  let total = 0;\n  for (let i = 0; i < {a}; i++) {{\n    total += i * {b};\n  }}\n  return total;\n",
+]
+
+
+def python_module(num_functions: int) -> str:
+    """A Python module with num_functions functions and methods."""
+    parts: List[str] = ["import math\nfrom typing import List, Optional\n\n"]
+    index = 0
+    while index < num_functions:
+        kind = index % 6
+        body = _PY_BODIES[index % len(_PY_BODIES)].format(a="x", b="y")
+        if kind == 3 and index + 2 <= num_functions:
+            parts.append(
+                f"class Service{index}:\n"
+                f"    \"\"\"Synthetic class {index}.\"\"\"\n\n"
+                f"    def method_{index}(self, x: int, y: int = 1) -> int:\n"
+                + "".join("    " + line + "\n" for line in body.splitlines())
+                + f"\n    class Inner{index}:\n"
+                f"        @staticmethod\n"
+                f"        def helper_{index + 1}(x, y):\n"
+                + "".join("        " + line + "\n" for line in body.splitlines())
+                + "\n"
+            )
+            index += 2
+            continue
+        prefix = "async def" if kind == 5 else "def"
+        parts.append(
+            f"{prefix} func_{index}(x: int, y: int = 2) -> int:\n"
+            f"    \"\"\"Synthetic function {index}.\"\"\"\n"
+            f"{body}\n\n"
+        )
+        index += 1
+    return "".join(parts)
+
+
+def js_module(num_functions: int) -> str:
+    """A CommonJS module with num_functions functions, arrow functions and methods."""
+    parts: List[str] = ["'use strict';\n\n"]
+    exported: List[str] = []
+    index = 0
+    while index < num_functions:
+        kind = index % 5
+        body = _JS_BODIES[index % len(_JS_BODIES)].format(a="x", b="y")
+        if kind == 3 and index + 2 <= num_functions:
+            parts.append(
+                f"class Service{index} {{\n"
+                f"  method{index}(x, y = 1) {{\n"
+                + "".join("  " + line + "\n" for line in body.splitlines())
+                + f"  }}\n\n  static helper{index + 1}(x, y) {{\n"
+                + "".join("  " + line + "\n" for line in body.splitlines())
+                + "  }\n}\n\n"
+            )
+            exported.append(f"Service{index}")
+            index += 2
+            continue
+        if kind == 4:
+            parts.append(f"const func{index} = (x, y = 2) => {{\n{body}}};\n\n")
+        else:
+            parts.append(f"function func{index}(x, y = 2) {{\n{body}}}\n\n")
+        exported.append(f"func{index}")
+        index += 1
+    parts.append(f"module.exports = {{ {', '.join(exported)} }};\n")
+    return "".join(parts)
@@ -0,0 +1,47 @@
+// Jest setup file (--setupFilesAfterEnv) that records which statements and
+// branches each test executed, the Jest counterpart of coverage.py's
+// --cov-context=test. Istanbul keeps cumulative hit counters in
+// global.__coverage__, so the counters are snapshotted after every test and
+// the ones that grew are attributed to it. Results are appended as one JSON
+// line per test file to the path in TESTGEN_COVERAGE_CONTEXTS.
+const fs = require('fs');
+const path = require('path');
+
+const OUTPUT = process.env.TESTGEN_COVERAGE_CONTEXTS;
+
+function snapshot() {
+  const counters = {};
+  for (const [file, data] of Object.entries(global.__coverage__ || {})) {
+    counters[file] = { s: Object.assign({}, data.s), b: JSON.parse(JSON.stringify(data.b)) };
+  }
+  return counters;
+}
+
+if (OUTPUT) {
+  const contexts = {};
+  let previous = snapshot();
+
+  afterEach(() => {
+    const current = snapshot();
+    const hit = [];
+    for (const [file, data] of Object.entries(current)) {
+      const before = previous[file] || { s: {}, b: {} };
+      const name = path.basename(file);
+      for (const [id, count] of Object.entries(data.s)) {
+        if (count > (before.s[id] || 0)) hit.push(`${name}:s${id}`);
+      }
+      for (const [id, counts] of Object.entries(data.b)) {
+        counts.forEach((count, arm) => {
+          if (count > ((before.b[id] || [])[arm] || 0)) hit.push(`${name}:b${id}.${arm}`);
+        });
+      }
+    }
+    const test = expect.getState().currentTestName;
+    contexts[test] = (contexts[test] || []).concat(hit);
+    previous = current;
+  });
+
+  afterAll(() => {
+    fs.appendFileSync(OUTPUT, JSON.stringify(contexts) + '\n');
+  });
+}
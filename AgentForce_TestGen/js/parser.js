@@ -1,46 +1,277 @@
 const fs = require('fs');
+const crypto = require('crypto');
 const acorn = require('acorn');
 
-// Get the file path from the command-line arguments
-const filePath = process.argv[2];
+// Keys that change when code moves or is reformatted but not when it
+// behaves differently; they are left out of the normalized AST hash.
+const POSITION_KEYS = new Set(['start', 'end', 'loc', 'range', 'raw']);
 
-if (!filePath) {
-  console.error("Error: Please provide a file path.");
-  process.exit(1);
+// Keys that never hold child nodes; the traversal does not descend into them.
+const SKIP_KEYS = new Set(['type', 'start', 'end', 'loc', 'range', 'raw', 'regex', 'bigint', 'name', 'operator', 'kind', 'sourceType']);
+
+const FUNCTION_TYPES = new Set(['FunctionDeclaration', 'FunctionExpression', 'ArrowFunctionExpression']);
+
+function hashNode(node) {
+  const normalized = JSON.stringify(node, (key, value) =>
+    POSITION_KEYS.has(key) ? undefined : value
+  );
+  return crypto.createHash('sha256').update(normalized).digest('hex');
 }
 
-try {
-  const code = fs.readFileSync(filePath, 'utf8');
-  const ast = acorn.parse(code, { ecmaVersion: 2020, sourceType: 'module' });
+function paramName(param) {
+  switch (param.type) {
+    case 'Identifier':
+      return param.name;
+    case 'AssignmentPattern':
+      return paramName(param.left);
+    case 'RestElement':
+      return '...' + paramName(param.argument);
+    case 'ObjectPattern':
+      return '{...}';
+    case 'ArrayPattern':
+      return '[...]';
+    default:
+      return param.type;
+  }
+}
 
-  const functions = [];
+function keyName(key) {
+  if (!key) return null;
+  if (key.type === 'Identifier') return key.name;
+  if (key.type === 'Literal') return String(key.value);
+  return null;
+}
+
+// Identifier names used anywhere under node, in order of first use.
+function identifiers(node) {
+  const names = new Set();
+  const stack = [node];
+  while (stack.length) {
+    const current = stack.pop();
+    if (current.type === 'Identifier') names.add(current.name);
+    for (const key in current) {
+      if (SKIP_KEYS.has(key)) continue;
+      const child = current[key];
+      if (!child || typeof child !== 'object') continue;
+      if (Array.isArray(child)) {
+        for (let i = child.length - 1; i >= 0; i--) {
+          if (child[i] && typeof child[i].type === 'string') stack.push(child[i]);
+        }
+      } else if (typeof child.type === 'string') {
+        stack.push(child);
+      }
+    }
+  }
+  return Array.from(names);
+}
 
-  // A simple function to walk the AST
-  function walk(node) {
-    if (node.type === 'FunctionDeclaration') {
-      functions.push({
-        name: node.id.name,
-        args: node.params.map(p => p.name)
+// Top-level imports and non-function variable declarations, with the names
+// they bind, so the prompt can include the ones a function uses.
+function topLevelDeclarations(ast) {
+  const declarations = [];
+  for (const statement of ast.body) {
+    const node = statement.type === 'ExportNamedDeclaration' && statement.declaration ? statement.declaration : statement;
+    let names = [];
+    if (node.type === 'ImportDeclaration') {
+      names = node.specifiers.map((spec) => spec.local.name);
+    } else if (node.type === 'VariableDeclaration' &&
+               !node.declarations.every((decl) => decl.init && FUNCTION_TYPES.has(decl.init.type))) {
+      names = node.declarations.flatMap((decl) => identifiers(decl.id));
+    }
+    if (names.length) {
+      declarations.push({
+        names: names,
+        start: statement.start,
+        end: statement.end,
+        line: statement.loc.start.line,
+        endLine: statement.loc.end.line
       });
     }
+  }
+  return declarations;
+}
+
+// `module.exports` or `exports`
+function isExportsObject(node) {
+  if (node.type === 'Identifier') return node.name === 'exports';
+  return node.type === 'MemberExpression' &&
+    node.object.type === 'Identifier' && node.object.name === 'module' &&
+    keyName(node.property) === 'exports';
+}
+
+function extractFunctions(code) {
+  const ast = acorn.parse(code, { ecmaVersion: 'latest', sourceType: 'module', locations: true });
+
+  const functions = [];
+  const exported = new Set();
+  const seen = new Set();
+  const declarations = topLevelDeclarations(ast);
+
+  function record(fnNode, name, kind, extra) {
+    seen.add(fnNode);
+    const refs = identifiers(fnNode.body);
+    const used = new Set(refs);
+    functions.push(Object.assign({
+      name: name,
+      args: fnNode.params.map(paramName),
+      kind: kind,
+      async: !!fnNode.async,
+      start: fnNode.start,
+      end: fnNode.end,
+      line: fnNode.loc.start.line,
+      endLine: fnNode.loc.end.line,
+      hash: hashNode(fnNode),
+      // Names the body uses and the top-level declarations that bind any of them.
+      refs: refs,
+      context: declarations
+        .filter((decl) => decl.names.some((declared) => used.has(declared)))
+        .map(({ start, end, line, endLine }) => ({ start, end, line, endLine }))
+    }, extra || {}));
+  }
+
+  // Iterative traversal: only AST children are visited, position metadata
+  // and scalar fields are skipped, and there is no recursion depth limit.
+  const stack = [{ node: ast, className: null }];
+  while (stack.length) {
+    const { node, className } = stack.pop();
+    let childClass = className;
+
+    switch (node.type) {
+      case 'FunctionDeclaration':
+        if (node.id && !seen.has(node)) record(node, node.id.name, 'function');
+        break;
+      case 'VariableDeclarator':
+        if (node.init && FUNCTION_TYPES.has(node.init.type) && node.id.type === 'Identifier') {
+          record(node.init, node.id.name, node.init.type === 'ArrowFunctionExpression' ? 'arrow' : 'expression');
+        }
+        break;
+      case 'ClassDeclaration':
+      case 'ClassExpression':
+        childClass = node.id ? node.id.name : className;
+        break;
+      case 'MethodDefinition': {
+        const name = keyName(node.key);
+        if (name && node.kind === 'method' && childClass) {
+          record(node.value, `${childClass}.${name}`, 'method', { className: childClass, static: node.static });
+        }
+        break;
+      }
+      case 'AssignmentExpression':
+        if (node.left.type === 'MemberExpression' && isExportsObject(node.left.object) &&
+            FUNCTION_TYPES.has(node.right.type)) {
+          // exports.foo = function () {} / module.exports.foo = () => {}
+          const name = keyName(node.left.property);
+          if (name) {
+            record(node.right, name, node.right.type === 'ArrowFunctionExpression' ? 'arrow' : 'expression');
+            exported.add(name);
+          }
+        } else if (isExportsObject(node.left) && node.right.type === 'ObjectExpression') {
+          // module.exports = { foo, bar: function () {}, baz() {} }
+          for (const prop of node.right.properties) {
+            const name = prop.type === 'Property' ? keyName(prop.key) : null;
+            if (!name) continue;
+            exported.add(name);
+            if (FUNCTION_TYPES.has(prop.value.type) && !seen.has(prop.value)) {
+              record(prop.value, name, 'expression');
+            }
+          }
+        }
+        break;
+      case 'ExportNamedDeclaration':
+        if (node.declaration) {
+          if (node.declaration.id) exported.add(node.declaration.id.name);
+          for (const decl of node.declaration.declarations || []) {
+            if (decl.id.type === 'Identifier') exported.add(decl.id.name);
+          }
+        }
+        for (const spec of node.specifiers || []) exported.add(spec.local.name);
+        break;
+      case 'ExportDefaultDeclaration':
+        if (FUNCTION_TYPES.has(node.declaration.type) && !node.declaration.id) {
+          record(node.declaration, 'default', 'expression');
+          exported.add('default');
+        } else if (node.declaration.id) {
+          exported.add(node.declaration.id.name);
+        }
+        break;
+    }
 
     for (const key in node) {
-      if (node[key] && typeof node[key] === 'object') {
-        if (Array.isArray(node[key])) {
-          node[key].forEach(walk);
-        } else {
-          walk(node[key]);
+      if (SKIP_KEYS.has(key)) continue;
+      const child = node[key];
+      if (!child || typeof child !== 'object') continue;
+      if (Array.isArray(child)) {
+        for (let i = child.length - 1; i >= 0; i--) {
+          if (child[i] && typeof child[i].type === 'string') stack.push({ node: child[i], className: childClass });
         }
+      } else if (typeof child.type === 'string') {
+        stack.push({ node: child, className: childClass });
       }
     }
   }
 
-  walk(ast);
+  functions.sort((a, b) => a.start - b.start);
+  for (const fn of functions) {
+    fn.exported = exported.has(fn.className || fn.name);
+  }
+  return functions;
+}
+
+// --- Daemon mode ---
+// Frames on stdin and stdout are a 4-byte big-endian length followed by a
+// UTF-8 JSON payload. Requests are {id, source}; responses are
+// {id, functions} or {id, error}. Requests are answered in arrival order.
+function writeFrame(payload) {
+  const body = Buffer.from(JSON.stringify(payload), 'utf8');
+  const header = Buffer.alloc(4);
+  header.writeUInt32BE(body.length, 0);
+  process.stdout.write(Buffer.concat([header, body]));
+}
+
+function runDaemon() {
+  let buffer = Buffer.alloc(0);
+  process.stdin.on('data', (chunk) => {
+    buffer = buffer.length ? Buffer.concat([buffer, chunk]) : chunk;
+    while (buffer.length >= 4) {
+      const length = buffer.readUInt32BE(0);
+      if (buffer.length < 4 + length) break;
+      const body = buffer.subarray(4, 4 + length).toString('utf8');
+      buffer = buffer.subarray(4 + length);
+
+      let request = { id: null };
+      try {
+        request = JSON.parse(body);
+        writeFrame({ id: request.id, functions: extractFunctions(request.source) });
+      } catch (error) {
+        writeFrame({ id: request.id, error: error.message });
+      }
+    }
+  });
+  process.stdin.on('end', () => process.exit(0));
+}
 
-  // Output the result as a JSON string
-  console.log(JSON.stringify({ functions: functions }, null, 2));
+// --- CLI mode ---
+// `node parser.js <file>` parses a file; `node parser.js -` reads source from stdin.
+function runCli(filePath) {
+  try {
+    const code = fs.readFileSync(filePath === '-' ? 0 : filePath, 'utf8');
+    console.log(JSON.stringify({ functions: extractFunctions(code) }));
+  } catch (error) {
+    console.error("Error parsing file:", error.message);
+    process.exit(1);
+  }
+}
+
+if (require.main === module) {
+  const arg = process.argv[2];
+  if (arg === '--daemon') {
+    runDaemon();
+  } else if (arg) {
+    runCli(arg);
+  } else {
+    console.error("Error: Please provide a file path, '-' for stdin, or --daemon.");
+    process.exit(1);
+  }
+}
 
-} catch (error) {
-  console.error("Error parsing file:", error.message);
-  process.exit(1);
-}
\ No newline at end of file
+module.exports = { extractFunctions };
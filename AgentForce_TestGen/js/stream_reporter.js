@@ -0,0 +1,38 @@
+// Jest reporter that reports each test's outcome as soon as it finishes,
+// mirroring app/pytest_events.py:
+//   - on stdout when TESTGEN_STREAM_EVENTS=1, for the streaming runner, as
+//     lines of "@@testgen-event@@" followed by JSON;
+//   - appended to TESTGEN_EVENTS_FILE as plain JSON lines (see
+//     limits.read_events), together with a "started" event per test, so a
+//     run that is killed still shows which tests finished.
+const fs = require('fs');
+
+const EVENT_MARKER = '@@testgen-event@@';
+const STREAM = process.env.TESTGEN_STREAM_EVENTS === '1';
+const EVENTS_FILE = process.env.TESTGEN_EVENTS_FILE;
+
+function record(event) {
+  if (EVENTS_FILE) {
+    fs.appendFileSync(EVENTS_FILE, JSON.stringify(event) + '\n');
+  }
+}
+
+class StreamReporter {
+  onTestCaseStart(test, testCaseStartInfo) {
+    record({ test: testCaseStartInfo.fullName, outcome: 'started' });
+  }
+
+  onTestCaseResult(test, testCaseResult) {
+    const event = {
+      test: testCaseResult.fullName,
+      outcome: testCaseResult.status,
+      duration: (testCaseResult.duration || 0) / 1000,
+    };
+    if (STREAM) {
+      process.stdout.write(`\n${EVENT_MARKER}${JSON.stringify(event)}\n`);
+    }
+    record(event);
+  }
+}
+
+module.exports = StreamReporter;
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from app import main
+from app.admission import BATCH, INTERACTIVE, AdmissionController, AdmissionRejected, llm_call_limit, llm_priority
+from app.cache import LRUCache, TieredCache
+from app.incremental import IncrementalGenerator
+from app.llm_backends import FakeBackend, LLMRequest
+from app.metrics import in_context
+from app.parser import CodeParser
+
+
+class Throttled(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+
+
+def test_interactive_calls_are_admitted_first_and_full_queue_rejects():
+    controller = AdmissionController("test", requests_per_minute=600, max_queue=2)
+    controller.requests.tokens = 0
+    order = []
+
+    def call(name, priority):
+        controller.admit(10, priority)
+        order.append(name)
+
+    threads = [threading.Thread(target=call, args=("batch", BATCH))]
+    threads[0].start()
+    while not controller.queued():
+        time.sleep(0.001)
+    threads += [threading.Thread(target=call, args=(f"interactive{i}", INTERACTIVE)) for i in range(2)]
+    for thread in threads[1:]:
+        thread.start()
+    while controller.queued(INTERACTIVE) < 2:
+        time.sleep(0.001)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit(10, INTERACTIVE)
+    assert rejected.value.retry_after >= 1
+    for thread in threads:
+        thread.join()
+    # 600 RPM: one call every 0.1s, interactive before batch, in arrival order.
+    assert order == ["interactive0", "interactive1", "batch"]
+
+
+def test_throttled_calls_back_off_and_surface_as_429(monkeypatch):
+    backend = FakeBackend()
+    backend.admission = AdmissionController("fake", backoff_base=0.01, max_retries=3)
+    failures = [Throttled(429), Throttled(503)]
+    generate = backend._generate
+
+    def flaky(request, config):
+        if failures:
+            raise failures.pop(0)
+        return generate(request, config)
+
+    monkeypatch.setattr(backend, "_generate", flaky)
+    request = LLMRequest(prompt="p", schema={}, language="python", functions=[("f", ["x"])])
+    assert "test_groups" in backend.generate(request, {})
+    # Halved per throttled attempt, then recovering by a step per success.
+    assert backend.admission.requests.factor == pytest.approx(0.3)
+
+    failures.extend([Throttled(429)] * 3)
+    with pytest.raises(AdmissionRejected):
+        backend.generate(request, {})
+
+    # The API answers 429 with Retry-After while the queue is full.
+    monkeypatch.setattr(main.llm, "_backend", backend)
+    monkeypatch.setattr(backend.admission, "max_queue", 1)
+    backend.admission._waiting.append((INTERACTIVE, -1))
+
+    async def post():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testgen") as client:
+            return await client.post("/generate", data={"language": "python"}, files={"file": ("m.py", b"x = 1\n")})
+
+    response = asyncio.run(post())
+    assert response.status_code == 429 and int(response.headers["retry-after"]) >= 1
+
+
+def test_blocked_batch_calls_do_not_hold_incremental_threads_interactive_calls_need():
+    release, batch_started = threading.Event(), threading.Event()
+
+    class BlockingLLM:
+        model_name, generation_config = "stub", {}
+
+        def generate_function_tests(self, source, function, stats):
+            if function.name.startswith("batch"):
+                batch_started.set()
+                release.wait(10)
+            return '{"test_groups": [{"function_name": "%s", "cases": []}]}' % function.name
+
+    generator = IncrementalGenerator(BlockingLLM(), TieredCache(LRUCache()), max_concurrency=1)
+    parser = CodeParser()
+    batch_code = "def batch_a(x):\n    return x\n\ndef batch_b(x):\n    return x\n"
+
+    def run_batch():
+        with llm_priority(BATCH):
+            generator.generate_python(batch_code, parser.parse_file(batch_code))
+
+    batch = threading.Thread(target=run_batch)
+    batch.start()
+    assert batch_started.wait(5)
+    try:
+        code = "def f(x):\n    return x\n"
+        interactive = threading.Thread(target=generator.generate_python, args=(code, parser.parse_file(code)))
+        interactive.start()
+        interactive.join(5)
+        assert not interactive.is_alive()
+    finally:
+        release.set()
+        batch.join(5)
+
+
+def test_call_limit_bounds_calls_on_every_thread_spawned_inside_it():
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    class SlowBackend(FakeBackend):
+        def _generate(self, request, config):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return "{}"
+
+    backend = SlowBackend()
+    request = LLMRequest("p", {}, "python")
+    with llm_call_limit(2):
+        # Like per-function calls fanned out onto the incremental pool.
+        threads = [threading.Thread(target=in_context(backend.generate, request, {})) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert peak[0] == 2
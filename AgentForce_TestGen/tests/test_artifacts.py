@@ -0,0 +1,59 @@
+import asyncio
+import os
+import time
+
+from app import artifacts, pipeline
+from app.artifacts import ArtifactStore, artifact_job
+from app.run_cache import bypass_run_cache
+
+MODULE = "def double(n):\n    return n * 2\n"
+PLAN = {"test_groups": [{"function_name": "double", "cases": [{"input": "2", "expected_output": 4}]}]}
+
+
+def test_content_is_stored_once_and_evicted_by_age_then_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "_GRACE_SECONDS", 0)
+    store = ArtifactStore(tmp_path, max_bytes=10_000, max_age=3600)
+    suite = b"def test_x():\n    assert True\n" * 50
+    store.put("c", "output.log", os.urandom(6_000))
+    store.put("a", "test_m.py", suite)
+    entry = store.put("b", "runs/1/test_m.py", suite)
+
+    assert entry["encoding"] == "gzip" and entry["stored_bytes"] < entry["size"] == len(suite)
+    assert store.stats()["blobs"] == 2
+    assert store.get("b", "runs/1/test_m.py") == suite and store.get("b", "missing") is None
+
+    store.put("d", "output.log", os.urandom(6_000))
+    report = store.gc()
+    assert report["jobs_evicted"] == 1 and report["blobs_removed"] == 1
+    assert store.manifest("c") is None and store.get("a", "test_m.py") == suite
+
+    stale = store.manifest("a")
+    stale["updated_at"] = time.time() - 7200
+    store._save(store._manifest_path("a"), stale)
+    report = store.gc()
+    assert report["jobs_expired"] == 1 and report["blobs_removed"] == 0
+    assert store.get("b", "runs/1/test_m.py") == suite
+
+
+def test_pipeline_files_its_runs_under_the_job_and_keeps_nothing_in_tests(tmp_path, monkeypatch):
+    store = ArtifactStore(tmp_path)
+    monkeypatch.setattr(pipeline, "artifact_store", store)
+
+    async def plan(content_str, functions, on_group=None, stats=None):
+        return dict(PLAN), {"mode": "whole_file"}
+
+    monkeypatch.setattr(pipeline, "generate_python_plan", plan)
+    before = set(os.listdir(pipeline.py_test_gen.output_dir))
+
+    async def run():
+        with artifact_job("job1"), bypass_run_cache(True):
+            return await pipeline.run_python_pipeline("doubler.py", MODULE)
+
+    result = asyncio.run(run())
+    assert result["job_id"] == "job1"
+    assert result["test_file_path"] == "/artifacts/job1/test_doubler.py"
+    assert set(os.listdir(pipeline.py_test_gen.output_dir)) == before
+
+    files = store.manifest("job1")["files"]
+    assert {"test_doubler.py", "result.json", "runs/1/test_doubler.py", "runs/1/coverage.xml", "runs/1/output.log"} <= set(files)
+    assert b"doubler.double(2)" in store.get("job1", "test_doubler.py")
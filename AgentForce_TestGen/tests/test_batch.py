@@ -0,0 +1,70 @@
+import asyncio
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from app import batch, pipeline
+from app.batch import BatchRunner, extract_archive
+
+HELPERS = "BASE = 2\n\ndef base():\n    return BASE\n"
+MODULE = """from .helpers import base
+from pkg.helpers import BASE
+
+
+def double(n):
+    return n * base()
+
+
+def triple(n):
+    return n * (BASE + 1)
+"""
+
+
+def test_archives_over_the_member_or_size_limit_are_refused_before_extracting(tmp_path, monkeypatch):
+    zip_path = tmp_path / "repo.zip"
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for index in range(3):
+            archive.writestr(f"repo/m{index}.py", "x = 0\n" * 1000)
+    tar_path = tmp_path / "repo.tar.gz"
+    with tarfile.open(tar_path, "w:gz") as archive:
+        for index in range(3):
+            data = b"x = 0\n" * 1000
+            info = tarfile.TarInfo(f"repo/m{index}.py")
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+    for archive_path in (zip_path, tar_path):
+        monkeypatch.setenv("TESTGEN_MAX_ARCHIVE_MEMBERS", "2")
+        with pytest.raises(ValueError, match="entries"):
+            extract_archive(archive_path, tmp_path / "members")
+        monkeypatch.setenv("TESTGEN_MAX_ARCHIVE_MEMBERS", "10")
+        monkeypatch.setenv("TESTGEN_MAX_EXTRACTED_BYTES", "10000")
+        with pytest.raises(ValueError, match="expands"):
+            extract_archive(archive_path, tmp_path / "bytes")
+        monkeypatch.setenv("TESTGEN_MAX_EXTRACTED_BYTES", "100000")
+        assert len(list(extract_archive(archive_path, tmp_path / archive_path.stem).rglob("*.py"))) == 3
+    assert not (tmp_path / "members").exists() and not (tmp_path / "bytes").exists()
+
+
+def test_batch_modules_import_the_rest_of_their_package(tmp_path, monkeypatch):
+    package = tmp_path / "repo" / "pkg"
+    package.mkdir(parents=True)
+    (package / "__init__.py").write_text("")
+    (package / "helpers.py").write_text(HELPERS)
+    (package / "mathy.py").write_text(MODULE)
+
+    async def plan(content, functions, on_group=None, stats=None):
+        return {"test_groups": [
+            {"function_name": "double", "cases": [{"input": "3", "expected_output": 6}]},
+            {"function_name": "triple", "cases": [{"input": "3", "expected_output": 9}]},
+        ]}, {"mode": "whole_file"}
+
+    monkeypatch.setattr(pipeline, "generate_python_plan", plan)
+    assert batch.package_root(package / "mathy.py", tmp_path / "repo") == tmp_path / "repo"
+
+    report = asyncio.run(BatchRunner(parse_workers=1).run(tmp_path / "repo"))
+    mathy = next(f for f in report["files"] if f["file"] == "pkg/mathy.py")
+    assert mathy["status"] == "Success", mathy.get("error") or mathy.get("summary")
+    assert mathy["summary"] == "2 tests passed."
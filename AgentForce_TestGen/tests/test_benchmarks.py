@@ -0,0 +1,19 @@
+import ast
+
+from benchmarks.common import percentile
+from benchmarks.synthetic import js_module, python_module
+
+
+def test_synthetic_python_module_has_requested_size():
+    tree = ast.parse(python_module(50))
+    functions = [n for n in ast.walk(tree) if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    assert len(functions) == 50
+    assert any(isinstance(n, ast.ClassDef) and any(isinstance(c, ast.ClassDef) for c in n.body) for n in tree.body)
+    assert js_module(50) == js_module(50)
+
+
+def test_percentile_uses_nearest_rank():
+    samples = list(range(1, 101))
+    assert percentile(samples, 50) == 50
+    assert percentile(samples, 99) == 99
+    assert percentile([], 95) == 0.0
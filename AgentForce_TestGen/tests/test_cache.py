@@ -0,0 +1,61 @@
+import os
+import time
+
+from app.cache import DiskCache, LRUCache, TieredCache, make_key
+
+
+def test_make_key_is_order_independent_for_dicts():
+    assert make_key("python", {"a": 1, "b": 2}) == make_key("python", {"b": 2, "a": 1})
+    assert make_key("python", "x") != make_key("javascript", "x")
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None
+    assert cache.get("c") == "3"
+
+
+def test_lru_respects_byte_limit():
+    cache = LRUCache(max_entries=10, max_bytes=5)
+    cache.set("a", "123")
+    cache.set("b", "456")
+    assert cache.get("a") is None
+    assert cache.size_bytes == 3
+
+
+def test_disk_entries_expire_after_ttl(tmp_path):
+    disk = DiskCache(tmp_path, ttl=60)
+    disk.set("ab" * 32, "value")
+    assert disk.get("ab" * 32) == "value"
+    path = disk._path("ab" * 32)
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    assert disk.get("ab" * 32) is None
+
+
+def test_disk_eviction_keeps_newest(tmp_path):
+    disk = DiskCache(tmp_path, ttl=0, max_bytes=10, evict_every=1)
+    disk.set("aa" * 32, "12345")
+    old = time.time() - 10
+    os.utime(disk._path("aa" * 32), (old, old))
+    disk.set("bb" * 32, "67890")
+    disk.set("cc" * 32, "abcde")
+    assert disk.get("aa" * 32) is None
+    assert disk.get("cc" * 32) == "abcde"
+
+
+def test_tiered_cache_promotes_disk_hits_and_counts(tmp_path):
+    disk = DiskCache(tmp_path)
+    TieredCache(LRUCache(), disk).set("k" * 64, "v")
+
+    cache = TieredCache(LRUCache(), disk)
+    assert cache.get("k" * 64) == "v"
+    assert cache.get("k" * 64) == "v"
+    assert cache.get("missing") is None
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
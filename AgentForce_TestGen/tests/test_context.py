@@ -0,0 +1,50 @@
+from app.context import JSContext, PythonContext, estimate_tokens
+
+MODULE = '''import math
+from os import path
+RATE = 0.2
+UNUSED = 5
+
+def helper(x):
+    return math.sqrt(x) * RATE
+
+def other(y):
+    return path.join(y)
+
+class Cart:
+    TAX = 3
+
+    @staticmethod
+    def total(x):
+        return helper(x) + Cart.TAX
+''' + "".join(f"\ndef filler{i}(a):\n    return a + {i}\n" for i in range(100))
+
+
+def test_python_context_keeps_only_what_the_function_uses():
+    context = PythonContext(MODULE)
+    sliced = context.build(["Cart.total"], budget=200)
+    for needed in ("import math", "RATE = 0.2", "def helper", "class Cart:", "TAX = 3", "def total"):
+        assert needed in sliced
+    for unused in ("from os import path", "UNUSED", "def other", "def filler"):
+        assert unused not in sliced
+    assert estimate_tokens(sliced) <= 200 < estimate_tokens(MODULE)
+    assert context.build(["Cart.total"], budget=10**6) == MODULE
+
+    names = ["helper", "other", "Cart.total"] + [f"filler{i}" for i in range(100)]
+    packs = context.pack(names, budget=300)
+    assert len(packs) > 1 and [name for pack in packs for name in pack] == names
+
+
+def test_js_context_follows_refs_and_declarations():
+    code = "const LIMIT = 3;\nconst other = 1;\nfunction clamp(x) {\n  return Math.min(x, LIMIT);\n}\n" \
+           "function use(x) {\n  return clamp(x) + 1;\n}\n" + "// padding\n" * 200
+    functions = [
+        {"name": "clamp", "line": 3, "endLine": 5, "refs": ["Math", "min", "x", "LIMIT"],
+         "context": [{"line": 1, "endLine": 1}]},
+        {"name": "use", "line": 6, "endLine": 8, "refs": ["clamp", "x"], "context": []},
+    ]
+    sliced = JSContext(code, functions).build(["use"], budget=100, whole_file=False)
+    assert sliced.splitlines() == [
+        "const LIMIT = 3;", "// ...", "function clamp(x) {", "  return Math.min(x, LIMIT);", "}",
+        "function use(x) {", "  return clamp(x) + 1;", "}", "// ...",
+    ]
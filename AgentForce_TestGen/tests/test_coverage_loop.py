@@ -0,0 +1,55 @@
+import asyncio
+
+from app.coverage_loop import CoverageGoal, map_lines_to_functions, merge_groups, run_coverage_rounds
+from app.llm import GenerationStats
+
+
+def test_lines_map_to_the_innermost_function_and_merges_dedupe_inputs():
+    ranges = [("Cart.make", 10, 20), ("Cart.make.inner", 12, 14), ("helper", 30, 31)]
+    assert map_lines_to_functions([11, 13, 25, 31], ranges) == {
+        "Cart.make": [11], "Cart.make.inner": [13], "helper": [31]
+    }
+
+    plan = {
+        "imports": "const { add } = require('../examples/mod');",
+        "tests": [{"describe": "add", "cases": [{"it": "a", "function_to_test": "add", "input": "1, 2"}]}],
+    }
+    new_groups = [
+        {"describe": "add", "cases": [{"it": "b", "input": "1, 2"}, {"it": "c", "input": "-1, 1"}]},
+        {"describe": "Shape.area", "cases": [{"it": "d", "input": "2"}]},
+    ]
+    merged, added = merge_groups(plan, "javascript", new_groups)
+    assert added == 2
+    assert [len(g["cases"]) for g in merged["tests"]] == [2, 1]
+    assert merged["imports"] == "const { add, Shape } = require('../examples/mod');"
+    assert len(plan["tests"][0]["cases"]) == 1
+
+
+def test_rounds_stop_at_the_target_or_the_token_budget():
+    functions = [type("F", (), {"name": "f", "lineno": 1, "end_lineno": 9})()]
+    coverage = iter([60.0, 95.0])
+
+    async def generate_gaps(gaps):
+        stats.record(prompt_tokens=100)
+        return [{"function_name": "f", "cases": [{"input": str(len(gaps[0][1])), "expected_output": 0}]}]
+
+    async def execute(plan):
+        return None, {"coverage_percentage": next(coverage), "missing_lines": {"m.py": [3]}}
+
+    stats = GenerationStats()
+    start = {"coverage_percentage": 40.0, "missing_lines": {"m.py": [3, 5, 7]}}
+    plan, _, result, report = asyncio.run(run_coverage_rounds(
+        CoverageGoal(target=90), "python", "m", functions, {"test_groups": []}, None, start,
+        generate_gaps, execute, stats
+    ))
+    assert [r["coverage_percentage"] for r in report["rounds"]] == [60.0, 95.0]
+    assert report["stopped"] == "target_reached" and result["coverage_percentage"] == 95.0
+    assert len(plan["test_groups"][0]["cases"]) == 2
+
+    coverage = iter([60.0])
+    stats = GenerationStats()
+    _, _, result, report = asyncio.run(run_coverage_rounds(
+        CoverageGoal(target=90, token_budget=50), "python", "m", functions, {"test_groups": []}, None, start,
+        generate_gaps, execute, stats
+    ))
+    assert report["stopped"] == "token_budget" and len(report["rounds"]) == 1
@@ -0,0 +1,41 @@
+from app import test_generator
+from app.js_test_generator import JSTestGenerator
+
+PLAN = {"test_groups": [
+    {"function_name": "double", "cases": [{"input": str(i), "expected_output": i * 2} for i in range(3)]},
+    {"function_name": "half", "cases": [{"input": "1", "expected_output": 0.5}]},
+    {"function_name": "greet", "cases": [{"input": "'abc', 2", "expected_output": "abcabc"}, {"input": "abc", "expected_output": ""}]},
+]}
+
+
+def test_large_groups_become_parametrized_tables(tmp_path):
+    generator = test_generator.TestGenerator(output_dir=str(tmp_path), table_min_cases=3)
+    path = generator.generate_test_file("mod", PLAN)
+    source = open(path).read()
+
+    assert source.count("def test_") == 3
+    assert "    ((0,), 0),\n" in source
+    assert "], ids=range(1, 4))\ndef test_mod_double(args, expected):\n" in source
+    assert "    result = mod.double(*args)\n" in source
+    assert "def test_mod_4():" in source and "pytest.approx(0.5)" in source
+    # An input is an argument list in tables and single tests alike; "abc" is not a literal.
+    assert "    result = mod.greet('abc', 2)\n" in source
+    assert generator.test_names("mod", PLAN) == {
+        "test_mod_double[1]": [(0, 0)], "test_mod_double[2]": [(0, 1)], "test_mod_double[3]": [(0, 2)],
+        "test_mod_4": [(1, 0)], "test_mod_5": [(2, 0)],
+    }
+    table = test_generator.TestGenerator(output_dir=str(tmp_path), table_min_cases=1).render("mod", PLAN)
+    assert "    (('abc', 2), 'abcabc'),\n" in table
+
+    compile(source, path, "exec")
+
+
+def test_js_tables_keep_the_it_titles(tmp_path):
+    plan = {"imports": "const { add } = require('x');", "tests": [{"describe": "add", "cases": [
+        {"it": f"adds {i}", "function_to_test": "add", "input": f"{i}, 1", "expected_output": i + 1} for i in range(2)
+    ]}]}
+    source = open(JSTestGenerator(table_min_cases=2).generate_test_file("mod", plan, tmp_path)).read()
+    assert "    [`adds 1`, [1, 1], 2],\n" in source
+    assert "])('%s', (title, args, expected) => {\n    expect(add(...args)).toEqual(expected);" in source
+    small = open(JSTestGenerator(table_min_cases=3).generate_test_file("mod", plan, tmp_path)).read()
+    assert "it('adds 0', () => {\n    expect(add(0, 1)).toBe(1);" in small
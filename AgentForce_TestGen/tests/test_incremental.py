@@ -0,0 +1,73 @@
+import threading
+import time
+
+from app.cache import LRUCache, TieredCache
+from app.incremental import IncrementalGenerator
+from app.parser import CodeParser
+
+CODE = """def helper(x):
+    return x + 1
+
+
+def uses_helper(x):
+    return helper(x) * 2
+
+
+def alone(x):
+    return x - 1
+"""
+
+
+class RecordingLLM:
+    model_name, generation_config = "stub", {}
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.prompted = []
+        self.lock = threading.Lock()
+        self.running = self.peak = 0
+
+    def generate_function_tests(self, source, function, stats):
+        with self.lock:
+            self.prompted.append(function.name)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        return '{"test_groups": [{"function_name": "%s", "cases": [{"input": "1", "expected_output": 0}]}]}' % function.name
+
+
+def generate(generator, code):
+    return generator.generate_python(code, CodeParser(cache_size=0).parse_file(code))
+
+
+def test_only_changed_functions_and_callers_of_changed_helpers_are_prompted_again():
+    llm = RecordingLLM()
+    generator = IncrementalGenerator(llm, TieredCache(LRUCache()))
+    plan, stats = generate(generator, CODE)
+    assert [g["function_name"] for g in plan["test_groups"]] == ["helper", "uses_helper", "alone"]
+    assert stats["generated"] == 3
+
+    # Formatting and comments do not count as a change.
+    llm.prompted.clear()
+    _, stats = generate(generator, CODE.replace("return x - 1", "return x  -  1  # same"))
+    assert llm.prompted == [] and stats["reused"] == 3
+
+    llm.prompted.clear()
+    plan, stats = generate(generator, CODE.replace("return x - 1", "return x - 2"))
+    assert llm.prompted == ["alone"] and (stats["reused"], stats["generated"]) == (2, 1)
+    assert [g["function_name"] for g in plan["test_groups"]] == ["helper", "uses_helper", "alone"]
+
+    # A changed helper is part of its caller's prompt, so the caller is redone too.
+    llm.prompted.clear()
+    _, stats = generate(generator, CODE.replace("return x + 1", "return x + 3"))
+    assert sorted(llm.prompted) == ["helper", "uses_helper"] and stats["reused"] == 1
+
+
+def test_no_more_than_max_concurrency_functions_are_prompted_at_once():
+    code = "".join(f"def f{i}(x):\n    return x + {i}\n\n\n" for i in range(8))
+    llm = RecordingLLM(delay=0.05)
+    _, stats = generate(IncrementalGenerator(llm, TieredCache(LRUCache()), max_concurrency=3), code)
+    assert stats["generated"] == 8
+    assert llm.peak == 3
@@ -0,0 +1,84 @@
+import asyncio
+
+import httpx
+
+from app import main, pipeline
+from app.jobs import COMPLETED, FAILED, QUEUED, RUNNING, JobManager
+from app.llm_backends import FakeBackend
+
+SOURCE = b"def add(a, b):\n    return a + b\n"
+
+
+def test_jobs_are_queued_at_once_and_polled_until_they_finish(monkeypatch):
+    monkeypatch.setattr(pipeline.llm, "_backend", FakeBackend())
+    monkeypatch.setattr(pipeline.llm, "cache", None)
+    opened = asyncio.Event()
+    handler = main.job_manager.handler
+
+    async def gated(language, filename, content):
+        await opened.wait()
+        return await handler(language, filename, content)
+
+    monkeypatch.setattr(main.job_manager, "handler", gated)
+
+    async def poll(client, job_id):
+        for _ in range(600):
+            job = (await client.get(f"/jobs/{job_id}")).json()
+            if job["status"] in (COMPLETED, FAILED):
+                return job
+            await asyncio.sleep(0.05)
+        raise AssertionError(f"job {job_id} never finished")
+
+    async def run():
+        await main.job_manager.start()
+        transport = httpx.ASGITransport(app=main.app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://testgen") as client:
+                files = {"file": ("calc.py", SOURCE)}
+                submitted = await client.post("/jobs", data={"language": "python"}, files=files)
+                broken = await client.post("/jobs", data={"language": "python"}, files={"file": ("bad.py", b"def f(:\n")})
+                running = (await client.get(f"/jobs/{submitted.json()['job_id']}")).json()
+                opened.set()
+                done = await poll(client, submitted.json()["job_id"])
+                failed = await poll(client, broken.json()["job_id"])
+                missing = await client.get("/jobs/unknown")
+        finally:
+            await main.job_manager.stop()
+        return submitted, running, done, failed, missing
+
+    submitted, running, done, failed, missing = asyncio.run(run())
+    # POST answers before the pipeline has started, let alone finished.
+    assert submitted.status_code == 202 and submitted.json()["status"] == QUEUED
+    assert running["status"] == RUNNING and running["result"] is None
+    assert done["status"] == COMPLETED and done["result"]["coverage_report"]["coverage_percentage"] == 100.0
+    assert failed["status"] == FAILED and failed["error"]
+    assert missing.status_code == 404
+
+
+def test_workers_bound_concurrency_and_old_finished_jobs_are_pruned():
+    active, peak = 0, 0
+
+    async def handler(language, filename, content):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+        return {"file": filename}
+
+    async def run():
+        manager = JobManager(handler, num_workers=2, max_finished_jobs=3)
+        await manager.start()
+        first = [manager.submit("python", f"m{i}.py", "") for i in range(6)]
+        await manager._queue.join()
+        last = manager.submit("python", "last.py", "")
+        await manager._queue.join()
+        await manager.stop()
+        return manager, first, last
+
+    manager, first, last = asyncio.run(run())
+    assert peak == 2
+    assert all(job.status == COMPLETED and job.content is None for job in first + [last])
+    # Pruning happens on submit: the three oldest finished jobs were dropped.
+    assert [manager.get(job.id) for job in first[:3]] == [None] * 3
+    assert set(manager.jobs) == {job.id for job in first[3:]} | {last.id}
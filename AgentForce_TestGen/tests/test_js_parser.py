@@ -0,0 +1,52 @@
+import asyncio
+import sys
+import time
+
+import pytest
+
+from app.js_parser import JSParserPool
+
+# Speaks the daemon's framing; sources starting with "slow" are answered late.
+FAKE_WORKER = '''
+import json, struct, sys, time
+while True:
+    header = sys.stdin.buffer.read(4)
+    if len(header) < 4:
+        break
+    request = json.loads(sys.stdin.buffer.read(struct.unpack(">I", header)[0]))
+    if request["source"].startswith("slow"):
+        time.sleep(0.5)
+    body = json.dumps({"id": request["id"], "functions": [{"name": request["source"]}]}).encode()
+    sys.stdout.buffer.write(struct.pack(">I", len(body)) + body)
+    sys.stdout.buffer.flush()
+'''
+
+
+@pytest.fixture
+def pool(tmp_path):
+    script = tmp_path / "fake_worker.py"
+    script.write_text(FAKE_WORKER)
+    pool = JSParserPool(size=1, timeout=0.2, command=[sys.executable, str(script)])
+    pool.start()
+    yield pool
+    pool.stop()
+
+
+def test_a_late_answer_to_a_timed_out_request_leaves_the_worker_usable(pool):
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(pool.parse_async("slow"))
+    worker = pool._workers[0]
+    assert worker.load == 0
+
+    time.sleep(0.5)  # the late answer arrives and must be dropped
+    assert worker.alive
+    assert asyncio.run(pool.parse_async("fast")) == [{"name": "fast"}]
+
+
+def test_sync_parse_timeouts_are_forgotten_as_well(pool):
+    with pytest.raises(TimeoutError):
+        pool.parse("slow")
+    assert pool._workers[0].load == 0
+
+    time.sleep(0.5)
+    assert pool.parse("fast") == [{"name": "fast"}]
@@ -0,0 +1,41 @@
+from app.json_repair import repair_json, salvage_items
+from app.llm import PY_TEST_SCHEMA, GenerationStats, LLMWrapper
+from app.llm_backends import LLMRequest
+
+
+def test_repair_strips_fences_and_trailing_commas():
+    data, repaired = repair_json('```json\n{"test_groups": [{"function_name": "f", "cases": [],},]}\n```')
+    assert repaired
+    assert data == {"test_groups": [{"function_name": "f", "cases": []}]}
+
+    # Commas inside string literals are left alone.
+    data, _ = repair_json('{"test_groups": [{"function_name": "f", "cases": [{"input": "[1, ]", "expected_output": "{a, }"},]},]}')
+    assert data["test_groups"][0]["cases"] == [{"input": "[1, ]", "expected_output": "{a, }"}]
+
+
+def test_repair_closes_truncated_output_at_last_complete_value():
+    raw = '{"test_groups": [{"function_name": "f", "cases": [{"input": "1", "expected_output": 2}]}, {"function_name": "g", "ca'
+    data, repaired = repair_json(raw)
+    assert repaired
+    assert data["test_groups"][0]["function_name"] == "f"
+
+
+def test_salvage_keeps_only_valid_groups():
+    item_schema = PY_TEST_SCHEMA["properties"]["test_groups"]["items"]
+    data = {"test_groups": [{"function_name": "f", "cases": []}, {"function_name": "g"}]}
+    valid, dropped = salvage_items(data, "test_groups", item_schema)
+    assert [g["function_name"] for g in valid] == ["f"]
+    assert dropped == 1
+    assert repair_json("no json here") == (None, True)
+
+
+def test_stats_count_repaired_and_salvaged_only_responses_apart(monkeypatch):
+    monkeypatch.setenv("TESTGEN_LLM_BACKEND", "fake")
+    llm = LLMWrapper(cache=None)
+    request = LLMRequest("prompt", PY_TEST_SCHEMA, "python", [("f", ["x"]), ("g", ["x"])])
+    stats = GenerationStats()
+    # Parses as it is, but g's group is invalid and dropped; the retry needs a fence stripped.
+    salvaged_only = '{"test_groups": [{"function_name": "f", "cases": []}, {"function_name": "g"}]}'
+    monkeypatch.setattr(llm, "_call_model", lambda request: '```json\n{"test_groups": [{"function_name": "g", "cases": [],},]}\n```')
+    llm._generate_and_validate(request, PY_TEST_SCHEMA, ["f", "g"], stats=stats, first_response=salvaged_only)
+    assert (stats.salvaged, stats.repaired, stats.salvaged_groups) == (1, 1, 2)
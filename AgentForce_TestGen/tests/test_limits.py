@@ -0,0 +1,45 @@
+import time
+
+from app.limits import CappedOutput, RunLimits
+from app.runner import run_tests_and_get_coverage
+from app.workspace import Workspace
+
+MODULE = "def spin(n):\n    while n:\n        pass\n    return n\n"
+TESTS = """from examples import spinner
+def test_fast():
+    assert spinner.spin(0) == 0
+def test_hangs():
+    spinner.spin(1)
+def test_after():
+    assert spinner.spin(0) == 0
+"""
+
+
+def test_capped_output_keeps_head_and_tail():
+    output = CappedOutput(10)
+    for chunk in (b"abc", b"defgh", b"ijklmnop"):
+        output.write(chunk)
+    value = output.getvalue()
+    assert value.startswith(b"abcde") and value.endswith(b"lmnop")
+    assert output.dropped == 6 and b"[6 bytes of output dropped]" in value
+
+
+def test_hanging_tests_fail_alone_or_stop_the_run_with_partial_results():
+    with Workspace("spinner", "python", MODULE) as workspace:
+        test_file = workspace.tests_dir / "test_spinner.py"
+        test_file.write_text(TESTS)
+
+        result = run_tests_and_get_coverage(
+            str(test_file), "spinner", workspace, limits=RunLimits(test_timeout=0.5, run_timeout=30), use_cache=False
+        )
+        assert result["status"] == "Tests Failed" and "1 failed, 2 passed" in result["full_log"]
+        assert "time limit" in result["full_log"]
+
+        started = time.perf_counter()
+        result = run_tests_and_get_coverage(
+            str(test_file), "spinner", workspace, limits=RunLimits(test_timeout=0, run_timeout=1), use_cache=False
+        )
+        assert time.perf_counter() - started < 10
+        assert result["status"] == "Timed Out"
+        assert [t["test"].split("::")[-1] for t in result["tests"]] == ["test_fast"]
+        assert result["unfinished_test"].endswith("::test_hangs")
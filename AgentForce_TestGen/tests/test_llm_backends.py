@@ -0,0 +1,35 @@
+import ast
+import json
+
+from app.llm import LLMWrapper, PY_TEST_SCHEMA
+from app.llm_backends import FakeBackend, LLMRequest, create_backend
+from app.parser import CodeParser
+from app import test_generator
+from jsonschema import validate
+
+
+def test_fake_backend_is_deterministic(tmp_path):
+    request = LLMRequest("prompt", PY_TEST_SCHEMA, "python", [("add", ["a", "b"])])
+    first = FakeBackend().generate(request, {})
+    assert first == FakeBackend().generate(request, {})
+    validate(instance=json.loads(first), schema=PY_TEST_SCHEMA)
+
+    # Every parameter gets its own argument, and only parameterless functions are called with none.
+    request = LLMRequest("prompt", PY_TEST_SCHEMA, "python", [("add", ["a", "b"]), ("now", []), ("total", ["*items"])])
+    source = test_generator.TestGenerator(output_dir=str(tmp_path), table_min_cases=0).render("mod", json.loads(FakeBackend().generate(request, {})))
+    calls = [node for node in ast.walk(ast.parse(source)) if isinstance(node, ast.Call) and ast.unparse(node.func).startswith("mod.")]
+    assert len(calls) == 9
+    assert {(ast.unparse(call.func), len(call.args)) for call in calls} == {("mod.add", 2), ("mod.now", 0), ("mod.total", 0)}
+
+
+def test_wrapper_uses_the_configured_backend_lazily(monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    monkeypatch.setenv("TESTGEN_LLM_BACKEND", "fake")
+    monkeypatch.setenv("TESTGEN_LLM_CACHE", "0")
+    llm = LLMWrapper(cache=None)
+    assert llm._backend is None
+    code = "def add(a, b):\n    return a + b\n"
+    groups = json.loads(llm.generate_tests(code, CodeParser().parse_file(code)))["test_groups"]
+    assert [g["function_name"] for g in groups] == ["add"]
+    assert isinstance(llm.backend, FakeBackend)
+    assert create_backend("openai").max_concurrency >= 1
@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from app.metrics import Registry, collect_timings, in_context, span
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("demo_seconds", "Demo.", ["stage"], buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, stage="parse")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE demo_seconds histogram" in lines
+    assert 'demo_seconds_bucket{stage="parse",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{stage="parse",le="1"} 2' in lines
+    assert 'demo_seconds_bucket{stage="parse",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{stage="parse"} 3' in lines
+
+
+def test_spans_on_executor_threads_reach_the_request():
+    def work():
+        with span("test.worker"):
+            pass
+
+    with collect_timings() as timings, ThreadPoolExecutor(2) as executor:
+        with span("test.outer"):
+            list(executor.map(lambda f: f(), [in_context(work), in_context(work)]))
+        executor.submit(work).result()  # No copied context: not attributed.
+
+    stages = timings.to_dict()["stages"]
+    assert stages["test.outer"]["count"] == 1
+    assert stages["test.worker"]["count"] == 2
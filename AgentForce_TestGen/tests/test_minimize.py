@@ -0,0 +1,61 @@
+from app.js_test_generator import JSTestGenerator
+from app.minimize import dedupe_plan, minimize_plan, select_tests
+from app import test_generator
+
+
+def test_dedupe_normalizes_inputs_and_expected_outputs():
+    plan = {"test_groups": [
+        {"function_name": "add", "cases": [
+            {"input": "1, 2", "expected_output": 3},
+            {"input": "1 ,2", "expected_output": 3},
+            {"input": "(1, 2)", "expected_output": 3},
+            {"input": "1, 2", "expected_output": 4},
+        ]},
+        {"function_name": "sub", "cases": [{"input": "1, 2", "expected_output": 3}]},
+    ]}
+    deduped, removed = dedupe_plan("python", plan)
+    assert removed == 1
+    assert [len(g["cases"]) for g in deduped["test_groups"]] == [3, 1]
+
+    js_plan = {"tests": [{"describe": "add", "cases": [
+        {"it": "a", "function_to_test": "add", "input": "1,  2", "expected_output": {"b": 1, "a": 2}},
+        {"it": "b", "function_to_test": "add", "input": "1 , 2", "expected_output": {"a": 2, "b": 1}},
+    ]}]}
+    assert dedupe_plan("javascript", js_plan)[1] == 1
+
+
+def test_greedy_selection_keeps_coverage_and_prefers_fast_tests(tmp_path):
+    coverage = {
+        "t1": ["m.py:1", "m.py:2"],
+        "t2": ["m.py:1", "m.py:2"],
+        "t3": ["m.py:1", "m.py:3", "m.py:1>3"],
+        "t4": [],
+    }
+    durations = {"t1": 0.5, "t2": 0.1, "t3": 0.2, "t4": 0.1}
+    assert select_tests(coverage, durations) == ["t3", "t2"]
+
+    plan = {"test_groups": [{"function_name": "f", "cases": [
+        {"input": str(i), "expected_output": i} for i in range(4)
+    ]}]}
+    names = test_generator.TestGenerator(output_dir=str(tmp_path)).test_names("m", plan)
+    assert names == {f"test_m_{i + 1}": [(0, i)] for i in range(4)}
+    result = {"test_coverage": {f"test_m_{i + 1}": coverage[f"t{i + 1}"] for i in range(4)},
+              "test_durations": {f"test_m_{i + 1}": durations[f"t{i + 1}"] for i in range(4)},
+              "test_outcomes": {f"test_m_{i + 1}": "passed" for i in range(4)}}
+    minimized, report = minimize_plan("python", plan, names, result, duplicates_removed=2)
+    assert [c["input"] for c in minimized["test_groups"][0]["cases"]] == ["1", "2"]
+    assert report["tests_before"] == 4 and report["tests_after"] == 2
+    assert report["runtime_saved_s"] == 0.6 and report["duplicates_removed"] == 2
+
+    # A failing test is always kept; the set cover runs over the passing ones.
+    result["test_outcomes"]["test_m_3"] = "failed"
+    result["test_outcomes"]["test_m_4"] = "error"
+    minimized, report = minimize_plan("python", plan, names, result)
+    assert [c["input"] for c in minimized["test_groups"][0]["cases"]] == ["1", "2", "3"]
+    assert report["failing_kept"] == 2 and report["tests_after"] == 3
+
+    js_plan = {"tests": [{"describe": "f", "cases": [
+        {"it": "x", "function_to_test": "f", "input": "1", "expected_output": 1},
+        {"it": "x", "function_to_test": "f", "input": "2", "expected_output": 2},
+    ]}]}
+    assert JSTestGenerator().test_names("m", js_plan) == {"f x": [(0, 0), (0, 1)]}
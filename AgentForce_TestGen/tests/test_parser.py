@@ -0,0 +1,72 @@
+from app.parser import CodeParser
+
+SOURCE = '''
+import math
+from . import sibling
+
+def helper(x):
+    return x * 2
+
+async def fetch(url: str, retries: int = 3, *, timeout=1.5) -> dict:
+    for attempt in range(retries):
+        for _ in range(2):
+            helper(attempt)
+    return {}
+
+class Cart:
+    def total(self, items):
+        return sum(self.price(i) for i in items)
+
+    def price(self, item):
+        return helper(item)
+
+    @staticmethod
+    def make(n=0):
+        return [[i * j for j in range(n)] for i in range(n)]
+
+def outer(v):
+    def inner(w):
+        return math.floor(w)
+    return inner(v)
+'''
+
+
+def test_parse_module_collects_everything_in_one_pass():
+    module = CodeParser(cache_size=0).parse_module(SOURCE)
+    functions = {f.name: f for f in module.functions}
+
+    assert module.imports == ["math", ".sibling"]
+    assert [(c.name, c.methods) for c in module.classes] == [("Cart", ["total", "price", "make"])]
+    assert [(f.name, f.kind) for f in module.functions] == [
+        ("helper", "function"), ("fetch", "function"), ("Cart.total", "method"),
+        ("Cart.price", "method"), ("Cart.make", "staticmethod"), ("outer", "function"), ("outer.inner", "nested"),
+    ]
+
+    fetch = functions["fetch"]
+    assert fetch.is_async and fetch.args == ["url", "retries"] and fetch.kwonlyargs == ["timeout"]
+    assert fetch.defaults == {"retries": "3", "timeout": "1.5"}
+    assert fetch.annotations == {"url": "str", "retries": "int", "return": "dict"}
+    assert (fetch.loop_depth, fetch.complexity) == (2, "O(n^2)")
+    assert functions["Cart.total"].args == ["items"]
+    assert functions["Cart.make"].loop_depth == 2
+
+    graph = module.call_graph()
+    assert graph["Cart.total"] == ["Cart.price"]
+    assert graph["Cart.price"] == ["helper"]
+    assert graph["outer"] == ["outer.inner"]
+
+
+def test_parse_file_returns_callable_targets_and_caches_by_content():
+    parser = CodeParser(cache_size=2)
+    names = [f.name for f in parser.parse_file(SOURCE)]
+    assert names == ["helper", "fetch", "Cart.make", "outer"]
+    assert len(parser._cache) == 1
+
+    # A cache hit is a copy: editing one result changes neither the cache nor other results.
+    first, second = parser.parse_module(SOURCE), parser.parse_module(SOURCE)
+    assert first == second and first is not second and len(parser._cache) == 1
+    first.functions[0].imports.append("sys")
+    first.functions.clear()
+    assert parser.parse_module(SOURCE) == second and "sys" not in second.functions[1].imports
+    parser.parse_module(SOURCE + "\n")
+    assert len(parser._cache) == 2
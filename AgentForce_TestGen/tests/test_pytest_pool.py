@@ -0,0 +1,69 @@
+import pytest
+
+from app import runner
+from app.limits import RunLimits
+from app.pytest_pool import PytestForkServer
+from app.workspace import Workspace
+
+MODULE = "def double(n):\n    return n * 2\n"
+TESTS = """from examples import doubler
+def test_double():
+    assert doubler.double(2) == 4
+"""
+HANGS = TESTS + """
+def test_hangs():
+    while True:
+        pass
+"""
+# The first run kills the warm worker it was forked from; the rerun passes.
+KILLS_WORKER = """import os, signal
+from pathlib import Path
+from examples import doubler
+def test_double():
+    flag = Path(__file__).with_name("killed")
+    if not flag.exists():
+        flag.write_text("")
+        os.kill(os.getppid(), signal.SIGKILL)
+        os._exit(1)
+    assert doubler.double(2) == 4
+"""
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    if not PytestForkServer.supported():
+        pytest.skip("the fork server needs os.fork")
+    pool = PytestForkServer(size=1)
+    pool.start()
+    monkeypatch.setattr(runner, "pytest_pool", pool)
+    yield pool
+    pool.stop()
+
+
+def run(workspace, source, limits=None):
+    test_file = workspace.tests_dir / "test_doubler.py"
+    test_file.write_text(source)
+    return runner.run_tests_and_get_coverage(str(test_file), "doubler", workspace, limits=limits, use_cache=False)
+
+
+def test_suites_run_on_the_warm_worker_and_hung_runs_are_killed(pool):
+    with Workspace("doubler", "python", MODULE) as workspace:
+        result = run(workspace, TESTS)
+        assert result["status"] == "Success" and result["coverage_percentage"] == 100.0
+
+        result = run(workspace, HANGS, RunLimits(test_timeout=0, run_timeout=1))
+        assert result["status"] == "Timed Out"
+
+        # The watchdog killed the forked run, not the worker.
+        assert run(workspace, TESTS)["status"] == "Success"
+
+
+def test_a_worker_killed_mid_run_is_replaced_and_the_run_falls_back_to_a_subprocess(pool):
+    worker = pool._processes[0]
+    with Workspace("doubler", "python", MODULE) as workspace:
+        result = run(workspace, KILLS_WORKER)
+        assert result["status"] == "Success", result.get("full_log")
+        assert (workspace.tests_dir / "killed").exists()
+
+    assert not worker.is_alive()
+    assert pool._processes and pool._processes[0] is not worker and pool._processes[0].is_alive()
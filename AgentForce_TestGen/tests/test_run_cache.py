@@ -0,0 +1,48 @@
+from app import runner
+from app.cache import LRUCache, TieredCache
+from app.limits import RunLimits
+from app.run_cache import RunCache, bypass_run_cache
+from app.workspace import Workspace
+
+MODULE = "def double(n):\n    return n * 2\n"
+TESTS = """from examples import doubler
+def test_double():
+    assert doubler.double(2) == 4
+"""
+
+
+def test_key_changes_with_test_file_and_limits(tmp_path):
+    cache = RunCache(TieredCache(LRUCache()))
+    module, tests = tmp_path / "m.py", tmp_path / "t.py"
+    module.write_text(MODULE)
+    tests.write_text(TESTS)
+
+    def key(limits=RunLimits()):
+        return cache.key("python", "m", module, tests, limits, False, [])
+
+    first = key()
+    assert key() == first
+    assert key(RunLimits(test_timeout=1)) != first
+    tests.write_text(TESTS + "\n# changed\n")
+    assert key() != first
+
+
+def test_identical_run_is_served_from_cache_unless_bypassed(monkeypatch):
+    cache = RunCache(TieredCache(LRUCache()))
+    monkeypatch.setattr(runner, "run_cache", cache)
+    with Workspace("doubler", "python", MODULE) as workspace:
+        test_file = workspace.tests_dir / "test_doubler.py"
+        test_file.write_text(TESTS)
+
+        first = runner.run_tests_and_get_coverage(str(test_file), "doubler", workspace)
+        assert first["status"] == "Success" and "cached" not in first
+        workspace.coverage_xml.unlink()
+
+        second = runner.run_tests_and_get_coverage(str(test_file), "doubler", workspace)
+        assert second["cached"] is True
+        assert second["coverage_percentage"] == first["coverage_percentage"]
+        assert workspace.coverage_xml.exists()
+
+        with bypass_run_cache():
+            third = runner.run_tests_and_get_coverage(str(test_file), "doubler", workspace)
+        assert "cached" not in third
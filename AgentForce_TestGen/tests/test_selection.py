@@ -0,0 +1,83 @@
+from app import runner, selection
+from app.cache import LRUCache, TieredCache
+from app.run_cache import RunCache
+from app.selection import ImpactStore, js_snapshot, python_snapshot
+from app.workspace import Workspace
+
+MODULE = """LIMIT = 10
+
+def double(n):
+    return n * 2
+
+def half(n):
+    if n % 2:
+        raise ValueError("odd")
+    return n // 2
+"""
+TESTS = """import pytest
+from examples import mathy
+
+@pytest.mark.parametrize("value, expected", [(1, 2), (2, 4), (3, 6)], ids=range(0, 3))
+def test_mathy_double(value, expected):
+    assert mathy.double(value) == expected
+
+def test_mathy_3():
+    assert mathy.half(4) == 2
+
+def test_mathy_4():
+    with pytest.raises(ValueError):
+        mathy.half(3)
+"""
+
+
+def test_snapshots_ignore_renumbering_and_moved_functions():
+    before = python_snapshot(MODULE, TESTS)
+    after = python_snapshot("# moved\n\n" + MODULE, TESTS.replace("test_mathy_3", "test_mathy_7"))
+    assert [u.hash for u in before.units] == [u.hash for u in after.units]
+    assert before.units[0].cases == [f"test_mathy_double[{i}]" for i in range(3)]
+    assert before.functions == after.functions and before.header == after.header
+    assert before.header == python_snapshot(MODULE.replace("n // 2", "n >> 1"), TESTS).header
+    assert before.header != python_snapshot(MODULE.replace("10", "11"), TESTS).header
+    assert after.function_at(after.ranges["half"][0] + 1) == "half"
+
+    js = js_snapshot(
+        "function a(x) {\n  return x;\n}\n",
+        [{"name": "a", "line": 1, "endLine": 3}],
+        "const { a } = require('../examples/m');\n\ndescribe('a', () => {\n  it('keeps it\\'s value', () => {\n"
+        "    expect(a(1)).toBe(1);\n  });\n});\n"
+    )
+    assert js.units[0].cases == ["a keeps it's value"] and js.ranges == {"a": (1, 3)}
+
+
+def test_only_tests_of_changed_functions_rerun(monkeypatch):
+    monkeypatch.setattr(runner, "run_cache", RunCache(None))
+    monkeypatch.setattr(selection, "impact_store", ImpactStore(TieredCache(LRUCache())))
+
+    def run(source, use_cache=True):
+        with Workspace("mathy", "python", source) as workspace:
+            test_file = workspace.tests_dir / "test_mathy.py"
+            test_file.write_text(TESTS)
+            return runner.run_tests_and_get_coverage(str(test_file), "mathy", workspace, use_cache=use_cache)
+
+    first = run(MODULE)
+    assert first["status"] == "Success" and "selection" not in first and "test_coverage" not in first
+
+    edited = MODULE.replace("return n // 2", "return n >> 1")
+    second = run(edited)
+    assert second["selection"] == {
+        "changed_functions": ["half"], "run_tests": ["test_mathy_3", "test_mathy_4"], "carried_tests": 3
+    }
+    assert "2 passed, 3 deselected" in second["full_log"]
+    assert second["summary"] == first["summary"] == "5 tests passed."
+    assert second["coverage_percentage"] == first["coverage_percentage"] == 100.0
+    assert second["lines"] == first["lines"] and second["missing_lines"] == {}
+
+    unchanged = run(edited)
+    assert unchanged["selection"]["run_tests"] == [] and unchanged["summary"] == "5 tests passed."
+
+    # Another module uploaded under the same name shares no function and reuses nothing,
+    # and does not displace the record of the edited one.
+    other = MODULE.replace("n * 2", "n + n").replace('"odd"', '"odd number"')
+    assert "selection" not in run(other)
+    assert run(edited)["selection"]["run_tests"] == []
+    assert "selection" not in run(edited, use_cache=False)
@@ -0,0 +1,87 @@
+from app import runner
+from app.sharding import DurationStore, balance, count_js_tests, count_python_tests, js_shard_sources, shard_count
+from app.cache import LRUCache, TieredCache
+from app.workspace import Workspace
+
+MODULE = """def double(n):
+    return n * 2
+
+def half(n):
+    if n % 2:
+        raise ValueError("odd")
+    return n // 2
+"""
+TESTS = """import pytest
+from examples import mathy
+
+@pytest.mark.parametrize("n, expected", [(1, 2), (2, 4), (3, 6)])
+def test_double(n, expected):
+    assert mathy.double(n) == expected
+
+def test_half():
+    assert mathy.half(4) == 2
+
+def test_half_odd():
+    with pytest.raises(ValueError):
+        mathy.half(3)
+"""
+JS_TESTS = """const { a, b } = require('../examples/m');
+
+describe('a', () => {
+  it('works', () => {
+    expect(a(1)).toBe(1);
+  });
+});
+
+describe('b', () => {
+  test.each([
+    ['one', [1], 2],
+    ['two', [2], 4],
+  ])('%s', (title, args, expected) => {
+    expect(b(...args)).toEqual(expected);
+  });
+});
+"""
+
+
+def test_balance_and_shard_count(tmp_path, monkeypatch):
+    shards = balance(["a", "b", "c", "d"], {"a": 4.0, "b": 1.0, "c": 3.0}, 2)
+    assert shards == [["a", "b"], ["c", "d"]]
+    assert sorted(sum(shards, [])) == ["a", "b", "c", "d"]
+
+    test_file = tmp_path / "test_mathy.py"
+    test_file.write_text(TESTS)
+    assert count_python_tests(test_file) == 5
+    monkeypatch.setenv("TESTGEN_SHARDS", "4")
+    monkeypatch.setenv("TESTGEN_SHARD_MIN_TESTS", "2")
+    assert shard_count(5) == 2
+    assert shard_count(1) == 1
+
+    assert count_js_tests(JS_TESTS) == 3
+    sources = js_shard_sources(JS_TESTS, {"a works": 0.5}, 2)
+    assert len(sources) == 2
+    assert all(source.startswith("const { a, b }") for source in sources)
+    assert "describe('a'" in sources[0] and "describe('b'" in sources[1]
+    assert js_shard_sources(JS_TESTS, {}, 1) == [JS_TESTS]
+
+
+def test_sharded_run_merges_results_and_coverage(monkeypatch):
+    store = DurationStore(TieredCache(LRUCache()))
+    monkeypatch.setattr(runner, "duration_store", store)
+    with Workspace("mathy", "python", MODULE) as workspace:
+        test_file = workspace.tests_dir / "test_mathy.py"
+        test_file.write_text(TESTS)
+
+        single = runner.run_tests_and_get_coverage(str(test_file), "mathy", workspace, use_cache=False, shards=1)
+        sharded = runner.run_tests_and_get_coverage(str(test_file), "mathy", workspace, use_cache=False, shards=2)
+
+    assert single["status"] == sharded["status"] == "Success"
+    assert sharded["shards"] == 2
+    assert sharded["summary"] == single["summary"] == "5 tests passed."
+    assert sharded["coverage_percentage"] == single["coverage_percentage"]
+    assert set(store.get("python", TESTS)) == {
+        "test_double[1-2]", "test_double[2-4]", "test_double[3-6]", "test_half", "test_half_odd"
+    }
+    edited = TESTS.replace("mathy.half(4) == 2", "mathy.half(8) == 4")
+    assert set(store.get("python", edited)) == {"test_double[1-2]", "test_double[2-4]", "test_double[3-6]", "test_half_odd"}
+    assert store.get("python", "def test_half():\n    assert other.half(4) == 2\n") == {}
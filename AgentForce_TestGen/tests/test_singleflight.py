@@ -0,0 +1,54 @@
+import asyncio
+
+from app.singleflight import SingleFlight
+
+
+def test_concurrent_calls_with_the_same_key_share_one_run():
+    calls = []
+
+    async def work(key):
+        calls.append(key)
+        await asyncio.sleep(0.05)
+        return {"key": key}
+
+    async def main():
+        flights = SingleFlight("test")
+        results = await asyncio.gather(
+            *[flights.run(key, lambda key=key: work(key)) for key in ("a", "a", "a", "b")]
+        )
+        assert flights.in_flight() == 0
+        return results
+
+    results = asyncio.run(main())
+    assert sorted(calls) == ["a", "b"]
+    assert [r["key"] for r in results] == ["a", "a", "a", "b"]
+
+
+def test_work_is_cancelled_only_when_every_waiter_is_gone():
+    async def main():
+        flights = SingleFlight("test")
+        finished = asyncio.Event()
+        started = []
+
+        async def work():
+            started.append(1)
+            await finished.wait()
+            return "done"
+
+        first = asyncio.ensure_future(flights.run("k", work))
+        second = asyncio.ensure_future(flights.run("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        finished.set()
+        assert await second == "done" and first.cancelled()
+
+        finished.clear()
+        third = asyncio.ensure_future(flights.run("k", work))
+        await asyncio.sleep(0)
+        third.cancel()
+        await asyncio.sleep(0.01)
+        assert flights.in_flight() == 0 and third.cancelled()
+        assert len(started) == 2
+
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+import httpx
+
+from app import main, pipeline
+from app.llm import complete_array_items
+from app.llm_backends import FakeBackend
+from app.pipeline import stream_pipeline
+
+SOURCE = b"def add(a, b):\n    return a + b\n"
+
+
+def test_complete_array_items_skips_the_unfinished_tail():
+    text = '{"test_groups": [{"function_name": "a", "cases": []}, {"function_name": "b", "ca'
+    items = complete_array_items(text, "test_groups")
+    assert [json.loads(item)["function_name"] for item in items] == ["a"]
+
+
+def test_complete_array_items_ignores_brackets_inside_strings():
+    text = '```json\n{"tests": [{"describe": "x", "cases": [{"input": "[1, {\\"a\\": \\"}\\"}]"}]}]}\n```'
+    items = complete_array_items(text, "tests")
+    assert len(items) == 1
+    assert json.loads(items[0])["cases"][0]["input"] == '[1, {"a": "}"}]'
+    assert complete_array_items('{"other": []}', "tests") == []
+
+
+def test_generate_stream_sends_events_in_pipeline_order(monkeypatch):
+    monkeypatch.setattr(pipeline.llm, "_backend", FakeBackend())
+    monkeypatch.setattr(pipeline.llm, "cache", None)
+
+    async def post(**form):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testgen") as client:
+            return await client.post(
+                "/generate/stream?run_cache=false", data={"language": "python", **form}, files={"file": ("calc.py", SOURCE)}
+            )
+
+    ndjson, sse = asyncio.run(post()), asyncio.run(post(format="sse"))
+    expected = ["parsed", "test_group", "test_file"] + ["test_result"] * 3 + ["result"]
+    assert ndjson.headers["content-type"] == "application/x-ndjson"
+    events = [json.loads(line) for line in ndjson.text.splitlines()]
+    assert [event["event"] for event in events] == expected
+    assert events[-1]["data"]["coverage_report"]["coverage_percentage"] == 100.0
+
+    assert sse.headers["content-type"].startswith("text/event-stream")
+    messages = [block.split("\n") for block in sse.text.strip().split("\n\n")]
+    assert [lines[0] for lines in messages] == [f"event: {name}" for name in expected]
+    assert all(lines[1].startswith("data: {") for lines in messages)
+
+
+def test_the_pipeline_is_cancelled_when_the_client_stops_reading(monkeypatch):
+    cancelled = []
+
+    async def never_finishes(content, functions, on_group=None, stats=None):
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    monkeypatch.setattr(pipeline, "generate_python_plan", never_finishes)
+
+    async def main():
+        events = stream_pipeline("python", "calc.py", SOURCE.decode())
+        first = await events.__anext__()
+        await asyncio.sleep(0.05)
+        await events.aclose()
+        await asyncio.sleep(0.05)
+        # Checked before asyncio.run cancels whatever is left at shutdown.
+        return first, list(cancelled)
+
+    first, cancelled_in_time = asyncio.run(main())
+    assert first["event"] == "parsed" and cancelled_in_time == [True]
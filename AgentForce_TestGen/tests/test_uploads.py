@@ -0,0 +1,46 @@
+import asyncio
+import hashlib
+import io
+
+import httpx
+import pytest
+
+from app.main import app
+from app.uploads import SpooledUpload, UploadTooLarge
+
+
+def test_spooled_upload_hashes_in_chunks_and_decodes_lazily():
+    data = "def f():\n    return 'é'\n".encode("utf-8") * 10000
+    upload = SpooledUpload.from_file("m.py", io.BytesIO(data), limit=len(data))
+    assert upload.size == len(data) and upload.sha256 == hashlib.sha256(data).hexdigest()
+    assert upload._text is None
+    assert upload.text is upload.text and upload.text == data.decode("utf-8")
+
+    with pytest.raises(UploadTooLarge):
+        SpooledUpload.from_file("m.py", io.BytesIO(data), limit=len(data) - 1)
+
+
+def test_oversized_uploads_are_rejected_with_413(monkeypatch):
+    monkeypatch.setenv("TESTGEN_MAX_UPLOAD_BYTES", "1000")
+
+    async def chunked():
+        yield b'--b\r\nContent-Disposition: form-data; name="file"; filename="m.py"\r\n\r\n'
+        for _ in range(100):
+            yield b"x = 1\n" * 1000
+        yield b"\r\n--b--\r\n"
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testgen") as client:
+            declared = await client.post(
+                "/generate", data={"language": "python"}, files={"file": ("m.py", b"x = 1\n" * 50000)}
+            )
+            streamed = await client.post(
+                "/jobs", content=chunked(), headers={"content-type": "multipart/form-data; boundary=b"}
+            )
+            small_form = await client.post("/jobs", data={"language": "python"}, files={"file": ("m.py", b"x = 1\n" * 200)})
+        return declared, streamed, small_form
+
+    declared, streamed, small_form = asyncio.run(main())
+    assert declared.status_code == 413 and streamed.status_code == 413
+    assert small_form.status_code == 413 and "1000 byte limit" in small_form.json()["detail"]
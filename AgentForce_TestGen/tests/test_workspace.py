@@ -0,0 +1,51 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.runner import run_tests_and_get_coverage_async
+from app.workspace import Workspace, sweep_stale_workspaces
+
+TESTS = """from examples import doubler
+def test_double():
+    assert doubler.double(2) == 4
+"""
+
+
+def test_concurrent_workspaces_keep_their_own_results_and_coverage(tmp_path):
+    async def run(workspace):
+        test_file = workspace.tests_dir / "test_doubler.py"
+        test_file.write_text(TESTS)
+        return await run_tests_and_get_coverage_async(str(test_file), "doubler", workspace, use_cache=False)
+
+    async def main():
+        # Same module and test file names, different sources.
+        with Workspace("doubler", "python", "def double(n):\n    return n * 2\n", base_dir=tmp_path) as good, \
+                Workspace("doubler", "python", "def double(n):\n    if n:\n        return n * 3\n    return 0\n", base_dir=tmp_path) as bad:
+            assert good.root != bad.root and good.coverage_xml != bad.coverage_xml
+            results = await asyncio.gather(run(good), run(bad))
+            reports = good.coverage_xml.read_text(), bad.coverage_xml.read_text()
+        return results, reports
+
+    (good, bad), (good_xml, bad_xml) = asyncio.run(main())
+    assert good["status"] == "Success" and good["lines"] == {"covered": 2, "total": 2}
+    assert bad["status"] == "Tests Failed" and bad["lines"] == {"covered": 3, "total": 4}
+    assert good_xml != bad_xml
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_workspaces_are_removed_on_errors_and_stale_ones_are_swept(tmp_path):
+    with pytest.raises(RuntimeError):
+        with Workspace("doubler", "python", "", base_dir=tmp_path) as workspace:
+            root = workspace.root
+            (workspace.tests_dir / "test_doubler.py").write_text(TESTS)
+            raise RuntimeError("job failed")
+    assert not root.exists()
+
+    stale, fresh = Workspace("old", "python", "", base_dir=tmp_path), Workspace("new", "python", "", base_dir=tmp_path)
+    an_hour_ago = time.time() - 3600
+    os.utime(stale.root, (an_hour_ago, an_hour_ago))
+    assert sweep_stale_workspaces(max_age=600, base_dir=tmp_path) == 1
+    assert not stale.root.exists() and fresh.root.exists()
+    assert sweep_stale_workspaces(base_dir=tmp_path / "missing") == 0